@@ -2,22 +2,39 @@
 高德地图API封装模块
 """
 import requests
+import contextvars
+import math
+import threading
 import time
-from typing import List, Dict, Optional
-from config import AMAP_API_KEY, AMAP_BASE_URL, POI_SEARCH_ENDPOINT, DEDUPLICATION_DISTANCE
-from distance import haversine_distance
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from config import (AMAP_API_KEY, AMAP_BASE_URL, POI_SEARCH_ENDPOINT, DEDUPLICATION_DISTANCE,
+                    AMAP_QPS, FETCH_WORKERS, NEIGHBOR_INDEX_BACKEND, POI_CACHE_PATH, POI_CACHE_TTL, POI_CACHE_MAX_ENTRIES,
+                    POI_CACHE_FLUSH_INTERVAL)
+from http_client import get_session, AMAP_TIMEOUT
+from neighbor_index import create_neighbor_index
+from poi_cache import PoiCache
+from progress import Progress, ProgressSink
+from rate_limiter import TokenBucket
 
 # API限流配置
-REQUEST_DELAY = 0.2  # 每次请求之间的延迟（秒）
 RATE_LIMIT_RETRY_DELAY = 2.0  # 遇到限流时的重试延迟（秒）
 MAX_RETRIES = 3  # 最大重试次数
+PAGE_SIZE = 20  # 每页条数
+
+# 进程内所有搜索线程共享的限流器，总请求速率不超过 AMAP_QPS
+AMAP_RATE_LIMITER = TokenBucket(AMAP_QPS)
+
+# POI搜索结果缓存（POI_CACHE_TTL 为 0 时关闭）
+POI_CACHE = PoiCache(POI_CACHE_PATH, POI_CACHE_TTL, POI_CACHE_MAX_ENTRIES,
+                     POI_CACHE_FLUSH_INTERVAL) if POI_CACHE_TTL > 0 else None
 
 
 def deduplicate_stores(stores: List[Dict], distance_threshold: float = DEDUPLICATION_DISTANCE) -> List[Dict]:
     """
     对门店列表进行去重，距离相近的门店认为是同一家店
     
-    算法：对于每个门店，找到所有距离很近的门店，保留名称最完整（最长）的那个
+    算法：用近邻索引找出所有距离很近的门店对，对于每个门店，在其近邻中保留名称最完整（最长）的那个
     
     Args:
         stores: 门店列表，每个门店包含：name, address, lat, lon, poi_id, type
@@ -29,6 +46,18 @@ def deduplicate_stores(stores: List[Dict], distance_threshold: float = DEDUPLICA
     if len(stores) <= 1:
         return stores
     
+    # 用近邻索引一次找出所有距离小于阈值的门店对，每个门店只需检查相邻网格/KD树分支，
+    # 不再与全部门店逐一计算距离
+    index = create_neighbor_index(stores, distance_threshold, NEIGHBOR_INDEX_BACKEND)
+    pairs_i, pairs_j, pair_dists = index.query_pairs()
+    close = pair_dists < distance_threshold
+    
+    # 每个门店的近邻列表（门店对按 (i, j) 升序排列，因此每个列表也是升序）
+    neighbors = [[] for _ in stores]
+    for i, j in zip(pairs_i[close].tolist(), pairs_j[close].tolist()):
+        neighbors[i].append(j)
+        neighbors[j].append(i)
+    
     # 使用集合记录已处理的门店索引（被标记为重复的）
     removed_indices = set()
     result = []
@@ -40,20 +69,10 @@ def deduplicate_stores(stores: List[Dict], distance_threshold: float = DEDUPLICA
         
         # 找到所有与当前门店距离很近的门店（包括自己）
         nearby_stores = [(i, store1)]
-        
-        for j, store2 in enumerate(stores):
-            if j == i or j in removed_indices:
+        for j in neighbors[i]:
+            if j in removed_indices:
                 continue
-            
-            # 计算距离
-            distance = haversine_distance(
-                store1["lat"], store1["lon"],
-                store2["lat"], store2["lon"]
-            )
-            
-            # 如果距离小于阈值，认为是同一家店
-            if distance < distance_threshold:
-                nearby_stores.append((j, store2))
+            nearby_stores.append((j, stores[j]))
         
         # 在距离很近的门店中，保留名称最长的那个
         if len(nearby_stores) > 1:
@@ -73,164 +92,248 @@ def deduplicate_stores(stores: List[Dict], distance_threshold: float = DEDUPLICA
     return result
 
 
-def search_poi(city: str, keyword: str, max_pages: int = 10) -> List[Dict]:
+def _parse_pois(pois: List[Dict]) -> List[Dict]:
+    """将高德返回的POI列表解析为门店列表（跳过没有坐标的POI）"""
+    stores = []
+    for poi in pois:
+        location = poi.get("location", "").split(",")
+        if len(location) == 2:
+            store = {
+                "name": poi.get("name", ""),
+                "address": poi.get("address", ""),
+                "lat": float(location[1]),  # 纬度
+                "lon": float(location[0]),  # 经度
+                "poi_id": poi.get("id", ""),
+                "type": poi.get("type", "")
+            }
+            stores.append(store)
+    return stores
+
+
+def _fetch_page(city: str, keyword: str, page: int, progress: Progress) -> Optional[Dict]:
     """
-    搜索城市内指定关键词的POI
+    请求一页POI搜索结果（含限流等待和失败重试）
     
     Args:
         city: 城市名称
-        keyword: 搜索关键词（品牌名称）
-        max_pages: 最大搜索页数（每页20条）
+        keyword: 搜索关键词
+        page: 页码（从1开始）
+        progress: 进度事件（重试和错误以 fetch 阶段的警告发送）
     
     Returns:
-        门店列表，每个门店包含：name, address, lat, lon
+        高德API返回的数据，失败时返回 None
     """
-    stores = []
-    page = 1
+    url = f"{AMAP_BASE_URL}{POI_SEARCH_ENDPOINT}"
+    params = {
+        "key": AMAP_API_KEY,
+        "keywords": keyword,
+        "city": city,
+        "offset": PAGE_SIZE,  # 每页20条
+        "page": page,
+        "extensions": "all"  # 返回详细信息
+    }
+    retry_count = 0
     
-    while page <= max_pages:
-        retry_count = 0
-        success = False
-        
-        while retry_count <= MAX_RETRIES and not success:
-            try:
-                url = f"{AMAP_BASE_URL}{POI_SEARCH_ENDPOINT}"
-                params = {
-                    "key": AMAP_API_KEY,
-                    "keywords": keyword,
-                    "city": city,
-                    "offset": 20,  # 每页20条
-                    "page": page,
-                    "extensions": "all"  # 返回详细信息
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                
-                data = response.json()
-                
-                # 检查API返回状态
-                if data.get("status") != "1":
-                    error_msg = data.get("info", "未知错误")
-                    error_code = data.get("infocode", "")
-                    
-                    # 处理限流错误
-                    if "CUQPS_HAS_EXCEEDED_THE_LIMIT" in error_msg or error_code == "10009":
-                        if retry_count < MAX_RETRIES:
-                            wait_time = RATE_LIMIT_RETRY_DELAY * (retry_count + 1)
-                            print(f"遇到API限流，等待 {wait_time:.1f} 秒后重试... (第 {retry_count + 1}/{MAX_RETRIES} 次)")
-                            time.sleep(wait_time)
-                            retry_count += 1
-                            continue
-                        else:
-                            print(f"警告: 搜索 {keyword} 第 {page} 页时达到最大重试次数，跳过")
-                            break
-                    else:
-                        # 其他错误，直接退出
-                        print(f"警告: 搜索 {keyword} 时出错 - {error_msg}")
-                        break
-                
-                # 成功获取数据
-                success = True
-                pois = data.get("pois", [])
-                if not pois:
-                    # 没有更多数据，退出外层循环
-                    page = max_pages + 1
-                    break
-                
-                # 解析POI数据
-                for poi in pois:
-                    location = poi.get("location", "").split(",")
-                    if len(location) == 2:
-                        store = {
-                            "name": poi.get("name", ""),
-                            "address": poi.get("address", ""),
-                            "lat": float(location[1]),  # 纬度
-                            "lon": float(location[0]),  # 经度
-                            "poi_id": poi.get("id", ""),
-                            "type": poi.get("type", "")
-                        }
-                        stores.append(store)
-                
-                # 检查是否还有更多数据
-                count = int(data.get("count", 0))
-                if len(stores) >= count or len(pois) < 20:
-                    # 没有更多数据，退出外层循环
-                    page = max_pages + 1
-                    break
+    while retry_count <= MAX_RETRIES:
+        try:
+            AMAP_RATE_LIMITER.acquire()
+            response = get_session().get(url, params=params, timeout=AMAP_TIMEOUT)
+            response.raise_for_status()
+            
+            data = response.json()
+            
+            # 检查API返回状态
+            if data.get("status") != "1":
+                error_msg = data.get("info", "未知错误")
+                error_code = data.get("infocode", "")
                 
-                page += 1
-                # 请求之间的延迟，避免触发限流
-                time.sleep(REQUEST_DELAY)
-                # 成功获取数据后，退出重试循环，继续下一页
-                break
+                # 处理限流错误：所有线程共享的限流器一起退避
+                if "CUQPS_HAS_EXCEEDED_THE_LIMIT" in error_msg or error_code == "10009":
+                    if retry_count < MAX_RETRIES:
+                        wait_time = RATE_LIMIT_RETRY_DELAY * (retry_count + 1)
+                        progress.log("fetch", f"遇到API限流，等待 {wait_time:.1f} 秒后重试... (第 {retry_count + 1}/{MAX_RETRIES} 次)",
+                                     level="warning", key=keyword)
+                        AMAP_RATE_LIMITER.penalize(wait_time)
+                        retry_count += 1
+                        continue
+                    progress.log("fetch", f"警告: 搜索 {keyword} 第 {page} 页时达到最大重试次数，跳过",
+                                 level="warning", key=keyword)
+                    return None
                 
-            except requests.exceptions.RequestException as e:
-                if retry_count < MAX_RETRIES:
-                    wait_time = RATE_LIMIT_RETRY_DELAY * (retry_count + 1)
-                    print(f"网络请求失败，等待 {wait_time:.1f} 秒后重试... (第 {retry_count + 1}/{MAX_RETRIES} 次)")
-                    time.sleep(wait_time)
-                    retry_count += 1
-                    continue
-                else:
-                    print(f"错误: 请求高德地图API失败 - {e}")
-                    break
-            except Exception as e:
-                print(f"错误: 处理API响应时出错 - {e}")
-                break
-        
-        # 如果重试失败，退出循环
-        if not success:
+                # 其他错误，直接退出
+                progress.log("fetch", f"警告: 搜索 {keyword} 时出错 - {error_msg}", level="warning", key=keyword)
+                return None
+            
+            return data
+            
+        except requests.exceptions.RequestException as e:
+            if retry_count < MAX_RETRIES:
+                wait_time = RATE_LIMIT_RETRY_DELAY * (retry_count + 1)
+                progress.log("fetch", f"网络请求失败，等待 {wait_time:.1f} 秒后重试... (第 {retry_count + 1}/{MAX_RETRIES} 次)",
+                             level="warning", key=keyword)
+                time.sleep(wait_time)
+                retry_count += 1
+                continue
+            progress.log("fetch", f"错误: 请求高德地图API失败 - {e}", level="error", key=keyword)
+            return None
+        except Exception as e:
+            progress.log("fetch", f"错误: 处理API响应时出错 - {e}", level="error", key=keyword)
+            return None
+    
+    return None
+
+
+def _fetch_all_pages(city: str, keyword: str, max_pages: int, progress: Progress) -> Tuple[List[Dict], bool]:
+    """
+    请求所有分页并合并结果
+    
+    先请求第一页得到结果总数，再并发请求剩余页（受共享限流器约束）。
+    某一页失败或为空时，只保留它之前各页的结果。
+    
+    Args:
+        city: 城市名称
+        keyword: 搜索关键词
+        max_pages: 最大搜索页数
+        progress: 进度事件
+    
+    Returns:
+        (门店列表, 是否完整获取（没有请求失败）)
+    """
+    stores = []
+    if max_pages < 1:
+        return stores, True
+    
+    first = _fetch_page(city, keyword, 1, progress)
+    if first is None:
+        return stores, False
+    
+    pois = first.get("pois", [])
+    stores.extend(_parse_pois(pois))
+    count = int(first.get("count", 0))
+    
+    # 检查是否还有更多数据
+    if not pois or len(pois) < PAGE_SIZE or len(stores) >= count:
+        return stores, True
+    
+    pages = list(range(2, min(max_pages, math.ceil(count / PAGE_SIZE)) + 1))
+    if not pages:
+        return stores, True
+    
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(pages))) as executor:
+        results = _map_in_context(executor, lambda p: _fetch_page(city, keyword, p, progress), pages)
+    
+    # 按页码顺序合并，遇到失败或没有更多数据的页即停止
+    for data in results:
+        if data is None:
+            return stores, False
+        pois = data.get("pois", [])
+        if not pois:
+            break
+        stores.extend(_parse_pois(pois))
+        if len(stores) >= count or len(pois) < PAGE_SIZE:
             break
     
+    return stores, True
+
+
+def _map_in_context(executor: ThreadPoolExecutor, fn, items: List) -> List:
+    """
+    executor.map 的上下文版本：每个任务在提交线程当前上下文的副本中执行，
+    日志捕获（log_capture）等 contextvars 状态随之进入工作线程，工作线程中的 print 输出到同一个捕获
+
+    Returns:
+        按 items 顺序排列的结果列表
+    """
+    futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def search_poi(city: str, keyword: str, max_pages: int = 10, progress: Optional[ProgressSink] = None) -> List[Dict]:
+    """
+    搜索城市内指定关键词的POI
+    
+    优先读取POI缓存，未命中时请求高德API并写入缓存。
+    
+    Args:
+        city: 城市名称
+        keyword: 搜索关键词（品牌名称）
+        max_pages: 最大搜索页数（每页20条）
+        progress: 进度事件接收器（fetch 阶段，key 为关键词），默认输出到控制台
+    
+    Returns:
+        门店列表，每个门店包含：name, address, lat, lon
+    """
+    progress = Progress.of(progress)
+    progress.start("fetch", key=keyword)
+    cached = POI_CACHE.get(city, keyword, max_pages) if POI_CACHE else None
+    if cached is not None:
+        progress.log("fetch", f"  缓存命中: {keyword}（{city}）", key=keyword)
+        stores = cached
+    else:
+        stores, complete = _fetch_all_pages(city, keyword, max_pages, progress)
+        # 只缓存完整的搜索结果（去重之前的原始数据），中途失败的结果不缓存
+        if complete and POI_CACHE:
+            POI_CACHE.put(city, keyword, max_pages, stores)
+    
     # 对搜索结果进行去重
     if stores:
         original_count = len(stores)
         stores = deduplicate_stores(stores)
         if len(stores) < original_count:
-            print(f"  去重: {keyword} 从 {original_count} 个门店去重到 {len(stores)} 个门店")
+            progress.log("fetch", f"  去重: {keyword} 从 {original_count} 个门店去重到 {len(stores)} 个门店", key=keyword)
     
-    print(f"找到 {keyword} 在 {city} 的 {len(stores)} 个门店")
+    progress.log("fetch", f"找到 {keyword} 在 {city} 的 {len(stores)} 个门店", key=keyword)
     return stores
 
 
-def search_brands_with_progress(city: str, brands: List[str], progress_callback=None) -> Dict[str, List[Dict]]:
+def search_brands_with_progress(city: str, brands: List[str], progress_callback=None,
+                                progress: Optional[ProgressSink] = None) -> Dict[str, List[Dict]]:
     """
     搜索多个品牌的门店（支持进度回调）
     
+    各品牌在线程池中并发搜索，请求速率由共享限流器控制。
+    进度回调会在工作线程中被调用（已加锁串行化），current 为已完成的品牌数。
+    
     Args:
         city: 城市名称
         brands: 品牌名称列表
         progress_callback: 进度回调函数，参数为 (brand, current, total, message)
+        progress: 各品牌POI请求的进度事件接收器（在工作线程中调用），默认输出到控制台
     
     Returns:
-        字典，键为品牌名，值为该品牌的门店列表
+        字典，键为品牌名，值为该品牌的门店列表（顺序与 brands 一致）
     """
-    brand_stores = {}
+    if not brands:
+        return {}
+    
     total_brands = len(brands)
+    progress = Progress.of(progress)
+    callback_lock = threading.Lock()
+    completed = [0]
     
-    for idx, brand in enumerate(brands):
-        if progress_callback:
-            progress_callback(brand, idx + 1, total_brands, f'正在搜索 {brand}...')
-        
-        stores = search_poi(city, brand)
-        if stores:
-            brand_stores[brand] = stores
+    def report(brand: str, message: str, finished: bool = False):
+        with callback_lock:
+            if finished:
+                completed[0] += 1
             if progress_callback:
-                progress_callback(brand, idx + 1, total_brands, f'{brand} 找到 {len(stores)} 个门店')
+                progress_callback(brand, completed[0], total_brands, message)
+    
+    def search_one(brand: str) -> List[Dict]:
+        report(brand, f'正在搜索 {brand}...')
+        stores = search_poi(city, brand, progress=progress)
+        if stores:
+            report(brand, f'{brand} 找到 {len(stores)} 个门店', finished=True)
         else:
-            if progress_callback:
-                progress_callback(brand, idx + 1, total_brands, f'警告: 未找到 {brand} 在 {city} 的门店')
-            brand_stores[brand] = []
-        
-        # 品牌之间的延迟，避免触发限流
-        if idx < len(brands) - 1:  # 最后一个品牌不需要延迟
-            time.sleep(REQUEST_DELAY * 2)  # 品牌之间延迟稍长一些
+            report(brand, f'警告: 未找到 {brand} 在 {city} 的门店', finished=True)
+        return stores
+    
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, total_brands)) as executor:
+        results = _map_in_context(executor, search_one, brands)
     
-    return brand_stores
+    return {brand: stores for brand, stores in zip(brands, results)}
 
 
-def search_brands(city: str, brands: List[str]) -> Dict[str, List[Dict]]:
+def search_brands(city: str, brands: List[str], progress: Optional[ProgressSink] = None) -> Dict[str, List[Dict]]:
     """搜索多个品牌的门店（不带进度回调）"""
-    return search_brands_with_progress(city, brands)
+    return search_brands_with_progress(city, brands, progress=progress)
 
@@ -4,17 +4,21 @@ Flask Web应用主文件
 """
 import os
 import json
-import threading
-import queue
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-import requests as http_requests
-from amap_api import search_brands_with_progress, search_brands
-from cluster_finder import find_clusters
-from output import output_html_string
-from config import DEFAULT_DISTANCE_THRESHOLD, AMAP_API_KEY, AMAP_JS_KEY, AMAP_SECURITY_CODE
+from amap_api import search_brands_with_progress, search_brands, POI_CACHE
+from contextlib import closing
+from cluster_finder import find_clusters, iter_clusters, RESULT_CACHE
+from cluster_finder_optimized import PAIR_CACHE
+from output import compact_clusters, new_compact_result, iter_compact_clusters
+from config import (DEFAULT_DISTANCE_THRESHOLD, AMAP_API_KEY, AMAP_JS_KEY, AMAP_SECURITY_CODE,
+                    SEARCH_TASK_WORKERS, SSE_HEARTBEAT_INTERVAL, SEARCH_JOB_TTL, SEARCH_RESULT_TTL,
+                    AMAP_PROXY_CACHE_TTL, AMAP_PROXY_CACHE_MAX_ENTRIES, RESULT_CHUNK_SIZE)
+from search_jobs import JobManager
+from http_client import get_session, AMAP_TIMEOUT
+from proxy_cache import ProxyCache, ProxyResponse
 from log_capture import LogCapture
 
 app = Flask(__name__)
@@ -24,9 +28,15 @@ app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-product
 DEFAULT_USERNAME = os.getenv('WEB_USERNAME', 'admin')
 DEFAULT_PASSWORD_HASH = generate_password_hash(os.getenv('WEB_PASSWORD', 'admin123'))
 
-# 存储用户会话中的搜索结果
+# 已结束搜索任务的结果文件目录
 app.config['RESULTS_DIR'] = os.path.join(os.path.dirname(__file__), 'results')
 
+# 搜索任务在后台线程池中执行，请求线程只负责转发任务的进度事件
+search_jobs = JobManager(app.config['RESULTS_DIR'], SEARCH_TASK_WORKERS, SEARCH_JOB_TTL, SEARCH_RESULT_TTL)
+
+# 地图代理的响应缓存（每个进程一份）
+proxy_cache = ProxyCache(AMAP_PROXY_CACHE_TTL, AMAP_PROXY_CACHE_MAX_ENTRIES)
+
 
 def login_required(f):
     """登录装饰器"""
@@ -38,8 +48,33 @@ def login_required(f):
     return decorated_function
 
 
+def _parse_threshold(value):
+    """校验单个距离阈值（米），无效时抛出 ValueError"""
+    try:
+        threshold = float(value)
+    except (ValueError, TypeError):
+        raise ValueError('距离阈值必须是数字')
+    if threshold < 50 or threshold > 5000:
+        raise ValueError('距离阈值应在 50-5000 米之间')
+    return threshold
+
+
+def _validate_thresholds(data):
+    """
+    验证多阈值参数 thresholds（数组或逗号分隔的字符串），返回去重后的阈值列表；未提供时返回 None
+    """
+    thresholds = data.get('thresholds')
+    if thresholds in (None, '', []):
+        return None
+    if isinstance(thresholds, str):
+        thresholds = [t for t in thresholds.split(',') if t.strip()]
+    if not isinstance(thresholds, list):
+        raise ValueError('thresholds 必须是数组或逗号分隔的字符串')
+    return list(dict.fromkeys(_parse_threshold(t) for t in thresholds))
+
+
 def _validate_search_params(data):
-    """验证搜索参数，返回 (city, brands, threshold, required_brands) 或抛出 ValueError"""
+    """验证搜索参数，返回 (city, brands, threshold, required_brands, limit) 或抛出 ValueError"""
     city = data.get('city', '').strip()
     brands_str = data.get('brands', '').strip()
     threshold = data.get('threshold', DEFAULT_DISTANCE_THRESHOLD)
@@ -51,12 +86,7 @@ def _validate_search_params(data):
     if not AMAP_API_KEY or AMAP_API_KEY == "your_api_key_here":
         raise ValueError('高德地图API密钥未配置')
 
-    try:
-        threshold = float(threshold)
-    except (ValueError, TypeError):
-        raise ValueError('距离阈值必须是数字')
-    if threshold < 50 or threshold > 5000:
-        raise ValueError('距离阈值应在 50-5000 米之间')
+    threshold = _parse_threshold(threshold)
 
     brands = [b.strip() for b in brands_str.split(",") if b.strip()]
     if not brands:
@@ -69,52 +99,197 @@ def _validate_search_params(data):
         if invalid:
             raise ValueError(f'必选品牌必须是品牌列表的子集，以下不在列表中: {", ".join(invalid)}')
 
-    return city, brands, threshold, required_brands
-
-
-def _run_threaded_task(task_fn, msg_queue):
-    """在线程中运行任务，yield 队列中的消息。通过 yield from 调用，返回 (result, error)。"""
-    done = threading.Event()
-    error_holder = [None]
-    result_holder = [None]
-
-    def worker():
+    # 最多返回的商圈数，未填写表示不限制
+    limit = data.get('limit')
+    if limit in (None, ''):
+        limit = None
+    else:
         try:
-            result_holder[0] = task_fn()
-        except Exception as e:
-            error_holder[0] = e
-        finally:
-            done.set()
+            limit = int(limit)
+        except (ValueError, TypeError):
+            raise ValueError('商圈数量上限必须是整数')
+        if limit < 1:
+            raise ValueError('商圈数量上限必须大于0')
 
-    thread = threading.Thread(target=worker)
-    thread.start()
+    return city, brands, threshold, required_brands, limit
 
-    while not done.is_set() or not msg_queue.empty():
-        try:
-            msg = msg_queue.get(timeout=0.1)
-            yield f"data: {json.dumps(msg)}\n\n"
-        except queue.Empty:
-            continue
 
-    thread.join()
+def _msg(msg_type, message=None, **extra):
+    """构造进度消息（事件）字典"""
+    data = {'type': msg_type}
+    if message is not None:
+        data['message'] = message
+    data.update(extra)
+    return data
 
-    while not msg_queue.empty():
-        try:
-            msg = msg_queue.get_nowait()
-            yield f"data: {json.dumps(msg)}\n\n"
-        except queue.Empty:
-            break
 
-    return result_holder[0], error_holder[0]
+def _sse_event(data, event_id=None):
+    """把消息字典格式化为 SSE 消息字符串，带事件ID时客户端可以凭它断线重连"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 
 def _sse_msg(msg_type, message=None, **extra):
     """构造 SSE 消息字符串"""
-    data = {'type': msg_type}
-    if message is not None:
-        data['message'] = message
-    data.update(extra)
-    return f"data: {json.dumps(data)}\n\n"
+    return _sse_event(_msg(msg_type, message, **extra))
+
+
+# 聚类各阶段在总进度中的 (起点, 跨度)，计数型进度在跨度内线性推进
+_CLUSTER_STAGE_PROGRESS = {
+    'index': (45, 5), 'candidates': (50, 10), 'enumerate': (60, 10), 'fallback': (70, 8), 'dedupe': (78, 0),
+}
+
+
+def _log_sink(job, stage):
+    """把引擎的日志型进度事件转换为任务的 log 事件（计数型事件忽略）"""
+    def sink(event):
+        if event.done is None:
+            job.emit({'type': 'log', 'message': event.message.strip(), 'stage': stage, 'level': event.level})
+    return sink
+
+
+def _capture_output(job, stage):
+    """捕获当前任务线程中其他代码的 print 输出（例如缓存警告），作为任务的 log 事件"""
+    return LogCapture(lambda line: job.emit({'type': 'log', 'message': line, 'stage': stage}))
+
+
+def _cluster_sink(job):
+    """把聚类引擎的进度事件转换为任务事件：日志作为 log，阶段开始和计数进度作为 progress"""
+    log = _log_sink(job, 'clustering')
+    started = set()
+
+    def sink(event):
+        log(event)
+        if event.stage not in _CLUSTER_STAGE_PROGRESS:
+            return
+        start, span = _CLUSTER_STAGE_PROGRESS[event.stage]
+        if event.done is not None and event.total:
+            job.emit({'type': 'progress', 'stage': 'clustering', 'message': event.message.strip(),
+                      'done': event.done, 'total': event.total, 'elapsed': round(event.elapsed, 3),
+                      'progress': start + int(span * event.done / event.total)})
+        elif event.stage not in started:
+            started.add(event.stage)
+            job.emit({'type': 'progress', 'stage': 'clustering', 'message': event.message.strip(),
+                      'progress': start})
+    return sink
+
+
+def _build_result(city, brands, threshold, compact):
+    """
+    构造搜索结果：摘要字段 + 紧凑格式的门店表和商圈（见 output.compact_clusters）
+
+    Returns:
+        (摘要, 完整结果)
+    """
+    summary = {
+        'success': True, 'city': city, 'brands': brands,
+        'threshold': threshold, 'cluster_count': len(compact['clusters']),
+        'timestamp': datetime.now().isoformat()
+    }
+    return summary, dict(summary, **compact)
+
+
+def _run_search_job(job, city, brands, threshold, required_brands, limit=None):
+    """后台任务：搜索门店并查找商圈，进度和结果以事件形式写入任务"""
+    # --- 搜索阶段 ---
+    job.emit(_msg('progress', f'开始搜索 {len(brands)} 个品牌的门店...', stage='searching', progress=0))
+
+    def progress_callback(brand, current, total, message):
+        job.emit({
+            'type': 'progress', 'stage': 'searching',
+            'brand': brand, 'current': current, 'total': total,
+            'message': message, 'progress': int((current / total) * 40)
+        })
+
+    try:
+        with _capture_output(job, 'searching'):
+            brand_stores = search_brands_with_progress(city, brands, progress_callback,
+                                                       progress=_log_sink(job, 'searching'))
+    except Exception as e:
+        job.emit(_msg('error', f'搜索门店时出错: {e}'))
+        return
+
+    # 检查搜索结果
+    brands_with_stores = [b for b in brands if brand_stores.get(b)]
+    if not brands_with_stores:
+        job.emit(_msg('error', '未找到任何品牌的门店'))
+        return
+
+    if len(brands_with_stores) < len(brands):
+        missing = set(brands) - set(brands_with_stores)
+        job.emit(_msg('progress', f'警告: 以下品牌未找到门店: {", ".join(missing)}',
+                      stage='searching', progress=40))
+
+    # --- 聚类阶段 ---
+    job.emit(_msg('progress', '正在查找符合条件的商圈...', stage='clustering', progress=40))
+
+    # 过滤掉未找到门店的必选品牌
+    effective_required = [b for b in required_brands if b in brands_with_stores] if required_brands else None
+
+    # 商圈边查找边分段推送（每段只带新引用的门店），第一批商圈在搜索结束前就能送达；
+    # 完成事件只携带摘要，避免单条 SSE 消息过大
+    compact = new_compact_result(brands_with_stores)
+    try:
+        with _capture_output(job, 'clustering'), closing(iter_clusters(
+                {b: brand_stores[b] for b in brands_with_stores},
+                threshold,
+                required_brands=effective_required,
+                progress=_cluster_sink(job),
+                limit=limit
+        )) as clusters:
+            for chunk in iter_compact_clusters(clusters, compact, RESULT_CHUNK_SIZE):
+                job.emit(_msg('clusters', stage='clustering', **chunk))
+    except Exception as e:
+        job.emit(_msg('error', f'查找商圈时出错: {e}'))
+        return
+
+    if not compact['clusters']:
+        job.emit(_msg('error', '未找到符合条件的商圈'))
+        return
+
+    # --- 生成结果 ---
+    summary, result = _build_result(city, brands_with_stores, threshold, compact)
+    job.emit(_msg('progress', f'找到 {summary["cluster_count"]} 个符合条件的商圈', stage='generating', progress=95))
+    job.result = result
+    job.emit(_msg('complete', result=summary, progress=100))
+
+
+def _submit_search_job(data):
+    """校验搜索参数并创建后台任务（相同参数的任务仍在执行时复用该任务），参数无效时抛出 ValueError"""
+    city, brands, threshold, required_brands, limit = _validate_search_params(data)
+    key = (city, tuple(brands), threshold, tuple(required_brands or ()), limit)
+    return search_jobs.submit(
+        lambda job: _run_search_job(job, city, brands, threshold, required_brands, limit),
+        owner=session['user_id'], key=key
+    )
+
+
+def _stream_job_events(job, last_event_id=0):
+    """
+    SSE 转发任务事件：先发送任务ID，再补发 last_event_id 之后的事件，直到任务结束
+
+    暂无新事件时每隔 SSE_HEARTBEAT_INTERVAL 秒发送一次注释行作为心跳。
+    客户端断开只会停止转发，任务继续执行，之后可以凭任务ID和最后的事件ID重新连接。
+    """
+    yield _sse_msg('job', job_id=job.id)
+    while True:
+        events = job.events_after(last_event_id, timeout=SSE_HEARTBEAT_INTERVAL)
+        if not events:
+            if job.finished:
+                return
+            yield ": keepalive\n\n"
+            continue
+        for event_id, event in events:
+            if event['type'] == 'complete':
+                result = event['result']
+                session['last_result'] = {
+                    'city': result['city'], 'brands': result['brands'],
+                    'cluster_count': result['cluster_count'], 'timestamp': result['timestamp']
+                }
+            yield _sse_event(event, event_id)
+            last_event_id = event_id
+        if job.finished and last_event_id >= job.last_event_id:
+            return
 
 
 @app.errorhandler(403)
@@ -166,131 +341,89 @@ def search():
                            amap_js_key=AMAP_JS_KEY or AMAP_API_KEY)
 
 
-@app.route('/api/search/stream', methods=['POST'])
+@app.route('/api/search/stream', methods=['GET', 'POST'])
 @login_required
 def api_search_stream():
-    """API接口：执行商圈搜索（流式响应，支持进度显示）"""
-    def generate():
-        try:
-            data = request.get_json()
-            city, brands, threshold, required_brands = _validate_search_params(data)
-        except (ValueError, Exception) as e:
-            yield _sse_msg('error', str(e))
-            return
-
+    """
+    API接口：执行商圈搜索（流式响应，支持进度显示）
+
+    POST 搜索参数时创建后台任务并转发其进度；带 job_id（查询参数或 JSON）时重新连接已有任务，
+    从 Last-Event-ID 请求头（或 last_event_id 查询参数）之后的事件继续转发。
+    """
+    def error_stream(message):
+        yield _sse_msg('error', message)
+
+    data = request.get_json(silent=True) or {}
+    job_id = request.args.get('job_id') or data.get('job_id')
+    if job_id:
+        job = search_jobs.get(job_id, session['user_id'])
+        if job is None:
+            stream = error_stream('搜索任务不存在或已过期')
+        else:
+            try:
+                last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+            except ValueError:
+                last_event_id = 0
+            stream = _stream_job_events(job, last_event_id)
+    elif request.method != 'POST':
+        stream = error_stream('缺少搜索参数')
+    else:
         try:
-            # --- 搜索阶段 ---
-            yield _sse_msg('progress', f'开始搜索 {len(brands)} 个品牌的门店...',
-                           stage='searching', progress=0)
-
-            search_queue = queue.Queue()
-
-            def progress_callback(brand, current, total, message):
-                search_queue.put({
-                    'type': 'progress', 'stage': 'searching',
-                    'brand': brand, 'current': current, 'total': total,
-                    'message': message, 'progress': int((current / total) * 40)
-                })
-
-            def search_log_cb(message):
-                search_queue.put({'type': 'log', 'message': message, 'stage': 'searching'})
-
-            def do_search():
-                with LogCapture(search_log_cb):
-                    return search_brands_with_progress(city, brands, progress_callback)
-
-            brand_stores, error = yield from _run_threaded_task(do_search, search_queue)
-            if error:
-                yield _sse_msg('error', f'搜索门店时出错: {error}')
-                return
-
-            # 检查搜索结果
-            brands_with_stores = [b for b in brands if brand_stores.get(b)]
-            if not brands_with_stores:
-                yield _sse_msg('error', '未找到任何品牌的门店')
-                return
-
-            if len(brands_with_stores) < len(brands):
-                missing = set(brands) - set(brands_with_stores)
-                yield _sse_msg('progress',
-                               f'警告: 以下品牌未找到门店: {", ".join(missing)}',
-                               stage='searching', progress=40)
-
-            # --- 聚类阶段 ---
-            yield _sse_msg('progress', '正在查找符合条件的商圈...',
-                           stage='clustering', progress=40)
-
-            cluster_queue = queue.Queue()
-            _progress_keywords = {
-                '构建空间索引': 45, '构建候选集': 50,
-                '原始组合数': 55, '优化后组合数': 65,
-            }
-
-            def cluster_log_cb(message):
-                cluster_queue.put({'type': 'log', 'message': message, 'stage': 'clustering'})
-                for kw, prog in _progress_keywords.items():
-                    if kw in message:
-                        cluster_queue.put({'type': 'progress', 'stage': 'clustering',
-                                           'message': message, 'progress': prog})
-                        return
-                if '查找商圈' in message:
-                    cluster_queue.put({'type': 'progress', 'stage': 'clustering',
-                                       'message': message, 'progress': 60})
-
-            # 过滤掉未找到门店的必选品牌
-            effective_required = [b for b in required_brands if b in brands_with_stores] if required_brands else None
-
-            def do_clustering():
-                with LogCapture(cluster_log_cb):
-                    return find_clusters(
-                        {b: brand_stores[b] for b in brands_with_stores},
-                        threshold,
-                        required_brands=effective_required
-                    )
-
-            clusters, error = yield from _run_threaded_task(do_clustering, cluster_queue)
-            if error:
-                yield _sse_msg('error', f'查找商圈时出错: {error}')
-                return
-
-            if not clusters:
-                yield _sse_msg('error', '未找到符合条件的商圈')
-                return
+            stream = _stream_job_events(_submit_search_job(data))
+        except ValueError as e:
+            stream = error_stream(str(e))
 
-            # --- 生成结果 ---
-            yield _sse_msg('progress', f'找到 {len(clusters)} 个符合条件的商圈',
-                           stage='clustering', progress=80)
-            yield _sse_msg('progress', '正在生成结果...',
-                           stage='generating', progress=85)
+    # 关闭反向代理（nginx）的响应缓冲，进度消息立即送达客户端
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-            result = {
-                'success': True, 'city': city, 'brands': brands_with_stores,
-                'threshold': threshold, 'cluster_count': len(clusters),
-                'clusters': clusters, 'timestamp': datetime.now().isoformat()
-            }
-
-            html_content = output_html_string(clusters, city, proxy_mode=True)
-
-            session['last_result'] = {
-                'city': city, 'brands': brands_with_stores,
-                'cluster_count': len(clusters), 'timestamp': result['timestamp']
-            }
 
-            yield _sse_msg('complete', result=result, html_content=html_content, progress=100)
+@app.route('/api/search/jobs', methods=['POST'])
+@login_required
+def api_search_jobs():
+    """API接口：创建后台搜索任务，立即返回任务ID"""
+    try:
+        job = _submit_search_job(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
 
-        except Exception as e:
-            yield _sse_msg('error', f'服务器错误: {e}')
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+@app.route('/api/search/jobs/<job_id>')
+@login_required
+def api_search_job(job_id):
+    """API接口：查询后台搜索任务的状态，任务结束后同时返回结果"""
+    job = search_jobs.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'success': False, 'message': '搜索任务不存在或已过期'}), 404
+
+    info = {
+        'success': True, 'job_id': job.id, 'status': job.status,
+        'created_at': job.created_at, 'finished_at': job.finished_at,
+        'last_event_id': job.last_event_id
+    }
+    event = job.final_event()
+    if event and event['type'] == 'complete':
+        info['result'] = job.result
+    elif event:
+        info['message'] = event.get('message')
+    return jsonify(info)
 
 
 @app.route('/api/search', methods=['POST'])
 @login_required
 def api_search():
-    """API接口：执行商圈搜索"""
+    """
+    API接口：执行商圈搜索
+
+    带 thresholds（多个距离阈值）时只搜索一次门店、建一次索引，返回 results 数组，
+    每个阈值一个结果（格式与单阈值的 result 相同）；所有阈值都没有商圈时与单阈值一样返回 404，
+    session 中的 last_result 记录最大阈值的结果
+    """
     try:
         data = request.get_json()
-        city, brands, threshold, required_brands = _validate_search_params(data)
+        city, brands, threshold, required_brands, limit = _validate_search_params(data)
+        thresholds = _validate_thresholds(data)
 
         brand_stores = search_brands(city, brands)
 
@@ -300,10 +433,33 @@ def api_search():
 
         effective_required = [b for b in required_brands if b in brands_with_stores] if required_brands else None
 
+        if thresholds:
+            sweep = find_clusters(
+                {b: brand_stores[b] for b in brands_with_stores},
+                thresholds,
+                required_brands=effective_required,
+                limit=limit
+            )
+            if not any(sweep.values()):
+                return jsonify({
+                    'success': False, 'message': '未找到符合条件的商圈',
+                    'brands_found': brands_with_stores
+                }), 404
+
+            results = [_build_result(city, brands_with_stores, t, compact_clusters(clusters, brands_with_stores))[1]
+                       for t, clusters in sweep.items()]
+            widest = max(results, key=lambda r: r['threshold'])
+            session['last_result'] = {
+                'city': city, 'brands': brands_with_stores,
+                'cluster_count': widest['cluster_count'], 'timestamp': widest['timestamp']
+            }
+            return jsonify({'success': True, 'results': results})
+
         clusters = find_clusters(
             {b: brand_stores[b] for b in brands_with_stores},
             threshold,
-            required_brands=effective_required
+            required_brands=effective_required,
+            limit=limit
         )
 
         if not clusters:
@@ -312,20 +468,15 @@ def api_search():
                 'brands_found': brands_with_stores
             }), 404
 
-        result = {
-            'success': True, 'city': city, 'brands': brands_with_stores,
-            'threshold': threshold, 'cluster_count': len(clusters),
-            'clusters': clusters, 'timestamp': datetime.now().isoformat()
-        }
-
-        html_content = output_html_string(clusters, city, proxy_mode=True)
+        summary, result = _build_result(city, brands_with_stores, threshold,
+                                        compact_clusters(clusters, brands_with_stores))
 
         session['last_result'] = {
             'city': city, 'brands': brands_with_stores,
-            'cluster_count': len(clusters), 'timestamp': result['timestamp']
+            'cluster_count': len(clusters), 'timestamp': summary['timestamp']
         }
 
-        return jsonify({'success': True, 'result': result, 'html_content': html_content})
+        return jsonify({'success': True, 'result': result})
 
     except ValueError as e:
         return jsonify({'success': False, 'message': str(e)}), 400
@@ -343,24 +494,44 @@ def result():
 @app.route('/map')
 @login_required
 def map_view():
-    """地图查看页面"""
-    html_content = request.args.get('html', '')
-    if not html_content:
-        return render_template('map_view.html', html_content='')
-    return render_template('map_view.html', html_content=html_content)
+    """地图查看页面：静态模板，页面加载后按任务ID（或本地保存的结果）读取商圈数据"""
+    return render_template('map_view.html', amap_js_key=AMAP_JS_KEY or AMAP_API_KEY,
+                           job_id=request.args.get('job_id', ''))
+
+
+@app.route('/api/cache/stats')
+@login_required
+def api_cache_stats():
+    """API接口：POI缓存、地图代理缓存、商圈结果缓存和品牌对近邻缓存统计"""
+    extra = {'proxy_cache': proxy_cache.stats(),
+             'result_cache': RESULT_CACHE.stats() if RESULT_CACHE is not None else None,
+             'pair_cache': PAIR_CACHE.stats() if PAIR_CACHE is not None else None}
+    if POI_CACHE is None:
+        return jsonify({'success': True, 'enabled': False, **extra})
+    return jsonify({'success': True, 'enabled': True, 'poi_cache': POI_CACHE.stats(), **extra})
 
 
 @app.route('/_AMapService/<path:path>')
 def amap_proxy(path):
-    """代理高德 JS API 请求，在服务端附加安全密钥，避免前端暴露 securityJsCode"""
+    """
+    代理高德 JS API 请求，在服务端附加安全密钥，避免前端暴露 securityJsCode
+
+    成功的响应短期缓存（键不含 jscode），相同的并发请求合并为一次上游请求；上游请求复用进程共享的连接池。
+    """
     url = f'https://restapi.amap.com/{path}'
     params = dict(request.args)
-    if AMAP_SECURITY_CODE:
-        params['jscode'] = AMAP_SECURITY_CODE
+    callback = params.get('callback')
+
+    def load():
+        upstream_params = dict(params)
+        if AMAP_SECURITY_CODE:
+            upstream_params['jscode'] = AMAP_SECURITY_CODE
+        resp = get_session().get(url, params=upstream_params, timeout=AMAP_TIMEOUT)
+        return ProxyResponse(resp.content, resp.status_code, resp.headers.get('Content-Type', 'application/json'))
+
     try:
-        resp = http_requests.get(url, params=params, timeout=10)
-        return Response(resp.content, status=resp.status_code,
-                        content_type=resp.headers.get('Content-Type', 'application/json'))
+        cached = proxy_cache.fetch(ProxyCache.make_key(path, params.items()), callback, load)
+        return Response(cached.content, status=cached.status, content_type=cached.content_type)
     except Exception:
         return Response('{"error":"proxy request failed"}', status=502,
                         content_type='application/json')
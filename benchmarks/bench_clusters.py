@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+商圈查找基准 - 在合成城市数据上分阶段计时，并统计内存峰值
+
+阶段：
+- dedupe: 门店去重（deduplicate_stores）
+- table: 构建列式门店表
+- index_build: 构建近邻索引
+- candidate_build: 查询近邻门店对并构建候选集
+- enumeration: 回溯枚举商圈（含部分品牌回退）
+- cluster_dedupe: 商圈去重并还原为输出字典
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_clusters.py
+    python benchmarks/bench_clusters.py --layout hotspots --brands 6 --per-brand 300 --threshold 400
+    python benchmarks/bench_clusters.py --format json --output bench.json
+    python benchmarks/bench_clusters.py --compare bench.json
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import List, Dict, Optional
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from amap_api import deduplicate_stores
+from clique_search import CliqueSearch
+from cluster_finder import find_clusters, _deduplicate_cluster_rows
+from cluster_finder_optimized import build_brand_candidates, _search_all
+from config import DEDUPLICATION_DISTANCE, NEIGHBOR_INDEX_BACKEND
+from neighbor_index import create_neighbor_index
+from parallel_search import ParallelCliqueSearch
+from store_table import StoreTable
+from synthetic import LAYOUTS, generate_city
+
+STAGES = ("dedupe", "table", "index_build", "candidate_build", "enumeration", "cluster_dedupe")
+
+# 默认基准场景：覆盖三种布局、全品牌命中和部分品牌回退（small 场景可与暴力算法核对结果）
+DEFAULT_SUITE = [
+    {"name": "small-3x40", "layout": "downtown", "brands": 3, "per_brand": 40, "threshold": 800},
+    {"name": "uniform-4x300", "layout": "uniform", "brands": 4, "per_brand": 300, "threshold": 500},
+    {"name": "downtown-5x300", "layout": "downtown", "brands": 5, "per_brand": 300, "threshold": 300},
+    {"name": "hotspots-6x300", "layout": "hotspots", "brands": 6, "per_brand": 300, "threshold": 400},
+    {"name": "fallback-6x150", "layout": "uniform", "brands": 6, "per_brand": 150, "threshold": 300},
+]
+
+# 暴力算法只在组合数不超过该值时运行：分块计算会筛掉超出阈值的部分组合，但门店密集时被保留的部分组合
+# 随组合数增长，超过该规模的核对耗时没有上限（6 个品牌的场景由 tests/ 中的小规模数据核对）
+BRUTE_FORCE_LIMIT = 10 ** 12
+
+
+class StageRecorder:
+    """记录各阶段耗时；开启 tracemalloc 时同时记录各阶段的内存峰值增量"""
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.seconds: Dict[str, float] = {}
+        self.peak_bytes: Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        self.seconds[name] = time.perf_counter() - start
+        if self.track_memory:
+            self.peak_bytes[name] = tracemalloc.get_traced_memory()[1] - base
+
+
+def run_pipeline(brand_stores: Dict[str, List[Dict]], threshold: float, recorder: StageRecorder,
+                 dedupe_distance: float = DEDUPLICATION_DISTANCE, index_backend: str = NEIGHBOR_INDEX_BACKEND,
+                 workers: int = 1, required_brands: Optional[List[str]] = None) -> List[Dict]:
+    """按 find_clusters 的流程逐阶段执行，返回商圈列表"""
+    with recorder.stage("dedupe"):
+        deduped = {b: deduplicate_stores(stores, dedupe_distance) for b, stores in brand_stores.items()}
+
+    with recorder.stage("table"):
+        table = StoreTable.from_brand_stores(deduped)
+
+    with recorder.stage("index_build"):
+        index = create_neighbor_index(table, threshold, index_backend)
+
+    with recorder.stage("candidate_build"):
+        pairs = index.query_pairs()
+        brand_candidates, pair_distances = build_brand_candidates(table, pairs)
+        engine = CliqueSearch(table, brand_candidates, pair_distances)
+
+    valid_brands = list(range(len(table.brands)))
+    with recorder.stage("enumeration"):
+        if workers > 1:
+            with ParallelCliqueSearch(engine, pairs, workers) as searcher:
+                rows = _search_all(searcher, table, valid_brands, required_brands)
+        else:
+            rows = _search_all(engine, table, valid_brands, required_brands)
+
+    with recorder.stage("cluster_dedupe"):
+        clusters = table.clusters_to_dicts(_deduplicate_cluster_rows(table, rows))
+
+    return clusters
+
+
+def cluster_digest(clusters: List[Dict]) -> str:
+    """商圈结果的摘要，用于跨提交比对结果是否一致"""
+    canonical = [[sorted((brand, store["poi_id"]) for brand, store in c["brands"].items()),
+                  round(c["max_distance"], 6), c["brand_count"]] for c in clusters]
+    return hashlib.sha1(json.dumps(canonical, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def run_scenario(scenario: Dict, args) -> Dict:
+    """运行一个场景：多次计时取各阶段最短耗时，另做一次 tracemalloc 统计内存峰值"""
+    data = generate_city(scenario["layout"], scenario["brands"], scenario["per_brand"], seed=args.seed)
+    threshold = scenario["threshold"]
+    options = dict(dedupe_distance=args.dedupe_distance, index_backend=args.index_backend, workers=args.workers)
+
+    best = {}
+    clusters = []
+    quiet = io.StringIO()
+    for _ in range(args.repeat):
+        recorder = StageRecorder()
+        with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+            clusters = run_pipeline(data, threshold, recorder, **options)
+        for name, seconds in recorder.seconds.items():
+            best[name] = min(best.get(name, math.inf), seconds)
+        quiet.seek(0)
+        quiet.truncate()
+
+    result = {
+        "name": scenario["name"],
+        "layout": scenario["layout"],
+        "brands": scenario["brands"],
+        "per_brand": scenario["per_brand"],
+        "threshold": threshold,
+        "stores": sum(len(stores) for stores in data.values()),
+        "clusters": len(clusters),
+        "brand_count": clusters[0]["brand_count"] if clusters else 0,
+        "digest": cluster_digest(clusters),
+        "seconds": {name: best[name] for name in STAGES},
+        "total_seconds": sum(best[name] for name in STAGES),
+    }
+
+    if not args.no_memory:
+        recorder = StageRecorder(track_memory=True)
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+                run_pipeline(data, threshold, recorder, **options)
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result["stage_peak_bytes"] = {name: recorder.peak_bytes[name] for name in STAGES}
+
+    if args.brute_force:
+        deduped = {b: deduplicate_stores(stores, args.dedupe_distance) for b, stores in data.items()}
+        combinations = math.prod(len(stores) for stores in deduped.values())
+        if combinations <= BRUTE_FORCE_LIMIT:
+            with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+                start = time.perf_counter()
+                brute = find_clusters(deduped, threshold, use_optimized=False, use_cache=False)
+                result["brute_force_seconds"] = time.perf_counter() - start
+            result["brute_force_matches"] = cluster_digest(brute) == result["digest"]
+
+    return result
+
+
+def git_revision() -> Optional[str]:
+    """当前提交号（不在 git 仓库中时返回 None）"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_bytes(size: int) -> str:
+    """字节数格式化为 KB / MB"""
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f}MB"
+    return f"{size / 1024:.0f}KB"
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    """以表格形式输出基准结果；给出基线时附加耗时对比"""
+    baseline_results = {r["name"]: r for r in baseline["results"]} if baseline else {}
+    print(f"提交: {report['revision'] or '-'}  Python {report['python']}  NumPy {report['numpy']}  "
+          f"种子: {report['seed']}  重复: {report['repeat']}  进程数: {report['workers']}")
+    for result in report["results"]:
+        print()
+        print(f"[{result['name']}] 布局={result['layout']} 门店={result['stores']} 阈值={result['threshold']:g}米 "
+              f"商圈={result['clusters']}（{result['brand_count']}个品牌） 摘要={result['digest']}")
+        old = baseline_results.get(result["name"])
+        for name in STAGES + ("total",):
+            seconds = result["total_seconds"] if name == "total" else result["seconds"][name]
+            line = f"  {name:<16} {seconds * 1000:>10.1f} ms"
+            if "stage_peak_bytes" in result and name != "total":
+                line += f"  峰值 {format_bytes(result['stage_peak_bytes'][name]):>9}"
+            if old:
+                old_seconds = old["total_seconds"] if name == "total" else old["seconds"][name]
+                if seconds > 0:
+                    line += f"  基线 {old_seconds * 1000:>10.1f} ms ({old_seconds / seconds:.2f}x)"
+            print(line)
+        if "peak_memory_bytes" in result:
+            print(f"  内存峰值 {format_bytes(result['peak_memory_bytes'])}")
+        if "brute_force_seconds" in result:
+            print(f"  暴力算法 {result['brute_force_seconds'] * 1000:.1f} ms，"
+                  f"结果{'一致' if result['brute_force_matches'] else '不一致'}")
+        if old and old["digest"] != result["digest"]:
+            print(f"  警告: 结果与基线不一致（基线摘要 {old['digest']}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商圈查找基准（合成城市数据）")
+    parser.add_argument("--layout", choices=LAYOUTS, default=None,
+                        help="只运行一个自定义场景的布局（默认：运行内置场景集）")
+    parser.add_argument("--brands", type=int, default=5, help="自定义场景的品牌数（默认：5）")
+    parser.add_argument("--per-brand", type=int, default=300, help="自定义场景每个品牌的门店数（默认：300）")
+    parser.add_argument("--threshold", type=float, default=300, help="自定义场景的距离阈值（米，默认：300）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认：0）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景的计时次数，取最短耗时（默认：3）")
+    parser.add_argument("--workers", type=int, default=1, help="商圈搜索进程数（默认：1）")
+    parser.add_argument("--index-backend", default=NEIGHBOR_INDEX_BACKEND,
+                        help=f"近邻索引类型（默认：{NEIGHBOR_INDEX_BACKEND}）")
+    parser.add_argument("--dedupe-distance", type=float, default=DEDUPLICATION_DISTANCE,
+                        help=f"门店去重距离（米，默认：{DEDUPLICATION_DISTANCE}）")
+    parser.add_argument("--no-memory", action="store_true", help="不统计内存峰值（tracemalloc 会拖慢运行）")
+    parser.add_argument("--brute-force", action="store_true",
+                        help=f"组合数不超过 {BRUTE_FORCE_LIMIT:,} 时同时运行暴力算法并核对结果")
+    parser.add_argument("--format", choices=("text", "json"), default="text", help="输出格式（默认：text）")
+    parser.add_argument("--output", default=None, help="输出文件（默认：标准输出）")
+    parser.add_argument("--compare", default=None, help="与之前保存的 JSON 结果对比（仅 text 格式）")
+    args = parser.parse_args()
+
+    if args.layout:
+        scenarios = [{"name": f"{args.layout}-{args.brands}x{args.per_brand}", "layout": args.layout,
+                      "brands": args.brands, "per_brand": args.per_brand, "threshold": args.threshold}]
+    else:
+        scenarios = DEFAULT_SUITE
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "index_backend": args.index_backend,
+        "dedupe_distance": args.dedupe_distance,
+        "results": [run_scenario(scenario, args) for scenario in scenarios],
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with (open(args.output, "w", encoding="utf-8") if args.output else contextlib.nullcontext(sys.stdout)) as out:
+        if args.format == "json":
+            json.dump(report, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            with contextlib.redirect_stdout(out):
+                print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
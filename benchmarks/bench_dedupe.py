@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+门店去重微基准 - 对比全量两两比较的旧实现与基于近邻索引的新实现
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_dedupe.py
+    python benchmarks/bench_dedupe.py --sizes 500,2000,8000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import List, Dict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from amap_api import deduplicate_stores
+from config import DEDUPLICATION_DISTANCE
+from distance import one_to_many_distances, store_coordinates
+
+
+def deduplicate_stores_all_pairs(stores: List[Dict], distance_threshold: float = DEDUPLICATION_DISTANCE) -> List[Dict]:
+    """旧实现：每个门店与全部门店计算一次距离（O(n²)），作为正确性与性能的对照"""
+    if len(stores) <= 1:
+        return stores
+
+    removed_indices = set()
+    result = []
+    lats, lons = store_coordinates(stores)
+
+    for i, store1 in enumerate(stores):
+        if i in removed_indices:
+            continue
+
+        nearby_stores = [(i, store1)]
+        distances = one_to_many_distances(lats[i], lons[i], lats, lons)
+        for j in np.flatnonzero(distances < distance_threshold).tolist():
+            if j == i or j in removed_indices:
+                continue
+            nearby_stores.append((j, stores[j]))
+
+        if len(nearby_stores) > 1:
+            nearby_stores.sort(key=lambda x: len(x[1].get("name", "")), reverse=True)
+            result.append(nearby_stores[0][1])
+            for idx, _ in nearby_stores[1:]:
+                removed_indices.add(idx)
+        else:
+            result.append(store1)
+
+    return result
+
+
+def generate_stores(count: int, seed: int, spread: float = 0.1, dup_rate: float = 0.2,
+                    center=(31.23, 121.47)) -> List[Dict]:
+    """
+    生成带重复门店的随机门店列表
+
+    Args:
+        count: 门店数（不含重复门店）
+        seed: 随机种子
+        spread: 坐标相对中心点的最大偏移（度）
+        dup_rate: 每个门店附带一个近距离重复门店的概率
+        center: 中心点 (纬度, 经度)
+
+    Returns:
+        门店列表
+    """
+    rnd = random.Random(seed)
+    stores = []
+    for k in range(count):
+        lat = center[0] + rnd.uniform(-spread, spread)
+        lon = center[1] + rnd.uniform(-spread, spread)
+        stores.append({"name": f"门店{'x' * rnd.randint(0, 4)}{k}", "address": f"地址{k}",
+                       "lat": lat, "lon": lon, "poi_id": f"P{len(stores)}", "type": "餐饮"})
+        if rnd.random() < dup_rate:
+            # 约 0~80 米范围内的重复门店，名称长度随机，用于覆盖"保留最长名称"的分支
+            stores.append({"name": f"门店{'y' * rnd.randint(0, 4)}{k}", "address": "",
+                           "lat": lat + rnd.uniform(-5e-4, 5e-4), "lon": lon + rnd.uniform(-5e-4, 5e-4),
+                           "poi_id": f"P{len(stores)}", "type": "餐饮"})
+    return stores
+
+
+def best_time(fn, repeat: int) -> float:
+    """多次运行取最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="门店去重微基准")
+    parser.add_argument("--sizes", type=str, default="200,1000,4000",
+                        help="门店数列表，用逗号分隔（默认：200,1000,4000）")
+    parser.add_argument("--repeat", type=int, default=3, help="每组重复次数（默认：3）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认：0）")
+    args = parser.parse_args()
+
+    print(f"{'门店数':>8} {'去重后':>8} {'旧实现(ms)':>12} {'新实现(ms)':>12} {'加速比':>8}")
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        stores = generate_stores(size, args.seed)
+
+        expected = deduplicate_stores_all_pairs(stores)
+        actual = deduplicate_stores(stores)
+        if [s["poi_id"] for s in actual] != [s["poi_id"] for s in expected]:
+            print(f"错误: {size} 个门店时新旧实现结果不一致")
+            sys.exit(1)
+
+        old_time = best_time(lambda: deduplicate_stores_all_pairs(stores), args.repeat)
+        new_time = best_time(lambda: deduplicate_stores(stores), args.repeat)
+        print(f"{len(stores):>8} {len(actual):>8} {old_time * 1000:>12.1f} {new_time * 1000:>12.1f} "
+              f"{old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
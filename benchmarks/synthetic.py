@@ -0,0 +1,115 @@
+"""
+合成城市门店数据 - 供基准测试使用的可复现门店生成器
+
+支持三种布局：
+- uniform: 在城市范围内均匀分布
+- downtown: 大部分门店集中在市中心（高斯分布），其余散布在城区
+- hotspots: 门店围绕若干个商圈热点聚集（各品牌共享同一组热点）
+
+同一组参数和随机种子总是生成完全相同的数据。
+"""
+import math
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+LAYOUTS = ("uniform", "downtown", "hotspots")
+
+# 每度纬度对应的米数（近似）
+METERS_PER_DEGREE = 111195.0
+
+
+def _offsets_to_degrees(center: Tuple[float, float], dx: np.ndarray, dy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """把相对中心点的东西 / 南北偏移（米）换算为经纬度"""
+    lat0, lon0 = center
+    lats = lat0 + dy / METERS_PER_DEGREE
+    lons = lon0 + dx / (METERS_PER_DEGREE * math.cos(math.radians(lat0)))
+    return lats, lons
+
+
+def _sample_offsets(rng: np.random.Generator, layout: str, count: int, radius: float,
+                    hotspot_centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按布局生成 count 个门店相对城市中心的偏移（米）"""
+    if layout == "uniform":
+        return rng.uniform(-radius, radius, count), rng.uniform(-radius, radius, count)
+
+    if layout == "downtown":
+        # 70% 门店集中在市中心（标准差为城市半径的 1/8），30% 均匀散布
+        core = rng.random(count) < 0.7
+        dx = np.where(core, rng.normal(0, radius / 8, count), rng.uniform(-radius, radius, count))
+        dy = np.where(core, rng.normal(0, radius / 8, count), rng.uniform(-radius, radius, count))
+        return dx, dy
+
+    if layout == "hotspots":
+        # 85% 门店围绕热点（标准差 400 米），15% 均匀散布
+        spot = rng.integers(0, len(hotspot_centers), count)
+        near = rng.random(count) < 0.85
+        dx = np.where(near, hotspot_centers[spot, 0] + rng.normal(0, 400, count), rng.uniform(-radius, radius, count))
+        dy = np.where(near, hotspot_centers[spot, 1] + rng.normal(0, 400, count), rng.uniform(-radius, radius, count))
+        return dx, dy
+
+    raise ValueError(f"未知的布局: {layout}（可选: {', '.join(LAYOUTS)}）")
+
+
+def generate_city(layout: str = "uniform", brands: int = 4, stores_per_brand: int = 200, seed: int = 0,
+                  radius: float = 15000, hotspots: int = 8, duplicate_rate: float = 0.1,
+                  center: Tuple[float, float] = (31.23, 121.47)) -> Dict[str, List[Dict]]:
+    """
+    生成一个城市的各品牌门店
+
+    Args:
+        layout: 布局（uniform / downtown / hotspots）
+        brands: 品牌数
+        stores_per_brand: 每个品牌的门店数（不含重复门店）
+        seed: 随机种子
+        radius: 城市半径（米，门店分布在以中心点为中心、边长 2×radius 的正方形内）
+        hotspots: hotspots 布局的热点数
+        duplicate_rate: 每个门店附带一条近距离重复记录的概率（模拟高德返回的重复POI，用于去重阶段）
+        center: 城市中心 (纬度, 经度)
+
+    Returns:
+        字典，键为品牌名（品牌1、品牌2……），值为门店列表（字段与 search_poi 返回的一致）
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"未知的布局: {layout}（可选: {', '.join(LAYOUTS)}）")
+
+    rng = np.random.default_rng(seed)
+    hotspot_centers = rng.uniform(-radius * 0.8, radius * 0.8, (max(hotspots, 1), 2))
+
+    result = {}
+    poi_seq = 0
+    for b in range(brands):
+        brand = f"品牌{b + 1}"
+        dx, dy = _sample_offsets(rng, layout, stores_per_brand, radius, hotspot_centers)
+        lats, lons = _offsets_to_degrees(center, dx, dy)
+        name_pads = rng.integers(0, 5, stores_per_brand)
+
+        # 重复记录：与原门店相距 0~60 米，名称长度不同
+        duplicated = rng.random(stores_per_brand) < duplicate_rate
+        dup_dx, dup_dy = rng.uniform(-40, 40, stores_per_brand), rng.uniform(-40, 40, stores_per_brand)
+        dup_lats, dup_lons = _offsets_to_degrees(center, dx + dup_dx, dy + dup_dy)
+        dup_pads = rng.integers(0, 5, stores_per_brand)
+
+        stores = []
+        for k in range(stores_per_brand):
+            poi_seq += 1
+            stores.append({
+                "name": f"{brand}{'分' * int(name_pads[k])}店{k}",
+                "address": f"合成路{k}号",
+                "lat": float(lats[k]),
+                "lon": float(lons[k]),
+                "poi_id": f"SYN{poi_seq:08d}",
+                "type": "餐饮服务"
+            })
+            if duplicated[k]:
+                poi_seq += 1
+                stores.append({
+                    "name": f"{brand}{'门' * int(dup_pads[k])}店{k}",
+                    "address": "",
+                    "lat": float(dup_lats[k]),
+                    "lon": float(dup_lons[k]),
+                    "poi_id": f"SYN{poi_seq:08d}",
+                    "type": "餐饮服务"
+                })
+        result[brand] = stores
+    return result
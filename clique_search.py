@@ -0,0 +1,301 @@
+"""
+团枚举引擎 - 在近邻图上回溯查找商圈
+
+商圈等价于近邻图中"每个品牌恰好一个门店、两两相邻"的团。引擎按候选数从少到多
+确定品牌顺序，每选定一个门店就把其余品牌的可选集合与该门店的近邻集合求交，
+任一品牌的可选集合为空时立即剪枝，不再枚举整个笛卡尔积。
+
+限定最大距离区间 (lower, upper] 时，在距离不超过 upper 的近邻图上回溯，同时记录已选门店之间
+是否都不超过 lower；都不超过时最后一个品牌只选与已选门店距离超过 lower 的门店。
+逐级扩大距离搜索时，内圈的商圈不会在外圈再枚举一次。
+"""
+from typing import List, Dict, Tuple, Optional, Iterable, FrozenSet, Callable
+from store_table import StoreTable, ClusterRows
+
+
+class CliqueSearch:
+    """在候选集（近邻图）上枚举商圈"""
+
+    def __init__(self, table: StoreTable, brand_candidates: Dict[int, Dict[int, Dict[int, List[int]]]],
+                 pair_distances: Dict[Tuple[int, int], float]):
+        """
+        Args:
+            table: 门店表
+            brand_candidates: 候选集，{品牌: {门店: {其他品牌: [门店行索引]}}}
+            pair_distances: 门店对距离，键为 (较小索引, 较大索引)
+        """
+        self.table = table
+        self.pair_distances = pair_distances
+        self.neighbors: Dict[int, Dict[int, FrozenSet[int]]] = {}
+        for candidates in brand_candidates.values():
+            for store_idx, by_brand in candidates.items():
+                self.neighbors[store_idx] = {b: frozenset(rows) for b, rows in by_brand.items()}
+        # 统计：回溯过程中尝试的部分组合数、得到的完整组合数
+        self.nodes = 0
+        self.leaves = 0
+        # 限定距离区间搜索时按距离截取的近邻集合 {距离: 近邻集合}，只保留最近一轮用到的
+        self._neighbors_within: Dict[float, Dict[int, Dict[int, FrozenSet[int]]]] = {}
+        self._max_pair_distance = max(pair_distances.values(), default=0.0)
+
+    def neighbors_within(self, max_distance: float) -> Dict[int, Dict[int, FrozenSet[int]]]:
+        """
+        只保留距离不超过 max_distance 的门店对的近邻集合（结构同 self.neighbors，没有近邻的门店不在其中）
+
+        逐级搜索时每轮只用到本轮上下界两个距离，其余缓存的近邻集合会被丢弃
+        """
+        if max_distance >= self._max_pair_distance:
+            return self.neighbors
+        if max_distance in self._neighbors_within:
+            return self._neighbors_within[max_distance]
+
+        brand_id = self.table.brand_id.tolist()
+        grouped: Dict[int, Dict[int, List[int]]] = {}
+        for (i, j), d in self.pair_distances.items():
+            if d <= max_distance:
+                grouped.setdefault(i, {}).setdefault(brand_id[j], []).append(j)
+                grouped.setdefault(j, {}).setdefault(brand_id[i], []).append(i)
+        neighbors = {idx: {b: frozenset(rows) for b, rows in by_brand.items()} for idx, by_brand in grouped.items()}
+
+        while len(self._neighbors_within) >= 2:
+            del self._neighbors_within[next(iter(self._neighbors_within))]
+        self._neighbors_within[max_distance] = neighbors
+        return neighbors
+
+    def viable_stores(self, brands: List[int],
+                      neighbors: Optional[Dict[int, Dict[int, FrozenSet[int]]]] = None) -> Dict[int, FrozenSet[int]]:
+        """每个品牌中，在其余所有品牌都有近邻的门店（neighbors 默认为 self.neighbors）"""
+        neighbors = self.neighbors if neighbors is None else neighbors
+        empty = {}
+        viable = {}
+        for b in brands:
+            others = [o for o in brands if o != b]
+            viable[b] = frozenset(
+                idx for idx in self.table.brand_rows(b)
+                if all(neighbors.get(idx, empty).get(o) for o in others)
+            )
+        return viable
+
+    def order_brands(self, brands: List[int], viable: Dict[int, FrozenSet[int]]) -> List[int]:
+        """按可选门店数从少到多排列品牌（数量相同时保持原顺序）"""
+        return sorted(brands, key=lambda b: len(viable[b]))
+
+    def count_subset_products(self, brands: List[int]) -> int:
+        """旧的部分品牌回退（对每个品牌子集分别做笛卡尔积）的大致规模：每个门店作为第一个门店时，其后各品牌可选或不选"""
+        total = 0
+        for pos, first in enumerate(brands):
+            rest = brands[pos + 1:]
+            for idx in self.table.brand_rows(first):
+                count = 1
+                for b in rest:
+                    count *= 1 + len(self.neighbors[idx].get(b, ()))
+                total += count
+        return total
+
+    def count_product(self, brands: List[int]) -> int:
+        """旧算法（锚定第一个品牌，对其余品牌候选列表做笛卡尔积）需要检查的组合数"""
+        first, rest = brands[0], brands[1:]
+        total = 0
+        for idx in self.table.brand_rows(first):
+            count = 1
+            for b in rest:
+                count *= len(self.neighbors[idx].get(b, ()))
+                if not count:
+                    break
+            total += count
+        return total
+
+    def anchor_stores(self, brands: List[int], distance_range: Optional[Tuple[float, float]] = None) -> List[int]:
+        """第一个搜索品牌的可选门店（升序），即 search 第一层要遍历的门店，用于划分并行分片"""
+        neighbors = None if distance_range is None else self.neighbors_within(distance_range[1])
+        viable = self.viable_stores(brands, neighbors)
+        return sorted(viable[self.order_brands(brands, viable)[0]])
+
+    def search(self, brands: List[int], anchors: Optional[Iterable[int]] = None,
+               iterate: Optional[Callable[[List[int]], Iterable[int]]] = None,
+               distance_range: Optional[Tuple[float, float]] = None) -> List[ClusterRows]:
+        """
+        枚举指定品牌集合上的所有商圈
+
+        Args:
+            brands: 品牌下标列表（至少2个）
+            anchors: 限定第一个品牌（按搜索顺序）的门店范围，用于分片并行
+            iterate: 包装第一层门店迭代的函数（例如 tqdm 进度条）
+            distance_range: 只枚举最大距离在 (lower, upper] 内的商圈，None 表示不限定
+
+        Returns:
+            商圈列表，按门店行索引元组升序排列（与旧算法的枚举顺序一致）
+        """
+        neighbors, near_neighbors = self.neighbors, None
+        if distance_range is not None:
+            lower, upper = distance_range
+            neighbors = self.neighbors_within(upper)
+            if lower >= 0:
+                near_neighbors = self.neighbors_within(lower)
+
+        viable = self.viable_stores(brands, neighbors)
+        order = self.order_brands(brands, viable)
+        if anchors is not None:
+            viable[order[0]] = viable[order[0]] & frozenset(anchors)
+
+        # 有下界时从"已选门店两两都不超过下界"开始（还没有已选门店，全部可选门店都满足）
+        allowed = {b: viable[b] for b in order}
+        results = []
+        self._extend(order, 0, [], 0.0, allowed, results, iterate, neighbors=neighbors,
+                     near=None if near_neighbors is None else allowed, near_neighbors=near_neighbors)
+        results.sort(key=lambda c: c.rows)
+        return results
+
+    def _extend(self, order: List[int], depth: int, picked: List[int], max_distance: float,
+                allowed: Dict[int, FrozenSet[int]], results: List[ClusterRows],
+                iterate: Optional[Callable[[List[int]], Iterable[int]]] = None,
+                neighbors: Optional[Dict[int, Dict[int, FrozenSet[int]]]] = None,
+                near: Optional[Dict[int, FrozenSet[int]]] = None,
+                near_neighbors: Optional[Dict[int, Dict[int, FrozenSet[int]]]] = None):
+        """
+        回溯：为 order[depth] 品牌选择门店，并收缩其余品牌的可选集合
+
+        限定距离区间时 neighbors 为距离不超过上界的近邻集合；已选门店两两距离都不超过下界时，
+        near 为各品牌中与已选门店距离都不超过下界的门店（near_neighbors 为距离不超过下界的近邻集合），
+        最后一个品牌跳过这些门店，否则 near 为 None
+        """
+        brand = order[depth]
+        remaining = order[depth + 1:]
+        pair_distances = self.pair_distances
+        neighbors = self.neighbors if neighbors is None else neighbors
+
+        stores = allowed[brand]
+        if near is not None and not remaining:
+            stores = stores - near[brand]
+        stores = sorted(stores)
+        for idx in (iterate(stores) if iterate else stores):
+            self.nodes += 1
+
+            # 与已选门店的最大距离（已选门店都在 idx 的近邻集合中）
+            dist = max_distance
+            for other in picked:
+                d = pair_distances[(other, idx) if other < idx else (idx, other)]
+                if d > dist:
+                    dist = d
+
+            if not remaining:
+                self.leaves += 1
+                results.append(ClusterRows(tuple(sorted(picked + [idx])), dist, len(order)))
+                continue
+
+            store_neighbors = neighbors[idx]
+            next_allowed = {}
+            for b in remaining:
+                rows = allowed[b] & store_neighbors.get(b, frozenset())
+                if not rows:
+                    break
+                next_allowed[b] = rows
+            else:
+                next_near = None
+                if near is not None and idx in near[brand]:
+                    store_near = near_neighbors.get(idx, {})
+                    next_near = {b: near[b] & store_near.get(b, frozenset()) for b in remaining}
+                picked.append(idx)
+                self._extend(order, depth + 1, picked, dist, next_allowed, results, neighbors=neighbors,
+                             near=next_near, near_neighbors=near_neighbors)
+                picked.pop()
+
+    def partial_viable_stores(self, brands: List[int], size: int,
+                              excluded: FrozenSet[int] = frozenset()) -> Dict[int, FrozenSet[int]]:
+        """每个品牌中，未被排除、且在至少 size - 1 个其他品牌中有（未被排除的）近邻的门店"""
+        viable = {}
+        for b in brands:
+            others = [o for o in brands if o != b]
+            stores = []
+            for idx in self.table.brand_rows(b):
+                if idx in excluded:
+                    continue
+                neighbors = self.neighbors[idx]
+                covered = 0
+                for o in others:
+                    rows = neighbors.get(o)
+                    if rows and (not excluded or not rows <= excluded):
+                        covered += 1
+                if covered >= size - 1:
+                    stores.append(idx)
+            viable[b] = frozenset(stores)
+        return viable
+
+    def search_level(self, brands: List[int], size: int, required: Iterable[int] = (),
+                     excluded: FrozenSet[int] = frozenset(),
+                     anchors: Optional[FrozenSet[int]] = None) -> List[ClusterRows]:
+        """
+        一次回溯枚举恰好覆盖 size 个品牌的所有商圈（部分品牌回退）
+
+        每一层可以为当前品牌选择一个门店，也可以跳过该品牌（必选品牌不能跳过），
+        所有品牌子集共享同一棵搜索树，不再对每个子集从头枚举。
+
+        Args:
+            brands: 品牌下标列表
+            size: 商圈覆盖的品牌数
+            required: 必选品牌下标（商圈必须包含）
+            excluded: 排除的门店行索引（例如已被品牌数更多的商圈占用的门店）
+            anchors: 限定商圈中第一个选中的门店（按搜索顺序）的范围，用于分片并行
+
+        Returns:
+            商圈列表（未排序）
+        """
+        required_set = frozenset(required)
+        allowed = self.partial_viable_stores(brands, size, excluded)
+        required_order = [b for b in brands if b in required_set]
+        if len(required_order) > size or any(not allowed[b] for b in required_order):
+            return []
+
+        # 必选品牌放在最前面（不能跳过，剪枝最有效），其余品牌按可选门店数从少到多
+        optional_order = sorted((b for b in brands if b not in required_set), key=lambda b: len(allowed[b]))
+        order = required_order + optional_order
+
+        results = []
+        self._extend_partial(order, 0, size, len(order) - size, required_set, [], 0.0, allowed, anchors, results)
+        return results
+
+    def _extend_partial(self, order: List[int], depth: int, size: int, skips: int, required: FrozenSet[int],
+                        picked: List[int], max_distance: float, allowed: Dict[int, FrozenSet[int]],
+                        anchors: Optional[FrozenSet[int]], results: List[ClusterRows]):
+        """部分品牌回溯：为 order[depth] 品牌选择门店或跳过该品牌（最多再跳过 skips 个品牌）"""
+        brand = order[depth]
+        remaining = order[depth + 1:]
+        pair_distances = self.pair_distances
+
+        stores = sorted(allowed[brand])
+        if anchors is not None and not picked:
+            stores = [idx for idx in stores if idx in anchors]
+        for idx in stores:
+            self.nodes += 1
+
+            dist = max_distance
+            for other in picked:
+                d = pair_distances[(other, idx) if other < idx else (idx, other)]
+                if d > dist:
+                    dist = d
+
+            if len(picked) + 1 == size:
+                self.leaves += 1
+                results.append(ClusterRows(tuple(sorted(picked + [idx])), dist, size))
+                continue
+
+            # 收缩其余品牌的可选集合；变为空的品牌只能跳过，超出可跳过数量或为必选品牌时剪枝
+            neighbors = self.neighbors[idx]
+            next_allowed = {}
+            empty = 0
+            for b in remaining:
+                rows = allowed[b] & neighbors.get(b, frozenset())
+                if not rows:
+                    empty += 1
+                    if b in required or empty > skips:
+                        break
+                next_allowed[b] = rows
+            else:
+                picked.append(idx)
+                self._extend_partial(order, depth + 1, size, skips, required, picked, dist,
+                                     next_allowed, anchors, results)
+                picked.pop()
+
+        # 跳过当前品牌
+        if skips > 0 and brand not in required:
+            self._extend_partial(order, depth + 1, size, skips - 1, required, picked, max_distance,
+                                 allowed, anchors, results)
@@ -1,228 +1,325 @@
 """
 商圈查找核心算法
 """
-from typing import List, Dict, Tuple
-from itertools import product
-import math
-from tqdm import tqdm
-from distance import check_all_distances, calculate_max_distance
+from typing import List, Dict, Union, Optional, Iterator, Sequence
+from contextlib import closing
+from itertools import islice
+from config import (CLUSTER_WORKERS, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH, RESULT_CACHE_TTL,
+                    RESULT_CACHE_DISK_MAX_ENTRIES)
+from product_search import ProductSearch
+from progress import Progress, ProgressSink
+from result_cache import ResultCache
+from store_table import StoreTable, ClusterRows
 
 # 尝试导入优化版本
 try:
-    from cluster_finder_optimized import find_clusters_optimized
+    from cluster_finder_optimized import find_cluster_rows, find_cluster_rows_sweep, iter_cluster_rows
     OPTIMIZED_AVAILABLE = True
 except ImportError:
     OPTIMIZED_AVAILABLE = False
 
+# 商圈结果缓存（RESULT_CACHE_MAX_ENTRIES 为 0 时关闭）
+RESULT_CACHE = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH, RESULT_CACHE_TTL,
+                           RESULT_CACHE_DISK_MAX_ENTRIES) if RESULT_CACHE_MAX_ENTRIES > 0 else None
 
-def _store_key(store: Dict) -> str:
-    """生成门店唯一标识"""
-    pid = store.get('poi_id')
-    if pid:
-        return pid
-    return f"{store['lat']:.6f},{store['lon']:.6f}"
 
-
-def _deduplicate_clusters(clusters: List[Dict]) -> List[Dict]:
+def _deduplicate_cluster_rows(table: StoreTable, clusters: List[ClusterRows],
+                              progress: Optional[ProgressSink] = None) -> List[ClusterRows]:
     """
     对商圈列表去重：每个门店只保留在品牌数最多（距离最短）的商圈中。
 
-    算法：按 brand_count 降序、max_distance 升序排列，贪心分配。
+    算法：按 brand_count 降序、max_distance 升序排列，贪心分配；门店以 table.key_id 标识。
     """
     if not clusters:
         return clusters
 
     sorted_clusters = sorted(
-        clusters, key=lambda c: (-c['brand_count'], c['max_distance'])
+        clusters, key=lambda c: (-c.brand_count, c.max_distance)
     )
 
+    key_id = table.key_id.tolist()
     used_stores = set()
     result = []
 
     for cluster in sorted_clusters:
-        store_keys = {_store_key(s) for s in cluster['brands'].values()}
+        store_keys = {key_id[idx] for idx in cluster.rows}
 
-        if store_keys & used_stores:
+        if not used_stores.isdisjoint(store_keys):
             continue
 
         used_stores |= store_keys
         result.append(cluster)
 
     if len(result) < len(clusters):
-        print(f"  去重: {len(clusters)} 个商圈 -> {len(result)} 个商圈（每店仅归属品牌最多的商圈）")
+        Progress.of(progress).log("dedupe", f"  去重: {len(clusters)} 个商圈 -> {len(result)} 个商圈（每店仅归属品牌最多的商圈）")
 
     return result
 
 
-def find_clusters(brand_stores_dict: Dict[str, List[Dict]], threshold: float, required_brands: List[str] = None, use_optimized: bool = True) -> List[Dict]:
+def find_clusters(brand_stores_dict: Union[Dict[str, List[Dict]], StoreTable], threshold: Union[float, Sequence[float]], required_brands: List[str] = None, use_optimized: bool = True, workers: Optional[int] = None,
+                  progress: Optional[ProgressSink] = None, limit: Optional[int] = None,
+                  use_cache: bool = True) -> Union[List[Dict], Dict[float, List[Dict]]]:
     """
     查找所有符合条件的商圈
 
     商圈定义：每个品牌至少有一个门店，且这些门店之间两两距离都小于阈值
 
     Args:
-        brand_stores_dict: 字典，键为品牌名，值为该品牌的门店列表
-        threshold: 距离阈值（米）
+        brand_stores_dict: 字典，键为品牌名，值为该品牌的门店列表；也可以直接传入门店表
+        threshold: 距离阈值（米）；传入阈值列表时一次计算全部阈值（见 find_clusters_sweep）
         required_brands: 必选品牌列表，回退时子集必须包含这些品牌
         use_optimized: 是否使用优化算法（默认True）
+        workers: 优化算法的搜索进程数，大于1时多进程并行搜索（默认使用 CLUSTER_WORKERS 配置）
+        progress: 进度事件接收器，默认输出到控制台（print 和 tqdm 进度条）
+        limit: 最多返回的商圈数（按品牌数降序、最大距离升序排在最前的商圈），None 表示不限制。
+            优化算法取够后即停止搜索（见 iter_clusters），原始算法只截取结果
+        use_cache: 是否使用商圈结果缓存（RESULT_CACHE，相同门店数据和参数的查询直接返回上次的结果）
 
     Returns:
-        符合条件的商圈列表，如果没有完全符合条件的，返回覆盖品牌最多的组合
+        符合条件的商圈列表，如果没有完全符合条件的，返回覆盖品牌最多的组合；
+        threshold 为列表时返回 {阈值: 商圈列表}
+    """
+    if isinstance(threshold, (list, tuple)):
+        return find_clusters_sweep(brand_stores_dict, threshold, required_brands=required_brands,
+                                   use_optimized=use_optimized, workers=workers, progress=progress, limit=limit,
+                                   use_cache=use_cache)
+
+    progress = Progress.of(progress)
+    table = _as_table(brand_stores_dict)
+    cache_key = _cache_key(table, threshold, required_brands, use_cache)
+    clusters = _cache_get(cache_key, limit, progress)
+    if clusters is not None:
+        return table.clusters_to_dicts(clusters)
+
+    if limit:
+        with closing(_iter_rows(table, threshold, required_brands, use_optimized, workers, progress)) as rows:
+            clusters = list(islice(rows, limit))
+    elif use_optimized and OPTIMIZED_AVAILABLE:
+        # 如果优化版本可用且启用，使用优化算法（在门店表上按行索引计算，最后才还原为字典）
+        clusters = _deduplicate_cluster_rows(table, find_cluster_rows(
+            table, threshold, required_brands=required_brands,
+            workers=CLUSTER_WORKERS if workers is None else workers, progress=progress
+        ), progress)
+    else:
+        # 否则使用原始算法
+        clusters = list(_iter_cluster_rows_brute(table, threshold, required_brands, progress))
+
+    if cache_key is not None:
+        RESULT_CACHE.put(cache_key, clusters, limit or None)
+    return table.clusters_to_dicts(clusters)
+
+
+def find_clusters_sweep(brand_stores_dict: Union[Dict[str, List[Dict]], StoreTable], thresholds: Sequence[float],
+                        required_brands: List[str] = None, use_optimized: bool = True, workers: Optional[int] = None,
+                        progress: Optional[ProgressSink] = None, limit: Optional[int] = None,
+                        use_cache: bool = True) -> Dict[float, List[Dict]]:
     """
-    # 如果优化版本可用且启用，使用优化算法
+    一次查找多个距离阈值的商圈（例如比较 100 / 200 / 300 / 500 米的结果），代价接近只查一个阈值
+
+    优化算法只按最大阈值构建一次空间索引和近邻门店对，较小阈值的近邻图从中按距离截取
+    （见 cluster_finder_optimized.find_cluster_rows_sweep）；原始算法逐个阈值计算。
+    结果缓存中已有的阈值不再计算。
+
+    Args:
+        brand_stores_dict: 字典，键为品牌名，值为该品牌的门店列表；也可以直接传入门店表
+        thresholds: 距离阈值列表（米）
+        其余参数同 find_clusters，limit 对每个阈值分别生效
+
+    Returns:
+        {阈值: 商圈列表}，按 thresholds 的顺序（重复的阈值只保留一个），每个阈值的结果与 find_clusters 相同
+    """
+    progress = Progress.of(progress)
+    table = _as_table(brand_stores_dict)
+    cache_keys = {t: _cache_key(table, t, required_brands, use_cache) for t in thresholds}
+    results = {t: _cache_get(key, limit, progress) for t, key in cache_keys.items()}
+    missing = [t for t, clusters in results.items() if clusters is None]
+
+    if missing and use_optimized and OPTIMIZED_AVAILABLE:
+        rows = find_cluster_rows_sweep(table, missing, required_brands=required_brands,
+                                       workers=CLUSTER_WORKERS if workers is None else workers, progress=progress)
+        for t, clusters in rows.items():
+            results[t] = _deduplicate_cluster_rows(table, clusters, progress)[:limit]
+    elif missing:
+        for t in missing:
+            progress.log("candidates", f"  距离阈值 {t:g} 米")
+            results[t] = list(islice(_iter_cluster_rows_brute(table, t, required_brands, progress), limit))
+
+    for t in missing:
+        if cache_keys[t] is not None:
+            RESULT_CACHE.put(cache_keys[t], results[t], limit or None)
+    return {t: table.clusters_to_dicts(clusters) for t, clusters in results.items()}
+
+
+def iter_clusters(brand_stores_dict: Union[Dict[str, List[Dict]], StoreTable], threshold: float, required_brands: List[str] = None,
+                  use_optimized: bool = True, workers: Optional[int] = None,
+                  progress: Optional[ProgressSink] = None, limit: Optional[int] = None,
+                  use_cache: bool = True) -> Iterator[Dict]:
+    """
+    逐个返回商圈（find_clusters 的惰性版本），顺序与 find_clusters 的结果相同
+
+    优化算法按距离由近到远分轮搜索并逐个去重（见 cluster_finder_optimized.iter_cluster_rows），
+    第一批商圈在全部组合枚举完之前就会返回，商圈字典在迭代时才生成；调用方停止迭代后不再继续搜索。
+    原始算法需要先检查完全部组合，只是逐个生成去重后的商圈字典。
+    全部返回（或取够 limit 个）后结果写入结果缓存，中途停止迭代时不缓存。
+
+    参数同 find_clusters（threshold 只能是单个阈值）
+
+    Yields:
+        商圈字典，包含 brands / stores / max_distance / brand_count
+    """
+    progress = Progress.of(progress)
+    table = _as_table(brand_stores_dict)
+    limit = limit or None
+    cache_key = _cache_key(table, threshold, required_brands, use_cache)
+    clusters = _cache_get(cache_key, limit, progress)
+    if clusters is not None:
+        yield from table.iter_cluster_dicts(clusters)
+        return
+
+    rows = _iter_rows(table, threshold, required_brands, use_optimized, workers, progress)
+    yield from table.iter_cluster_dicts(_iter_recorded(rows, cache_key, limit))
+
+
+def _iter_rows(table: StoreTable, threshold: float, required_brands: Optional[List[str]], use_optimized: bool,
+               workers: Optional[int], progress: Progress) -> Iterator[ClusterRows]:
+    """按去重后的顺序逐个返回商圈（行索引形式）：优化算法见 iter_cluster_rows，否则为原始算法"""
     if use_optimized and OPTIMIZED_AVAILABLE:
-        clusters = find_clusters_optimized(brand_stores_dict, threshold, required_brands=required_brands)
-        return _deduplicate_clusters(clusters)
+        return iter_cluster_rows(table, threshold, required_brands=required_brands,
+                                 workers=CLUSTER_WORKERS if workers is None else workers, progress=progress)
+    return _iter_cluster_rows_brute(table, threshold, required_brands, progress)
 
-    # 否则使用原始算法
-    brands = list(brand_stores_dict.keys())
-    
-    # 过滤掉没有门店的品牌
-    valid_brands = [brand for brand in brands if brand_stores_dict[brand]]
+
+def _iter_recorded(rows: Iterator[ClusterRows], cache_key: Optional[str],
+                   limit: Optional[int]) -> Iterator[ClusterRows]:
+    """逐个转发前 limit 个商圈，全部转发完后写入结果缓存（cache_key 为 None 时不缓存）"""
+    recorded = []
+    with closing(rows):
+        for cluster in islice(rows, limit):
+            recorded.append(cluster)
+            yield cluster
+    if cache_key is not None:
+        RESULT_CACHE.put(cache_key, recorded, limit)
+
+
+def _cache_key(table: StoreTable, threshold: float, required_brands: Optional[List[str]],
+               use_cache: bool) -> Optional[str]:
+    """结果缓存的键，不使用缓存（或缓存已关闭）时为 None"""
+    if not use_cache or RESULT_CACHE is None:
+        return None
+    return ResultCache.make_key(table, threshold, required_brands)
+
+
+def _cache_get(cache_key: Optional[str], limit: Optional[int], progress: Progress) -> Optional[List[ClusterRows]]:
+    """读取结果缓存，命中时输出日志"""
+    if cache_key is None:
+        return None
+    clusters = RESULT_CACHE.get(cache_key, limit or None)
+    if clusters is not None:
+        progress.log("cache", f"  命中结果缓存: {len(clusters)} 个商圈")
+    return clusters
+
+
+def _as_table(brand_stores_dict: Union[Dict[str, List[Dict]], StoreTable]) -> StoreTable:
+    """把 {品牌: 门店列表} 转换为门店表（已经是门店表时直接返回）"""
+    if isinstance(brand_stores_dict, StoreTable):
+        return brand_stores_dict
+    return StoreTable.from_brand_stores(brand_stores_dict)
+
+
+def _iter_cluster_rows_brute(table: StoreTable, threshold: float, required_brands: Optional[List[str]],
+                             progress: Progress) -> Iterator[ClusterRows]:
+    """原始算法：检查每个品牌各选一个门店的全部组合（分块向量化计算，见 ProductSearch），逐个返回去重后的商圈"""
+    valid_brands = list(range(len(table.brands)))
     
     if not valid_brands:
-        return []
+        return
     
     if len(valid_brands) == 1:
         # 只有一个品牌，返回所有门店作为独立商圈
-        brand = valid_brands[0]
-        clusters = []
-        for store in brand_stores_dict[brand]:
-            clusters.append({
-                "brands": {brand: store},
-                "stores": [store],
-                "max_distance": 0.0,
-                "brand_count": 1
-            })
-        return clusters
+        yield from (ClusterRows((idx,), 0.0, 1) for idx in table.brand_rows(0))
+        return
     
-    # 生成所有可能的门店组合（每个品牌选一个门店）
-    store_lists = [brand_stores_dict[brand] for brand in valid_brands]
-    
-    # 计算总组合数
-    total_combinations = math.prod(len(stores) for stores in store_lists)
+    engine = ProductSearch(table)
+    total_combinations = engine.count_product(valid_brands)
     
     # 显示详细信息
-    print(f"  品牌数量: {len(valid_brands)}")
-    print(f"  各品牌门店数: {', '.join(f'{brand}({len(stores)})' for brand, stores in zip(valid_brands, store_lists))}")
-    print(f"  总组合数: {total_combinations:,}")
-    
-    # 预估时间（假设每个组合检查需要约0.001秒）
-    estimated_seconds = total_combinations * 0.001
-    if estimated_seconds < 60:
-        time_str = f"{estimated_seconds:.1f} 秒"
-    elif estimated_seconds < 3600:
-        time_str = f"{estimated_seconds/60:.1f} 分钟"
-    else:
-        time_str = f"{estimated_seconds/3600:.1f} 小时"
-    
-    if total_combinations > 1000000:
-        print(f"  预估时间: {time_str}（组合数量较大，可能需要较长时间）")
-    elif total_combinations > 100000:
-        print(f"  预估时间: {time_str}")
+    progress.start("candidates")
+    progress.log("candidates", f"  品牌数量: {len(valid_brands)}")
+    progress.log("candidates", f"  各品牌门店数: {', '.join(f'{table.brands[b]}({table.brand_size(b)})' for b in valid_brands)}")
+    progress.log("candidates", f"  总组合数: {total_combinations:,}")
     
-    valid_clusters = []
-    best_partial_cluster = None
-    best_brand_count = 0
-    
-    # 遍历所有可能的组合，显示进度条
-    for combination in tqdm(product(*store_lists), total=total_combinations, desc="  查找商圈", unit="组合", ncols=100):
-        stores = list(combination)
-        
-        # 检查所有门店之间两两距离是否都小于阈值
-        is_valid, max_dist = check_all_distances(stores, threshold)
-        
-        if is_valid:
-            # 完全符合条件的商圈
-            cluster = {
-                "brands": {valid_brands[i]: stores[i] for i in range(len(valid_brands))},
-                "stores": stores,
-                "max_distance": max_dist,
-                "brand_count": len(valid_brands)
-            }
-            valid_clusters.append(cluster)
-        else:
-            # 记录部分匹配的结果（覆盖品牌最多的）
-            if len(valid_brands) > best_brand_count:
-                best_brand_count = len(valid_brands)
-                best_partial_cluster = {
-                    "brands": {valid_brands[i]: stores[i] for i in range(len(valid_brands))},
-                    "stores": stores,
-                    "max_distance": max_dist,
-                    "brand_count": len(valid_brands)
-                }
+    # 遍历所有可能的组合（每个品牌选一个门店），显示进度条
+    progress.start("enumerate")
+    valid_clusters = _search_product(engine, valid_brands, threshold, progress, "enumerate", "  查找商圈")
+    progress.log("enumerate", f"  计算距离的组合数: {engine.checked:,}")
     
     # 如果有完全符合条件的商圈，返回去重后的结果
     if valid_clusters:
-        return _deduplicate_clusters(valid_clusters)
+        yield from _deduplicate_cluster_rows(table, valid_clusters, progress)
+        return
     
     # 如果没有完全符合条件的，尝试找部分品牌组合
     # 收集所有符合条件的商圈，优先返回品牌数多的
     from itertools import combinations
     
-    print(f"  未找到完全符合条件的商圈，查找部分品牌组合...")
+    progress.start("fallback", f"  未找到完全符合条件的商圈，查找部分品牌组合...")
     
-    all_partial_clusters = []
-    max_brand_count = 0
+    # 没有门店的品牌不在门店表中，包含它的品牌子集都不存在
+    absent = [b for b in required_brands if b not in table.brand_index] if required_brands else []
+    if absent:
+        progress.log("fallback", f"  必选品牌没有门店: {', '.join(absent)}")
+        return
     
-    # 计算部分组合的总数（用于显示进度）
+    required_ids = {table.brand_index[b] for b in required_brands} if required_brands else set()
     min_r = max(2, len(required_brands)) if required_brands else 2
-    total_partial_combinations = 0
-    for r in range(len(valid_brands), min_r - 1, -1):
-        if r < min_r:
-            break
-        for brand_subset in combinations(valid_brands, r):
-            if required_brands and not all(rb in brand_subset for rb in required_brands):
-                continue
-            store_lists_subset = [brand_stores_dict[brand] for brand in brand_subset]
-            total_partial_combinations += math.prod(len(stores) for stores in store_lists_subset)
-
+    subsets = [brand_subset
+               for r in range(len(valid_brands), min_r - 1, -1)
+               for brand_subset in combinations(valid_brands, r)
+               if required_ids <= set(brand_subset)]
+    
+    # 计算部分组合的总数（用于显示进度）
+    total_partial_combinations = sum(engine.count_product(list(brand_subset)) for brand_subset in subsets)
     if total_partial_combinations > 0:
-        print(f"  需要检查 {total_partial_combinations:,} 个部分品牌组合（至少{min_r}个品牌）...")
-
-    # 从多到少尝试品牌组合
-    # 查找所有符合条件的商圈，不提前结束
+        progress.log("fallback", f"  需要检查 {total_partial_combinations:,} 个部分品牌组合（至少{min_r}个品牌）...")
+    
+    # 从多到少尝试品牌组合，查找所有符合条件的商圈，不提前结束
+    all_partial_clusters = []
     for r in range(len(valid_brands), min_r - 1, -1):
-        if r < min_r:
-            break
-
-        clusters_found = False
-        for brand_subset in combinations(valid_brands, r):
-            if required_brands and not all(rb in brand_subset for rb in required_brands):
-                continue
-            store_lists_subset = [brand_stores_dict[brand] for brand in brand_subset]
-            subset_total = math.prod(len(stores) for stores in store_lists_subset)
-            
-            brand_names = ', '.join(brand_subset)
+        level_count = 0
+        for brand_subset in (subset for subset in subsets if len(subset) == r):
+            brand_names = ', '.join(table.brands[b] for b in brand_subset)
             if len(brand_names) > 30:
                 brand_names = brand_names[:27] + "..."
             desc = f"  检查 {len(brand_subset)} 个品牌"
             
-            for combination in tqdm(product(*store_lists_subset), total=subset_total, desc=desc, unit="组合", leave=False, ncols=100, postfix=brand_names):
-                stores = list(combination)
-                is_valid, max_dist = check_all_distances(stores, threshold)
-                
-                if is_valid:
-                    cluster = {
-                        "brands": {brand_subset[i]: stores[i] for i in range(len(brand_subset))},
-                        "stores": stores,
-                        "max_distance": max_dist,
-                        "brand_count": len(brand_subset)
-                    }
-                    all_partial_clusters.append(cluster)
-                    max_brand_count = max(max_brand_count, len(brand_subset))
-                    clusters_found = True
+            clusters = _search_product(engine, list(brand_subset), threshold, progress, "fallback",
+                                       f"{desc} ({brand_names})", key=brand_names)
+            all_partial_clusters.extend(clusters)
+            level_count += len(clusters)
         
-        # 如果找到了当前品牌数的商圈，继续查找（可能还有其他组合）
-        if clusters_found:
-            count = len([c for c in all_partial_clusters if c['brand_count'] == r])
-            print(f"  找到 {count} 个包含 {r} 个品牌的商圈")
+        if level_count:
+            progress.log("fallback", f"  找到 {level_count} 个包含 {r} 个品牌的商圈")
     
-    # 按品牌数量降序排序，去重后返回
+    # 去重后返回（品牌数多的优先）
     if all_partial_clusters:
-        all_partial_clusters.sort(key=lambda x: x['brand_count'], reverse=True)
-        print(f"  共找到 {len(all_partial_clusters)} 个符合条件的商圈（至少2个品牌）")
-        return _deduplicate_clusters(all_partial_clusters)
-    
-    return []
+        progress.log("fallback", f"  共找到 {len(all_partial_clusters)} 个符合条件的商圈（至少2个品牌）")
+        yield from _deduplicate_cluster_rows(table, all_partial_clusters, progress)
+
+
+def _search_product(engine: ProductSearch, brands: List[int], threshold: float, progress: Progress,
+                    stage: str, message: str, key: Optional[str] = None) -> List[ClusterRows]:
+    """分块枚举品牌组合，并以"组合"为单位发送计数型进度（与 Progress.iterate 相同的节流）"""
+    total = engine.count_product(brands)
+    step = max(1, total // Progress.TICKS)
+    state = {"done": 0, "next_tick": step}
+    progress.emit(stage, message, 0, total, key=key, unit="组合")
+
+    def advance(count: int):
+        state["done"] += count
+        if state["done"] >= state["next_tick"] and state["done"] < total:
+            state["next_tick"] = state["done"] + step
+            progress.emit(stage, message, state["done"], total, key=key, unit="组合")
 
+    clusters = engine.search(brands, threshold, advance)
+    progress.emit(stage, message, total, total, key=key, unit="组合")
+    return clusters
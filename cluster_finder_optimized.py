@@ -1,75 +1,31 @@
 """
 优化的商圈查找算法 - 使用空间索引和早期剪枝
 """
-from typing import List, Dict, Tuple, Set
-from itertools import product
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 import math
 from collections import defaultdict
-from tqdm import tqdm
-from distance import haversine_distance, check_all_distances
+from contextlib import closing, nullcontext
+from itertools import islice, combinations
+import numpy as np
+from config import NEIGHBOR_INDEX_BACKEND, CLUSTER_WORKERS, PAIR_CACHE_MAX_PAIRS
+from clique_search import CliqueSearch
+from neighbor_index import SpatialGrid, create_neighbor_index  # SpatialGrid 保留在此导出，兼容旧的导入路径
+from pair_cache import PairCache
+from parallel_search import ParallelCliqueSearch
+from progress import Progress, ProgressSink
+from store_table import StoreTable, ClusterRows
 
+# 逐个返回商圈（iter_cluster_rows）时全部品牌商圈的逐级搜索距离（阈值的比例，最后一级为阈值本身）：
+# 较近的商圈在枚举更远的门店组合之前就已返回，调用方停止迭代（例如已取够 limit 个）时不再搜索更远的距离
+PROGRESSIVE_THRESHOLD_STEPS = (0.25, 0.5, 1.0)
 
-class SpatialGrid:
-    """简单的空间网格索引，用于快速查找附近的门店"""
-    
-    def __init__(self, stores: List[Dict], threshold: float):
-        """
-        初始化空间网格
-        
-        Args:
-            stores: 门店列表
-            threshold: 距离阈值
-        """
-        self.threshold = threshold
-        self.grid_size = threshold * 2  # 网格大小设为阈值的2倍
-        self.grid = defaultdict(list)
-        self.stores = stores
-        
-        # 将门店放入网格
-        for idx, store in enumerate(stores):
-            grid_key = self._get_grid_key(store["lat"], store["lon"])
-            self.grid[grid_key].append(idx)
-    
-    def _get_grid_key(self, lat: float, lon: float) -> Tuple[int, int]:
-        """获取门店所在的网格坐标"""
-        grid_lat = int(lat / (self.grid_size / 111000))  # 大约111km每度
-        grid_lon = int(lon / (self.grid_size / (111000 * math.cos(math.radians(lat)))))
-        return (grid_lat, grid_lon)
-    
-    def get_nearby_stores(self, store_idx: int) -> Set[int]:
-        """
-        获取指定门店附近的所有门店索引
-        
-        Args:
-            store_idx: 门店索引
-        
-        Returns:
-            附近门店索引集合
-        """
-        store = self.stores[store_idx]
-        grid_key = self._get_grid_key(store["lat"], store["lon"])
-        
-        nearby = set()
-        # 检查当前网格和相邻8个网格
-        for dlat in [-1, 0, 1]:
-            for dlon in [-1, 0, 1]:
-                check_key = (grid_key[0] + dlat, grid_key[1] + dlon)
-                if check_key in self.grid:
-                    for other_idx in self.grid[check_key]:
-                        if other_idx != store_idx:
-                            # 精确距离检查
-                            other_store = self.stores[other_idx]
-                            dist = haversine_distance(
-                                store["lat"], store["lon"],
-                                other_store["lat"], other_store["lon"]
-                            )
-                            if dist <= self.threshold:
-                                nearby.add(other_idx)
-        
-        return nearby
+# 品牌对近邻门店对缓存（PAIR_CACHE_MAX_PAIRS 为 0 时关闭）：品牌组合有重叠的查询只计算新的品牌对
+PAIR_CACHE = PairCache(PAIR_CACHE_MAX_PAIRS) if PAIR_CACHE_MAX_PAIRS > 0 else None
 
 
-def find_clusters_optimized(brand_stores_dict: Dict[str, List[Dict]], threshold: float, required_brands: List[str] = None) -> List[Dict]:
+def find_clusters_optimized(brand_stores_dict: Dict[str, List[Dict]], threshold: float, required_brands: List[str] = None,
+                            index_backend: str = NEIGHBOR_INDEX_BACKEND, workers: int = CLUSTER_WORKERS,
+                            progress: Optional[ProgressSink] = None, limit: Optional[int] = None) -> List[Dict]:
     """
     优化的商圈查找算法
     
@@ -78,188 +34,423 @@ def find_clusters_optimized(brand_stores_dict: Dict[str, List[Dict]], threshold:
     Args:
         brand_stores_dict: 字典，键为品牌名，值为该品牌的门店列表
         threshold: 距离阈值（米）
+        required_brands: 必选品牌列表，回退时子集必须包含这些品牌
+        index_backend: 近邻索引类型（auto / grid / kdtree）
+        workers: 搜索进程数，大于1时按锚点门店分片并行搜索
+        progress: 进度事件接收器，默认输出到控制台
+        limit: 最多返回的商圈数（见 find_cluster_rows），None 表示不限制
     
     Returns:
         符合条件的商圈列表
     """
-    brands = list(brand_stores_dict.keys())
-    valid_brands = [brand for brand in brands if brand_stores_dict[brand]]
+    table = StoreTable.from_brand_stores(brand_stores_dict)
+    return table.clusters_to_dicts(find_cluster_rows(table, threshold, required_brands=required_brands,
+                                                     index_backend=index_backend, workers=workers, progress=progress,
+                                                     limit=limit))
+
+
+def iter_clusters_optimized(brand_stores_dict: Dict[str, List[Dict]], threshold: float, required_brands: List[str] = None,
+                            index_backend: str = NEIGHBOR_INDEX_BACKEND, workers: int = CLUSTER_WORKERS,
+                            progress: Optional[ProgressSink] = None) -> Iterator[Dict]:
+    """
+    find_clusters_optimized 的惰性版本：按去重后的顺序边查找边返回商圈字典（见 iter_cluster_rows）
+
+    参数同 find_clusters_optimized
+    """
+    table = StoreTable.from_brand_stores(brand_stores_dict)
+    yield from table.iter_cluster_dicts(iter_cluster_rows(table, threshold, required_brands=required_brands,
+                                                          index_backend=index_backend, workers=workers,
+                                                          progress=progress))
+
+
+def build_brand_candidates(table: StoreTable, pairs: Tuple[np.ndarray, np.ndarray, np.ndarray]
+                           ) -> Tuple[Dict[int, Dict[int, Dict[int, List[int]]]], Dict[Tuple[int, int], float]]:
+    """
+    根据近邻门店对构建候选集
     
-    if not valid_brands:
-        return []
+    Args:
+        table: 门店表
+        pairs: 近邻索引返回的 (i数组, j数组, 距离数组)
     
-    if len(valid_brands) == 1:
-        brand = valid_brands[0]
-        clusters = []
-        for store in brand_stores_dict[brand]:
-            clusters.append({
-                "brands": {brand: store},
-                "stores": [store],
-                "max_distance": 0.0,
-                "brand_count": 1
-            })
-        return clusters
+    Returns:
+        (候选集, 门店对距离缓存)
+        候选集结构为 {品牌: {门店: {其他品牌: [门店行索引（升序）]}}}，只包含其他品牌的门店
+    """
+    pair_i, pair_j, pair_d = pairs
+    brand_id = table.brand_id
     
-    # 构建所有门店的索引映射
-    all_stores = []
-    brand_to_indices = {}
-    store_to_brand = {}
+    # 只保留不同品牌之间的门店对
+    cross = brand_id[pair_i] != brand_id[pair_j]
+    pair_i, pair_j, pair_d = pair_i[cross], pair_j[cross], pair_d[cross]
+    pair_distances = dict(zip(zip(pair_i.tolist(), pair_j.tolist()), pair_d.tolist()))
     
-    for brand in valid_brands:
-        brand_indices = []
-        for store in brand_stores_dict[brand]:
-            idx = len(all_stores)
-            all_stores.append(store)
-            brand_indices.append(idx)
-            store_to_brand[idx] = brand
-        brand_to_indices[brand] = brand_indices
+    # 展开为双向边，按 (源门店, 目标门店) 排序，保证候选列表升序
+    src = np.concatenate((pair_i, pair_j))
+    dst = np.concatenate((pair_j, pair_i))
+    order = np.lexsort((dst, src))
+    src = src[order].tolist()
+    dst = dst[order].tolist()
+    store_to_brand = brand_id.tolist()
     
-    # 构建空间索引
-    print("  构建空间索引...")
-    spatial_grid = SpatialGrid(all_stores, threshold)
+    brand_candidates = {b: {idx: defaultdict(list) for idx in table.brand_rows(b)}
+                        for b in range(len(table.brands))}
+    for s, d in zip(src, dst):
+        brand_candidates[store_to_brand[s]][s][store_to_brand[d]].append(d)
     
-    # 为每个品牌的门店构建候选集（只包含其他品牌的门店）
-    print("  构建候选集...")
-    brand_candidates = {}
-    total_original = math.prod(len(brand_stores_dict[b]) for b in valid_brands)
+    return brand_candidates, pair_distances
+
+
+def _iter_disjoint(clusters: Iterable[ClusterRows], key_id: List[int], used_keys: set) -> Iterator[ClusterRows]:
+    """
+    按商圈去重规则贪心选出互不共用门店的商圈
+
+    Args:
+        clusters: 商圈（已按优先顺序排列）
+        key_id: 每行门店的唯一标识编号
+        used_keys: 已被占用的门店标识，返回的商圈的门店会加入其中
+
+    Yields:
+        选中的商圈
+    """
+    for cluster in clusters:
+        store_keys = {key_id[idx] for idx in cluster.rows}
+        if not used_keys.isdisjoint(store_keys):
+            continue
+        used_keys |= store_keys
+        yield cluster
+
+
+def _query_pairs(table: StoreTable, threshold: float, index_backend: str,
+                 progress: Progress) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    构建空间索引并批量查询距离不超过阈值的所有门店对
+
+    启用 PAIR_CACHE 时按品牌对读取缓存，只查询缺少的品牌对（NeighborIndex.query_pairs_between），
+    新算出的品牌对写回缓存；此时只返回不同品牌之间的门店对（同品牌的门店对本来就不参与候选集）。
+    """
+    if PAIR_CACHE is None:
+        progress.start("index", "  构建空间索引...")
+        neighbor_index = create_neighbor_index(table, threshold, index_backend)
+
+        # 为每个品牌的门店构建候选集（只包含其他品牌的门店，一次批量查询所有门店对）
+        progress.start("candidates", "  构建候选集...")
+        return neighbor_index.query_pairs()
+
+    fingerprints = [table.brand_fingerprint(b) for b in range(len(table.brands))]
+    brand_pairs = list(combinations(range(len(table.brands)), 2))
+    edges = {}
+    for a, b in brand_pairs:
+        cached = PAIR_CACHE.get(fingerprints[a], fingerprints[b], threshold)
+        if cached is not None:
+            edges[(a, b)] = cached
+
+    missing = [pair for pair in brand_pairs if pair not in edges]
+    if missing:
+        progress.start("index", "  构建空间索引...")
+        neighbor_index = create_neighbor_index(table, threshold, index_backend)
+        progress.start("candidates", "  构建候选集...")
+        if len(missing) == len(brand_pairs):
+            # 全部未命中：一次批量查询所有门店对，再按品牌对拆分
+            computed = _split_brand_pairs(table, neighbor_index.query_pairs())
+        else:
+            # 只查询缺少的品牌对
+            offsets = table.brand_offsets
+            computed = {}
+            for a, b in missing:
+                i, j, d = neighbor_index.query_pairs_between(table.brand_rows(a), table.brand_rows(b))
+                computed[(a, b)] = (i - offsets[a], j - offsets[b], d)
+        for (a, b), pairs in computed.items():
+            edges[(a, b)] = pairs
+            PAIR_CACHE.put(fingerprints[a], fingerprints[b], threshold, pairs)
+    else:
+        progress.start("candidates", "  构建候选集...")
+    if len(missing) < len(brand_pairs):
+        progress.log("candidates", f"  近邻门店对缓存: 命中 {len(brand_pairs) - len(missing)}/{len(brand_pairs)} 个品牌对")
+
+    # 品牌内下标换算为行索引，按 (i, j) 排序（与近邻索引的输出顺序一致）
+    offsets = table.brand_offsets
+    pair_i = np.concatenate([edges[(a, b)][0].astype(np.intp) + offsets[a] for a, b in brand_pairs])
+    pair_j = np.concatenate([edges[(a, b)][1].astype(np.intp) + offsets[b] for a, b in brand_pairs])
+    pair_d = np.concatenate([edges[(a, b)][2] for a, b in brand_pairs])
+    order = np.lexsort((pair_j, pair_i))
+    return pair_i[order], pair_j[order], pair_d[order]
+
+
+def _split_brand_pairs(table: StoreTable, pairs: Tuple[np.ndarray, np.ndarray, np.ndarray]
+                       ) -> Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    把近邻门店对（i < j）按品牌对拆分为品牌内下标
+
+    Returns:
+        {(品牌a, 品牌b): (品牌a内下标数组, 品牌b内下标数组, 距离数组)}，a < b，包含所有品牌对（没有门店对时为空数组）
+    """
+    pair_i, pair_j, pair_d = pairs
+    brand_count = len(table.brands)
+    brand_i = table.brand_id[pair_i].astype(np.intp)
+    brand_j = table.brand_id[pair_j].astype(np.intp)
+    keys = brand_i * brand_count + brand_j
+    order = np.argsort(keys, kind="stable")
+    keys, pair_i, pair_j, pair_d = keys[order], pair_i[order], pair_j[order], pair_d[order]
+    offsets = np.asarray(table.brand_offsets, dtype=np.intp)
+
+    result = {}
+    for a, b in combinations(range(brand_count), 2):
+        key = a * brand_count + b
+        start, end = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+        result[(a, b)] = (pair_i[start:end] - offsets[a], pair_j[start:end] - offsets[b], pair_d[start:end])
+    return result
+
+
+def _build_engine(table: StoreTable, pairs: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                  valid_brands: List[int], progress: Progress) -> CliqueSearch:
+    """根据近邻门店对构建候选集和团枚举引擎，并输出组合数统计"""
+    brand_candidates, pair_distances = build_brand_candidates(table, pairs)
+    total_original = math.prod(table.brand_size(b) for b in valid_brands)
     
-    for brand in valid_brands:
-        brand_candidates[brand] = {}
-        for store_idx in tqdm(brand_to_indices[brand], desc=f"  处理{brand}", leave=False, unit="门店"):
-            nearby = spatial_grid.get_nearby_stores(store_idx)
-            # 按品牌分组
-            candidates_by_brand = defaultdict(list)
-            for other_idx in nearby:
-                other_brand = store_to_brand[other_idx]
-                if other_brand != brand:
-                    candidates_by_brand[other_brand].append(other_idx)
-            brand_candidates[brand][store_idx] = candidates_by_brand
+    # 在近邻图上回溯枚举（按候选数从少到多选择品牌，逐步求交剪枝）
+    engine = CliqueSearch(table, brand_candidates, pair_distances)
+    total_product = engine.count_product(valid_brands)
     
-    # 计算优化后的组合数
-    total_optimized = 0
-    for first_store_idx in brand_to_indices[valid_brands[0]]:
-        candidates = brand_candidates[valid_brands[0]][first_store_idx]
-        if not candidates:
-            continue
-        count = 1
-        for other_brand in valid_brands[1:]:
-            if other_brand in candidates:
-                count *= len(candidates[other_brand])
-            else:
-                count = 0
-                break
-        total_optimized += count
+    progress.log("candidates", f"  原始组合数: {total_original:,}")
+    progress.log("candidates", f"  优化后组合数: {total_product:,}")
+    if total_product > 0:
+        reduction = (1 - total_product / total_original) * 100
+        progress.log("candidates", f"  减少: {reduction:.1f}%")
+    return engine
+
+
+def _searcher(engine: CliqueSearch, pairs: Tuple[np.ndarray, np.ndarray, np.ndarray], workers: int):
+    """搜索引擎的上下文：workers 大于1时为多进程包装（退出时关闭进程池），否则直接使用引擎"""
+    if workers and workers > 1:
+        return ParallelCliqueSearch(engine, pairs, workers)
+    return nullcontext(engine)
+
+
+def find_cluster_rows(table: StoreTable, threshold: float, required_brands: List[str] = None,
+                      index_backend: str = NEIGHBOR_INDEX_BACKEND, workers: int = CLUSTER_WORKERS,
+                      progress: Optional[ProgressSink] = None, limit: Optional[int] = None) -> List[ClusterRows]:
+    """
+    在门店表上查找商圈（以行索引表示）
+
+    指定 limit 时直接返回去重后排在最前的 limit 个商圈（与不限制时去重结果的前 limit 个相同），
+    由 iter_cluster_rows 逐级搜索，选够后不再枚举更远的组合或品牌数更少的层。
     
-    print(f"  原始组合数: {total_original:,}")
-    print(f"  优化后组合数: {total_optimized:,}")
-    if total_optimized > 0:
-        reduction = (1 - total_optimized / total_original) * 100
-        print(f"  减少: {reduction:.1f}%")
+    Args:
+        table: 门店表（每个品牌至少一个门店）
+        threshold: 距离阈值（米）
+        required_brands: 必选品牌列表，回退时子集必须包含这些品牌
+        index_backend: 近邻索引类型（auto / grid / kdtree）
+        workers: 搜索进程数，大于1时按锚点门店分片并行搜索（小规模搜索仍在本进程完成）
+        progress: 进度事件接收器，默认输出到控制台
+        limit: 最多返回的商圈数，None 表示不限制（返回全部商圈，由调用方去重）
     
-    # 使用优化的候选集查找商圈
-    print("  查找商圈...")
-    valid_clusters = []
+    Returns:
+        符合条件的商圈列表
+    """
+    if limit:
+        with closing(iter_cluster_rows(table, threshold, required_brands=required_brands, index_backend=index_backend,
+                                       workers=workers, progress=progress)) as clusters:
+            return list(islice(clusters, limit))
+
+    progress = Progress.of(progress)
+    valid_brands = list(range(len(table.brands)))
     
-    # 从第一个品牌开始
-    first_brand = valid_brands[0]
+    if not valid_brands:
+        return []
     
-    # 遍历第一个品牌的所有门店
-    for first_store_idx in tqdm(brand_to_indices[first_brand], desc="  查找商圈", unit="门店"):
-        candidates = brand_candidates[first_brand][first_store_idx]
-        
-        # 检查是否所有其他品牌都有候选门店
-        if not all(brand in candidates for brand in valid_brands[1:]):
-            continue
-        
-        # 生成候选组合
-        candidate_lists = [candidates[brand] for brand in valid_brands[1:]]
-        
-        for combination in product(*candidate_lists):
-            # 构建完整的门店列表
-            store_indices = [first_store_idx] + list(combination)
-            stores = [all_stores[idx] for idx in store_indices]
-            
-            # 检查距离
-            is_valid, max_dist = check_all_distances(stores, threshold)
-            
-            if is_valid:
-                brands_dict = {}
-                for idx in store_indices:
-                    brand = store_to_brand[idx]
-                    brands_dict[brand] = all_stores[idx]
-                
-                cluster = {
-                    "brands": brands_dict,
-                    "stores": stores,
-                    "max_distance": max_dist,
-                    "brand_count": len(valid_brands)
-                }
-                valid_clusters.append(cluster)
+    if len(valid_brands) == 1:
+        return [ClusterRows((idx,), 0.0, 1) for idx in table.brand_rows(0)]
+    
+    pairs = _query_pairs(table, threshold, index_backend, progress)
+    engine = _build_engine(table, pairs, valid_brands, progress)
+    with _searcher(engine, pairs, workers) as searcher:
+        return _search_all(searcher, table, valid_brands, required_brands, progress)
+
+
+def find_cluster_rows_sweep(table: StoreTable, thresholds: Iterable[float], required_brands: List[str] = None,
+                            index_backend: str = NEIGHBOR_INDEX_BACKEND, workers: int = CLUSTER_WORKERS,
+                            progress: Optional[ProgressSink] = None) -> Dict[float, List[ClusterRows]]:
+    """
+    一次查找多个距离阈值的商圈
+
+    只按最大阈值构建一次空间索引、查询一次门店对；门店对按距离排序后，每个阈值的近邻图
+    就是其中的一段前缀，直接截取后构建候选集并枚举，不再重复建索引和计算距离。
+
+    Args:
+        table: 门店表（每个品牌至少一个门店）
+        thresholds: 距离阈值列表（米），重复的阈值只计算一次
+        required_brands: 必选品牌列表，回退时子集必须包含这些品牌
+        index_backend: 近邻索引类型（auto / grid / kdtree）
+        workers: 搜索进程数，大于1时按锚点门店分片并行搜索
+        progress: 进度事件接收器，默认输出到控制台
+
+    Returns:
+        {阈值: 商圈列表}，按 thresholds 的顺序，每个阈值的结果与 find_cluster_rows 相同（未去重）
+    """
+    progress = Progress.of(progress)
+    thresholds = list(dict.fromkeys(thresholds))
+    valid_brands = list(range(len(table.brands)))
+
+    if not valid_brands or not thresholds:
+        return {threshold: [] for threshold in thresholds}
+
+    if len(valid_brands) == 1:
+        return {threshold: [ClusterRows((idx,), 0.0, 1) for idx in table.brand_rows(0)] for threshold in thresholds}
+
+    pair_i, pair_j, pair_d = _query_pairs(table, max(thresholds), index_backend, progress)
+    order = np.argsort(pair_d, kind="stable")
+    pair_i, pair_j, pair_d = pair_i[order], pair_j[order], pair_d[order]
+
+    results = {}
+    for threshold in thresholds:
+        end = int(np.searchsorted(pair_d, threshold, side="right"))
+        pairs = (pair_i[:end], pair_j[:end], pair_d[:end])
+        progress.log("candidates", f"  距离阈值 {threshold:g} 米: {end:,} 个门店对")
+        engine = _build_engine(table, pairs, valid_brands, progress)
+        with _searcher(engine, pairs, workers) as searcher:
+            results[threshold] = _search_all(searcher, table, valid_brands, required_brands, progress)
+    return results
+
+
+def iter_cluster_rows(table: StoreTable, threshold: float, required_brands: List[str] = None,
+                      index_backend: str = NEIGHBOR_INDEX_BACKEND, workers: int = CLUSTER_WORKERS,
+                      progress: Optional[ProgressSink] = None,
+                      steps: Tuple[float, ...] = PROGRESSIVE_THRESHOLD_STEPS) -> Iterator[ClusterRows]:
+    """
+    按商圈去重后的顺序（品牌数多优先、最大距离小优先，每个门店只归属一个商圈）逐个返回商圈
+
+    全部品牌的商圈按 steps 由近到远分几轮搜索，每轮只枚举最大距离落在本轮新增范围内的商圈：
+    较近的商圈按距离排在前面，在枚举更远的组合之前就可以返回，各轮合计只枚举一遍。没有全部品牌的商圈时，
+    从品牌数多到少逐层返回部分品牌的商圈。调用方停止迭代后不再继续搜索。
+
+    Args:
+        table: 门店表（每个品牌至少一个门店）
+        threshold: 距离阈值（米）
+        required_brands: 必选品牌列表，回退时子集必须包含这些品牌
+        index_backend: 近邻索引类型（auto / grid / kdtree）
+        workers: 搜索进程数，大于1时按锚点门店分片并行搜索
+        progress: 进度事件接收器，默认输出到控制台
+        steps: 全部品牌商圈的逐级搜索距离（阈值的比例，最后一级应为 1.0）
+
+    Yields:
+        去重后的商圈，与 find_cluster_rows 的结果去重后的顺序相同
+    """
+    progress = Progress.of(progress)
+    valid_brands = list(range(len(table.brands)))
+    key_id = table.key_id.tolist()
+    used_keys = set()
+
+    if not valid_brands:
+        return
+
+    if len(valid_brands) == 1:
+        yield from _iter_disjoint((ClusterRows((idx,), 0.0, 1) for idx in table.brand_rows(0)), key_id, used_keys)
+        return
+
+    pairs = _query_pairs(table, threshold, index_backend, progress)
+    engine = _build_engine(table, pairs, valid_brands, progress)
+
+    # 全部品牌的商圈：每轮只枚举最大距离落在本轮新增范围 (lower, upper] 内的商圈，内圈的商圈不会重复枚举；
+    # 所有轮次和部分品牌回退共用同一个引擎（和进程池）
+    with _searcher(engine, pairs, workers) as searcher:
+        lower = -1.0
+        candidates = found = 0
+        for upper in [threshold * fraction for fraction in steps[:-1]] + [threshold]:
+            progress.start("enumerate", f"  查找 {upper:.0f} 米内的商圈..." if upper < threshold else "  查找商圈...")
+            ring = _search_full(searcher, valid_brands, progress, distance_range=(lower, upper))
+            ring.sort(key=lambda c: c.max_distance)
+            candidates += len(ring)
+            for cluster in _iter_disjoint(ring, key_id, used_keys):
+                found += 1
+                yield cluster
+            lower = upper
+
+        if candidates:
+            if found < candidates:
+                progress.log("dedupe", f"  去重: {candidates} 个商圈 -> {found} 个商圈（每店仅归属品牌最多的商圈）")
+            return
+
+        yield from _iter_fallback(searcher, table, valid_brands, required_brands, progress, used_keys)
+
+
+def _search_full(searcher, valid_brands: List[int], progress: Progress,
+                 distance_range: Optional[Tuple[float, float]] = None) -> List[ClusterRows]:
+    """枚举覆盖全部品牌的商圈（distance_range 见 CliqueSearch.search）"""
+    clusters = searcher.search(
+        valid_brands,
+        iterate=lambda stores: progress.iterate("enumerate", stores, "  查找商圈", unit="门店"),
+        distance_range=distance_range
+    )
+    progress.log("enumerate", f"  回溯检查组合数: {searcher.nodes:,}")
+    return clusters
+
+
+def _search_all(searcher, table: StoreTable, valid_brands: List[int],
+                required_brands: List[str] = None, progress: Optional[ProgressSink] = None) -> List[ClusterRows]:
+    """
+    查找全部品牌的商圈，找不到时回退到部分品牌组合
+    
+    Args:
+        searcher: 团枚举引擎（CliqueSearch 或 ParallelCliqueSearch）
+        table: 门店表
+        valid_brands: 品牌下标列表
+        required_brands: 必选品牌列表
+        progress: 进度事件接收器，默认输出到控制台
+    
+    Returns:
+        符合条件的商圈列表
+    """
+    progress = Progress.of(progress)
+
+    # 使用优化的候选集查找商圈
+    progress.start("enumerate", "  查找商圈...")
+    valid_clusters = _search_full(searcher, valid_brands, progress)
     
     # 如果找到全部品牌满足的，直接返回
     if valid_clusters:
         return valid_clusters
     
-    # 如果没有完全符合条件的，尝试部分品牌组合
-    # 收集所有符合条件的商圈，优先返回品牌数多的
-    print("  未找到完全符合条件的商圈，查找部分品牌组合...")
-    from itertools import combinations
-    
-    all_partial_clusters = []
-    max_brand_count = 0
+    return list(_iter_fallback(searcher, table, valid_brands, required_brands, progress, set()))
+
+
+def _iter_fallback(searcher, table: StoreTable, valid_brands: List[int], required_brands: Optional[List[str]],
+                   progress: Progress, used_keys: set) -> Iterator[ClusterRows]:
+    """
+    没有全部品牌的商圈时，从品牌数多到少逐层返回部分品牌的商圈（已按去重规则选出）
+
+    每一层用一次"可跳过品牌"的回溯覆盖该层所有品牌子集，并直接按商圈去重规则
+    （品牌数多优先、距离小优先，每个门店只归属一个商圈）选出该层的商圈，
+    已被上层商圈占用的门店（used_keys）不再参与下层搜索
+    """
+    progress.start("fallback", "  未找到完全符合条件的商圈，查找部分品牌组合...")
+
+    # 没有门店的品牌不在门店表中，包含它的品牌子集都不存在
+    absent = [b for b in required_brands if b not in table.brand_index] if required_brands else []
+    if absent:
+        progress.log("fallback", f"  必选品牌没有门店: {', '.join(absent)}")
+        return
+
+    required_ids = [table.brand_index[b] for b in required_brands] if required_brands else []
+    key_id = table.key_id.tolist()
+    brand_id = table.brand_id.tolist()
+    total = 0
     
-    # 从多到少尝试品牌组合（至少2个品牌）
-    # 查找所有符合条件的商圈，不提前结束
+    # 从多到少尝试品牌组合（至少2个品牌；全部品牌已确认没有商圈）
     min_r = max(2, len(required_brands)) if required_brands else 2
-    for r in range(len(valid_brands), min_r - 1, -1):
-        if r < min_r:
-            break
-
-        clusters_found = False
-        for brand_subset in combinations(valid_brands, r):
-            if required_brands and not all(rb in brand_subset for rb in required_brands):
-                continue
-            first_brand_sub = brand_subset[0]
-            
-            for first_store_idx in brand_to_indices[first_brand_sub]:
-                candidates = brand_candidates[first_brand_sub][first_store_idx]
-                
-                if not all(brand in candidates for brand in brand_subset[1:]):
-                    continue
-                
-                candidate_lists = [candidates[brand] for brand in brand_subset[1:]]
-                
-                for combination in product(*candidate_lists):
-                    store_indices = [first_store_idx] + list(combination)
-                    stores = [all_stores[idx] for idx in store_indices]
-                    
-                    is_valid, max_dist = check_all_distances(stores, threshold)
-                    
-                    if is_valid:
-                        brands_dict = {}
-                        for idx in store_indices:
-                            brand = store_to_brand[idx]
-                            brands_dict[brand] = all_stores[idx]
-                        
-                        cluster = {
-                            "brands": brands_dict,
-                            "stores": stores,
-                            "max_distance": max_dist,
-                            "brand_count": len(brand_subset)
-                        }
-                        all_partial_clusters.append(cluster)
-                        max_brand_count = max(max_brand_count, len(brand_subset))
-                        clusters_found = True
+    for r in range(len(valid_brands) - 1, min_r - 1, -1):
+        excluded = frozenset(idx for idx in range(len(table)) if key_id[idx] in used_keys)
+        level_clusters = searcher.search_level(valid_brands, r, required_ids, excluded)
+        if not level_clusters:
+            continue
         
-        # 如果找到了当前品牌数的商圈，继续查找（可能还有其他组合）
-        if clusters_found:
-            print(f"  找到 {len([c for c in all_partial_clusters if c['brand_count'] == r])} 个包含 {r} 个品牌的商圈")
-    
-    # 按品牌数量降序排序，返回所有结果
-    if all_partial_clusters:
-        all_partial_clusters.sort(key=lambda x: x['brand_count'], reverse=True)
-        print(f"  共找到 {len(all_partial_clusters)} 个符合条件的商圈（至少2个品牌）")
-        return all_partial_clusters
+        # 距离相同时按品牌子集、再按门店行索引排序（与逐个子集枚举时的顺序一致）
+        level_clusters.sort(key=lambda c: (c.max_distance, tuple(brand_id[idx] for idx in c.rows), c.rows))
+        found = 0
+        for cluster in _iter_disjoint(level_clusters, key_id, used_keys):
+            found += 1
+            yield cluster
+        total += found
+        progress.log("fallback", f"  找到 {found} 个包含 {r} 个品牌的商圈（候选 {len(level_clusters)} 个）")
     
-    return []
-
+    if total:
+        progress.log("fallback", f"  共找到 {total} 个符合条件的商圈（至少2个品牌）")
@@ -31,3 +31,65 @@ DEDUPLICATION_DISTANCE = float(os.getenv("DEDUPLICATION_DISTANCE", "200"))
 # POI搜索API端点
 POI_SEARCH_ENDPOINT = "/place/text"
 
+# 高德API每秒请求数上限（每个进程共享一个限流器；多进程部署时按 配额 / 进程数 设置）
+AMAP_QPS = float(os.getenv("AMAP_QPS", "5"))
+
+# 并发搜索的线程数（同时搜索的品牌数 / 单个品牌同时请求的页数）
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+
+# 高德API HTTP 连接池：每个进程与高德服务器保持的最大 keep-alive 连接数
+# （POI搜索和 /_AMapService 代理共用，应不少于同时发请求的线程数）
+AMAP_POOL_SIZE = int(os.getenv("AMAP_POOL_SIZE", "32"))
+# 连接超时和读取超时（秒）
+AMAP_CONNECT_TIMEOUT = float(os.getenv("AMAP_CONNECT_TIMEOUT", "3.05"))
+AMAP_READ_TIMEOUT = float(os.getenv("AMAP_READ_TIMEOUT", "10"))
+# 连接失败或网关错误（502/503/504）时的重试次数和指数退避系数（秒）
+AMAP_HTTP_RETRIES = int(os.getenv("AMAP_HTTP_RETRIES", "2"))
+AMAP_HTTP_BACKOFF = float(os.getenv("AMAP_HTTP_BACKOFF", "0.3"))
+
+
+# 近邻索引类型：auto（安装了 scipy 时使用KD树，否则使用网格）/ grid / kdtree
+NEIGHBOR_INDEX_BACKEND = os.getenv("NEIGHBOR_INDEX", "auto")
+
+# Web 端后台任务线程数：每个 worker 进程内同时执行的搜索任务数，超出的任务排队等待
+SEARCH_TASK_WORKERS = int(os.getenv("SEARCH_TASK_WORKERS", "8"))
+
+# 已结束的搜索任务在内存中保留的秒数（之后只能从结果文件查询，断线重连只能收到最终结果）
+SEARCH_JOB_TTL = float(os.getenv("SEARCH_JOB_TTL", "3600"))
+
+# 搜索结果文件（results 目录）保留的秒数，设为 0 永久保留
+SEARCH_RESULT_TTL = float(os.getenv("SEARCH_RESULT_TTL", str(7 * 86400)))
+
+# SSE 心跳间隔（秒）：任务暂无新消息时发送注释行，保持连接不被代理断开
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+# 商圈搜索的进程数：1 表示在当前进程内搜索；大于1时按锚点门店分片，在进程池中并行搜索
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "1"))
+
+# 搜索结果分段推送时每段的商圈数（SSE clusters 事件）
+RESULT_CHUNK_SIZE = int(os.getenv("RESULT_CHUNK_SIZE", "200"))
+
+# /_AMapService 地图代理的响应缓存有效期（秒），设为 0 关闭缓存（并发的相同请求仍只请求一次上游）
+AMAP_PROXY_CACHE_TTL = float(os.getenv("AMAP_PROXY_CACHE_TTL", "300"))
+# 每个进程最多缓存的代理响应数，超出时淘汰最久未访问的响应
+AMAP_PROXY_CACHE_MAX_ENTRIES = int(os.getenv("AMAP_PROXY_CACHE_MAX_ENTRIES", "2000"))
+
+# POI搜索结果缓存（SQLite 文件，多个 worker 进程共享）
+POI_CACHE_PATH = os.getenv("POI_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "poi_cache.sqlite3"))
+# 缓存有效期（秒），设为 0 关闭缓存
+POI_CACHE_TTL = float(os.getenv("POI_CACHE_TTL", "86400"))
+# 最多缓存的 (城市, 品牌) 条目数，超出时淘汰最久未访问的条目
+POI_CACHE_MAX_ENTRIES = int(os.getenv("POI_CACHE_MAX_ENTRIES", "2000"))
+# 命中时的访问时间和命中/未命中统计写回缓存文件的最长间隔（秒），读取缓存本身不写数据库
+POI_CACHE_FLUSH_INTERVAL = float(os.getenv("POI_CACHE_FLUSH_INTERVAL", "30"))
+
+# 商圈结果缓存：每个进程内存中最多缓存的查询结果数（LRU 淘汰），设为 0 关闭结果缓存
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "128"))
+# 结果缓存的磁盘层（SQLite 文件，多个 worker 进程共享），为空时只使用内存层
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+# 磁盘层的有效期（秒）和最多条目数
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 86400)))
+RESULT_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_MAX_ENTRIES", "2000"))
+
+# 品牌对近邻门店对缓存：每个进程最多缓存的门店对总数（约 16 字节/对，LRU 淘汰），设为 0 关闭
+PAIR_CACHE_MAX_PAIRS = int(os.getenv("PAIR_CACHE_MAX_PAIRS", "2000000"))
@@ -1,13 +1,176 @@
 """
 距离计算模块 - 使用Haversine公式计算地球表面两点间距离
+
+提供三套接口：
+- 标量接口（haversine_distance / check_all_distances / calculate_max_distance）：批量接口的简单包装，
+  方便少量门店的调用方直接传入坐标或门店字典
+- 批量接口（haversine_vector / one_to_many_distances / pairwise_distances）：
+  基于NumPy一次计算整组坐标的距离，供空间索引、去重等热点循环使用
+- 局部平面投影（LocalProjection）：一次搜索的门店投影为平面米制坐标，先用平方欧氏距离排除
+  一定超出阈值的门店对，只对可能在阈值内的门店对计算Haversine（返回的距离仍是Haversine距离）
 """
 import math
 from typing import List, Tuple
 
+import numpy as np
+
+# 地球半径（米）
+EARTH_RADIUS = 6371000
+
+
+def haversine_vector(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Haversine公式的NumPy广播版本（单位：米）
+
+    参数可以是标量或任意可广播的数组，返回广播后形状的距离数组。
+
+    Args:
+        lat1: 第一组点的纬度
+        lon1: 第一组点的经度
+        lat2: 第二组点的纬度
+        lon2: 第二组点的经度
+
+    Returns:
+        距离数组（米）
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = np.radians(np.subtract(lat2, lat1))
+    delta_lambda = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(delta_phi / 2) ** 2 + \
+        np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS * c
+
+
+def one_to_many_distances(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """
+    计算一个点到一组点的距离
+
+    Args:
+        lat: 起点纬度
+        lon: 起点经度
+        lats: 目标点纬度数组
+        lons: 目标点经度数组
+
+    Returns:
+        长度与目标点数相同的距离数组（米）
+    """
+    return haversine_vector(lat, lon,
+                            np.asarray(lats, dtype=np.float64),
+                            np.asarray(lons, dtype=np.float64))
+
+
+def pairwise_distances(lats, lons, other_lats=None, other_lons=None) -> np.ndarray:
+    """
+    计算两组点之间的距离矩阵
+
+    Args:
+        lats: 第一组点纬度数组（长度 m）
+        lons: 第一组点经度数组（长度 m）
+        other_lats: 第二组点纬度数组（长度 n），为None时与第一组相同
+        other_lons: 第二组点经度数组（长度 n），为None时与第一组相同
+
+    Returns:
+        形状为 (m, n) 的距离矩阵（米）
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if other_lats is None:
+        other_lats, other_lons = lats, lons
+    else:
+        other_lats = np.asarray(other_lats, dtype=np.float64)
+        other_lons = np.asarray(other_lons, dtype=np.float64)
+
+    return haversine_vector(lats[:, None], lons[:, None],
+                            other_lats[None, :], other_lons[None, :])
+
+
+class LocalProjection:
+    """
+    局部平面投影：以门店中心为原点的等距圆柱投影（x 向东、y 向北，单位：米）
+
+    投影距离与真实（Haversine）距离之比不超过 scale(threshold)：
+    - 东西向按中心纬度 lat0 的 cos 缩放，离赤道更远的门店之间的东西向距离至多被放大 cos(lat0) / min(cos(lat)) 倍；
+    - 阈值以内的短距离上，平面与球面（大圆）的差异不超过 (d / R)² × tan²(lat) / 24 量级，
+      按 (threshold / R)² × (1 + tan²(max|lat|)) 预留余量。
+    因此投影距离超过 threshold × scale(threshold) 的门店对一定超出阈值，不需要计算Haversine。
+    """
+
+    def __init__(self, lats, lons):
+        """
+        Args:
+            lats: 纬度数组
+            lons: 经度数组
+        """
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        if len(self.lats):
+            lat0 = float(self.lats.mean())
+            lon0 = float(self.lons.mean())
+            cos_min = float(np.cos(np.radians(self.lats)).min())
+            max_abs_lat = min(float(np.abs(self.lats).max()), 89.0)
+        else:
+            lat0 = lon0 = 0.0
+            cos_min = 1.0
+            max_abs_lat = 0.0
+        cos0 = math.cos(math.radians(lat0))
+        self.x = EARTH_RADIUS * np.radians(self.lons - lon0) * cos0
+        self.y = EARTH_RADIUS * np.radians(self.lats - lat0)
+        self._stretch = max(1.0, cos0 / max(cos_min, 1e-12))
+        self._curvature = 1 + math.tan(math.radians(max_abs_lat)) ** 2
+
+    def scale(self, threshold: float) -> float:
+        """阈值以内的门店对，投影距离与真实距离之比的上界"""
+        return self._stretch * (1 + (threshold / EARTH_RADIUS) ** 2 * self._curvature + 1e-9)
+
+    def search_radius(self, threshold: float) -> float:
+        """投影平面上的查询半径：真实距离不超过阈值的门店对，投影距离一定不超过该半径"""
+        return threshold * self.scale(threshold)
+
+    def filter_pairs(self, i: np.ndarray, j: np.ndarray, threshold: float
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        从候选门店对中筛出距离不超过阈值的门店对：先按投影距离排除，再对剩下的计算Haversine
+
+        Args:
+            i: 门店对的第一个门店下标数组
+            j: 门店对的第二个门店下标数组
+            threshold: 距离阈值（米）
+
+        Returns:
+            (i数组, j数组, 距离数组)，保持输入顺序
+        """
+        dx = self.x[i] - self.x[j]
+        dy = self.y[i] - self.y[j]
+        radius = self.search_radius(threshold)
+        near = dx * dx + dy * dy <= radius * radius
+        i, j = i[near], j[near]
+        d = haversine_vector(self.lats[i], self.lons[i], self.lats[j], self.lons[j])
+        mask = d <= threshold
+        return i[mask], j[mask], d[mask]
+
+
+def store_coordinates(stores: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将门店列表的坐标提取为连续的纬度、经度数组
+
+    Args:
+        stores: 门店列表，每个门店包含 lat 和 lon
+
+    Returns:
+        (纬度数组, 经度数组)
+    """
+    lats = np.fromiter((s["lat"] for s in stores), dtype=np.float64, count=len(stores))
+    lons = np.fromiter((s["lon"] for s in stores), dtype=np.float64, count=len(stores))
+    return lats, lons
+
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
-    使用Haversine公式计算两点间的大圆距离（单位：米）
+    使用Haversine公式计算两点间的大圆距离（单位：米），haversine_vector 的标量包装
     
     Args:
         lat1: 第一个点的纬度
@@ -18,27 +181,12 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     Returns:
         两点间的距离（米）
     """
-    # 地球半径（米）
-    R = 6371000
-    
-    # 将角度转换为弧度
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    
-    # Haversine公式
-    a = math.sin(delta_phi / 2) ** 2 + \
-        math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return distance
+    return float(haversine_vector(lat1, lon1, lat2, lon2))
 
 
 def check_all_distances(stores: List[dict], threshold: float) -> Tuple[bool, float]:
     """
-    检查门店列表中所有门店之间两两距离是否都小于阈值
+    检查门店列表中所有门店之间两两距离是否都不超过阈值（一次计算全部门店对，见 pairwise_distances）
     
     Args:
         stores: 门店列表，每个门店包含 lat 和 lon
@@ -47,25 +195,8 @@ def check_all_distances(stores: List[dict], threshold: float) -> Tuple[bool, flo
     Returns:
         (是否满足条件, 最大距离)
     """
-    if len(stores) < 2:
-        return True, 0.0
-    
-    max_distance = 0.0
-    
-    for i in range(len(stores)):
-        for j in range(i + 1, len(stores)):
-            store1 = stores[i]
-            store2 = stores[j]
-            distance = haversine_distance(
-                store1["lat"], store1["lon"],
-                store2["lat"], store2["lon"]
-            )
-            max_distance = max(max_distance, distance)
-            
-            if distance > threshold:
-                return False, max_distance
-    
-    return True, max_distance
+    max_distance = calculate_max_distance(stores)
+    return max_distance <= threshold, max_distance
 
 
 def calculate_max_distance(stores: List[dict]) -> float:
@@ -81,14 +212,5 @@ def calculate_max_distance(stores: List[dict]) -> float:
     if len(stores) < 2:
         return 0.0
     
-    max_distance = 0.0
-    for i in range(len(stores)):
-        for j in range(i + 1, len(stores)):
-            distance = haversine_distance(
-                stores[i]["lat"], stores[i]["lon"],
-                stores[j]["lat"], stores[j]["lon"]
-            )
-            max_distance = max(max_distance, distance)
-    
-    return max_distance
-
+    lats, lons = store_coordinates(stores)
+    return float(pairwise_distances(lats, lons).max())
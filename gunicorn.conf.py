@@ -7,8 +7,12 @@ import os
 # 服务器配置
 bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
 workers = int(os.getenv('WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = 'sync'
+# gthread：每个连接占用一个线程而不是整个进程，多个 SSE 搜索流共用一个 worker 进程；
+# 搜索和聚类在应用内的后台线程池中执行（SEARCH_TASK_WORKERS），请求线程只转发进度消息
+worker_class = os.getenv('WORKER_CLASS', 'gthread')
+threads = int(os.getenv('THREADS', '32'))
 worker_connections = 1000
+# gthread 下 timeout 只检查 worker 进程的心跳，耗时较长的 SSE 流不会被中断
 timeout = 120
 keepalive = 5
 
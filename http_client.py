@@ -0,0 +1,62 @@
+"""
+高德API的HTTP客户端 - 每个进程共享一个带连接池的 requests.Session
+
+POI搜索和 /_AMapService 代理复用同一组 keep-alive 连接，避免每个请求重新进行 TCP 和 TLS 握手。
+连接池大小、超时和重试策略见 config.py。会话在第一次使用时创建，fork 出的子进程
+（gunicorn preload_app）会重新创建自己的会话，不与父进程共用连接。
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import AMAP_POOL_SIZE, AMAP_CONNECT_TIMEOUT, AMAP_READ_TIMEOUT, AMAP_HTTP_RETRIES, AMAP_HTTP_BACKOFF
+
+# requests 的 (连接超时, 读取超时)
+AMAP_TIMEOUT = (AMAP_CONNECT_TIMEOUT, AMAP_READ_TIMEOUT)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size: int = AMAP_POOL_SIZE, retries: int = AMAP_HTTP_RETRIES,
+                   backoff: float = AMAP_HTTP_BACKOFF) -> requests.Session:
+    """
+    创建带连接池和重试策略的会话
+
+    只在传输层重试：连接失败，以及网关错误（502 / 503 / 504）的 GET 请求，按 backoff 指数退避。
+    高德业务层的错误（例如QPS超限）由调用方处理。
+
+    Args:
+        pool_size: 每个主机保持的最大连接数（应不少于同时发请求的线程数）
+        retries: 最大重试次数
+        backoff: 退避系数（秒），第 n 次重试前等待 backoff * 2^(n-1)
+
+    Returns:
+        会话对象
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=0, status=retries,
+        status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}),
+        backoff_factor=backoff, raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """当前进程共享的会话（线程安全，首次调用时创建）"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = create_session()
+                _session_pid = pid
+    return _session
@@ -1,68 +1,104 @@
 """
 日志捕获工具 - 用于将print输出重定向到进度回调
+
+第一次进入捕获时，用一个按上下文分发的代理替换 sys.stdout（之后不再恢复）：
+代理根据 contextvars 中当前上下文的捕获对象转发输出，没有捕获时写到原来的 stdout。
+因此同一进程中多个线程（多个请求）各自的捕获互不干扰，退出捕获也不会覆盖其他线程的 stdout。
 """
+import contextvars
+import re
 import sys
+import threading
 from typing import Callable, Optional
-from io import StringIO
+
+# 当前上下文的捕获对象（线程之间相互独立）
+_current_capture = contextvars.ContextVar('log_capture', default=None)
+_install_lock = threading.Lock()
+
+# ANSI 转义码（颜色、光标控制等）
+_ANSI_PATTERN = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+
+class _ContextStdout:
+    """按上下文分发的 stdout 代理：有捕获时交给捕获对象，否则写到原来的 stdout"""
+
+    def __init__(self, original):
+        self.original = original
+
+    def write(self, text: str):
+        capture = _current_capture.get()
+        if capture is None:
+            return self.original.write(text)
+        return capture.write(text)
+
+    def flush(self):
+        capture = _current_capture.get()
+        if capture is None:
+            self.original.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original, name)
+
+
+def _install():
+    """安装 stdout 代理（只安装一次；sys.stdout 被其他代码替换后会重新包装）"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ContextStdout):
+            sys.stdout = _ContextStdout(sys.stdout)
 
 
 class LogCapture:
-    """捕获print输出并转发到回调函数"""
-    
+    """捕获当前上下文（线程）的print输出并转发到回调函数"""
+
     def __init__(self, callback: Optional[Callable[[str], None]] = None):
         self.callback = callback
-        self.original_stdout = sys.stdout
         self.buffer = []
         self.current_line = ''
-    
+        self._token = None
+        self._lock = threading.Lock()
+
     def write(self, text: str):
-        """重写write方法，捕获输出"""
-        # 处理换行符
-        if '\n' in text:
-            parts = text.split('\n')
-            # 第一部分追加到当前行
-            self.current_line += parts[0]
-            if self.current_line.strip():
-                self._process_line(self.current_line.strip())
-            # 处理中间的部分（完整的行）
-            for part in parts[1:-1]:
-                if part.strip():
-                    self._process_line(part.strip())
-            # 最后一部分作为新的当前行
-            self.current_line = parts[-1]
-        else:
-            self.current_line += text
-    
-    def _process_line(self, line: str):
-        """处理一行日志"""
-        # 过滤掉tqdm的进度条（包含特殊字符）
-        if '\r' in line or '\x1b' in line:
-            # 提取实际内容（去除ANSI转义码）
-            import re
-            line = re.sub(r'\x1b\[[0-9;]*m', '', line)  # 移除ANSI颜色码
-            line = line.replace('\r', '').strip()
+        """捕获输出：凑齐完整的行后整批处理"""
+        size = len(text)
+        with self._lock:
+            if '\n' not in text:
+                self.current_line += text
+                return size
+            complete, _, self.current_line = (self.current_line + text).rpartition('\n')
+        self._process_lines(complete)
+        return size
+
+    def _process_lines(self, text: str):
+        """处理一批完整的行：整批去除ANSI转义码，\\r 刷新的行只保留最后的内容"""
+        if '\x1b' in text:
+            text = _ANSI_PATTERN.sub('', text)
+        for line in text.split('\n'):
+            if '\r' in line:
+                line = line.rstrip('\r').rsplit('\r', 1)[-1]
+            line = line.strip()
             if not line:
-                return
-        
-        if line and self.callback:
-            self.callback(line)
-        elif line:
-            self.buffer.append(line)
-    
+                continue
+            if self.callback:
+                self.callback(line)
+            else:
+                self.buffer.append(line)
+
     def flush(self):
         """刷新缓冲区"""
-        if self.current_line.strip():
-            self._process_line(self.current_line.strip())
-            self.current_line = ''
-    
+        with self._lock:
+            line, self.current_line = self.current_line, ''
+        if line.strip():
+            self._process_lines(line)
+
     def __enter__(self):
-        """进入上下文管理器"""
-        sys.stdout = self
+        """进入上下文管理器：只捕获当前上下文的输出"""
+        _install()
+        self._token = _current_capture.set(self)
         return self
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         """退出上下文管理器"""
         self.flush()  # 确保最后一行也被处理
-        sys.stdout = self.original_stdout
+        _current_capture.reset(self._token)
+        self._token = None
         return False
-
@@ -3,13 +3,42 @@
 主程序入口
 """
 import argparse
+import os
 import sys
 from amap_api import search_brands
-from cluster_finder import find_clusters
+from cluster_finder import find_clusters, iter_clusters
 from output import output_json, output_log, output_html
 from config import DEFAULT_DISTANCE_THRESHOLD, AMAP_API_KEY
 
 
+def _with_suffix(filename: str, suffix: str) -> str:
+    """在文件名的扩展名（含 .json.gz 这样的双扩展名）之前插入后缀"""
+    root, ext = os.path.splitext(filename)
+    if ext == ".gz":
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return f"{root}{suffix}{ext}"
+
+
+def _write_outputs(clusters, output_formats, args, brands_with_stores, suffix=""):
+    """按输出格式写出一组商圈，suffix 插入到输出文件名中（多个阈值时区分各阈值的文件）"""
+    if "json" in output_formats:
+        json_filename = args.json_file
+        if not json_filename:
+            json_filename = f"clusters_{args.city}_{'_'.join(brands_with_stores[:2])}.json"
+            if args.json_gzip:
+                json_filename += ".gz"
+        json_filename = _with_suffix(json_filename, suffix)
+        output_json(clusters, json_filename, compact=args.json_compact,
+                    compress=args.json_gzip or json_filename.endswith(".gz"))
+    
+    if "log" in output_formats:
+        output_log(clusters)
+    
+    if "html" in output_formats:
+        output_html(clusters, args.city, _with_suffix(args.html_file, suffix))
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="商圈查找工具 - 找出多个品牌门店都在指定距离内的商圈"
@@ -34,15 +63,25 @@ def main():
     )
     parser.add_argument(
         "--threshold",
-        type=float,
-        default=DEFAULT_DISTANCE_THRESHOLD,
-        help=f"距离阈值，单位：米（默认：{DEFAULT_DISTANCE_THRESHOLD}）"
+        type=str,
+        default=str(DEFAULT_DISTANCE_THRESHOLD),
+        help=f"距离阈值，单位：米；多个阈值用逗号分隔时只建一次索引、分别输出各阈值的结果（默认：{DEFAULT_DISTANCE_THRESHOLD}）"
     )
     parser.add_argument(
         "--json-file",
         type=str,
         default=None,
-        help="JSON输出文件名（默认：自动生成）"
+        help="JSON输出文件名（默认：自动生成，以 .gz 结尾时写为 gzip 文件）"
+    )
+    parser.add_argument(
+        "--json-compact",
+        action="store_true",
+        help="JSON使用紧凑格式（不缩进，每个门店只写一次）"
+    )
+    parser.add_argument(
+        "--json-gzip",
+        action="store_true",
+        help="JSON输出为 gzip 压缩文件"
     )
     parser.add_argument(
         "--html-file",
@@ -56,6 +95,18 @@ def main():
         default=None,
         help="必选品牌列表，用逗号分隔（回退时子集必须包含这些品牌）"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="商圈搜索进程数，大于1时多进程并行搜索（默认：CLUSTER_WORKERS 配置，即1）"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="最多输出的商圈数（品牌数多、距离近的优先），指定后搜索会提前结束（默认：不限制）"
+    )
 
     args = parser.parse_args()
     
@@ -81,6 +132,20 @@ def main():
                 print(f"错误: 必选品牌必须是品牌列表的子集，以下品牌不在列表中: {', '.join(invalid)}")
                 sys.exit(1)
 
+    # 解析距离阈值（可以是多个）
+    try:
+        thresholds = list(dict.fromkeys(float(t) for t in args.threshold.split(",") if t.strip()))
+    except ValueError:
+        print("错误: --threshold 必须是数字，多个阈值用逗号分隔")
+        sys.exit(1)
+    if not thresholds or min(thresholds) <= 0:
+        print("错误: --threshold 必须是正数")
+        sys.exit(1)
+
+    if args.limit is not None and args.limit < 1:
+        print("错误: --limit 必须是正整数")
+        sys.exit(1)
+
     # 解析输出格式
     output_formats = [f.strip() for f in args.output.split(",") if f.strip()]
     if not output_formats:
@@ -91,7 +156,9 @@ def main():
     print(f"品牌: {', '.join(brands)}")
     if required_brands:
         print(f"必选品牌: {', '.join(required_brands)}")
-    print(f"距离阈值: {args.threshold} 米")
+    print(f"距离阈值: {', '.join(f'{t:g}' for t in thresholds)} 米")
+    if args.limit:
+        print(f"最多输出: {args.limit} 个商圈")
     print()
     
     # 1. 搜索各品牌的门店
@@ -115,26 +182,34 @@ def main():
     if required_brands:
         required_brands = [b for b in required_brands if b in brands_with_stores]
 
-    clusters = find_clusters(
-        {brand: brand_stores[brand] for brand in brands_with_stores},
-        args.threshold,
-        required_brands=required_brands
+    selected_stores = {brand: brand_stores[brand] for brand in brands_with_stores}
+
+    if len(thresholds) > 1:
+        # 多个阈值：一次计算全部阈值，每个阈值的输出文件名带上阈值后缀
+        results = find_clusters(selected_stores, thresholds, required_brands=required_brands,
+                                workers=args.workers, limit=args.limit)
+        print("\n处理输出...")
+        for threshold, clusters in results.items():
+            print(f"\n=== 距离阈值 {threshold:g} 米 ===")
+            _write_outputs(clusters, output_formats, args, brands_with_stores, suffix=f"_{threshold:g}m")
+        print("\n完成！")
+        return
+
+    clusters = iter_clusters(
+        selected_stores,
+        thresholds[0],
+        required_brands=required_brands,
+        workers=args.workers,
+        limit=args.limit
     )
+
+    # 只有一种流式输出（json 或 log）时边查找边输出，否则先收集全部商圈
+    if len(output_formats) > 1 or "html" in output_formats:
+        clusters = list(clusters)
     
     # 3. 输出结果
     print("\n处理输出...")
-    
-    if "json" in output_formats:
-        json_filename = args.json_file
-        if not json_filename:
-            json_filename = f"clusters_{args.city}_{'_'.join(brands_with_stores[:2])}.json"
-        output_json(clusters, json_filename)
-    
-    if "log" in output_formats:
-        output_log(clusters)
-    
-    if "html" in output_formats:
-        output_html(clusters, args.city, args.html_file)
+    _write_outputs(clusters, output_formats, args, brands_with_stores)
     
     print("\n完成！")
 
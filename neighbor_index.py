@@ -0,0 +1,386 @@
+"""
+近邻索引 - 查找距离阈值内的门店对
+
+提供统一的索引接口，以及两种实现：
+- SpatialGrid: 经纬度网格（无额外依赖）
+- KDTreeIndex: 在局部投影平面坐标上构建KD树，一次批量查询所有门店对（需要 scipy）
+
+两种实现都使用门店的局部平面投影（distance.LocalProjection）排除一定超出阈值的门店对，
+只对剩下的门店对计算Haversine距离。
+"""
+from typing import List, Dict, Tuple, Set, Union, Iterator
+import math
+from collections import defaultdict
+import numpy as np
+from distance import LocalProjection, one_to_many_distances, store_coordinates
+from store_table import StoreTable
+
+# 尝试导入 scipy 的KD树实现
+try:
+    from scipy.spatial import cKDTree
+    KDTREE_AVAILABLE = True
+except ImportError:
+    KDTREE_AVAILABLE = False
+
+# 可选的索引后端
+INDEX_BACKENDS = ("auto", "grid", "kdtree")
+
+# 网格索引每次筛选的候选门店对上限（决定市中心密集网格的内存占用，与网格内门店数的平方无关）
+PAIR_BLOCK_SIZE = 1 << 18
+
+
+class NeighborIndex:
+    """近邻索引接口：查询每个门店阈值距离内的其他门店"""
+
+    def __init__(self, stores: Union[StoreTable, List[Dict]], threshold: float):
+        """
+        Args:
+            stores: 门店表或门店列表
+            threshold: 距离阈值（米）
+        """
+        self.threshold = threshold
+        if isinstance(stores, StoreTable):
+            self.lats, self.lons = stores.lat, stores.lon
+            self.projection = stores.projection
+        else:
+            self.lats, self.lons = store_coordinates(stores)
+            self.projection = LocalProjection(self.lats, self.lons)
+
+    def query_radius(self, store_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        查询单个门店阈值距离内的其他门店
+
+        Args:
+            store_idx: 门店索引
+
+        Returns:
+            (附近门店索引数组（升序）, 对应距离数组)
+        """
+        raise NotImplementedError
+
+    def query_pairs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量查询所有距离不超过阈值的门店对
+
+        Returns:
+            (i数组, j数组, 距离数组)，满足 i < j，按 (i, j) 升序排列
+        """
+        rows_i = []
+        rows_j = []
+        rows_d = []
+        for store_idx in range(len(self.lats)):
+            nearby, dists = self.query_radius(store_idx)
+            rows_i.append(np.full(len(nearby), store_idx, dtype=np.intp))
+            rows_j.append(nearby)
+            rows_d.append(dists)
+        if not rows_i:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        return _normalize_pairs(np.concatenate(rows_i), np.concatenate(rows_j), np.concatenate(rows_d))
+
+    def query_pairs_between(self, rows_a: range, rows_b: range) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量查询两组门店之间（一个在 rows_a、一个在 rows_b）距离不超过阈值的门店对，例如两个品牌的行号范围
+
+        Args:
+            rows_a: 第一组门店的行号范围
+            rows_b: 第二组门店的行号范围（与 rows_a 不重叠）
+
+        Returns:
+            (i数组, j数组, 距离数组)，i 属于 rows_a、j 属于 rows_b，按 (i, j) 升序排列
+        """
+        rows_i = []
+        rows_j = []
+        rows_d = []
+        for store_idx in rows_a:
+            nearby, dists = self.query_radius(store_idx)
+            mask = (nearby >= rows_b.start) & (nearby < rows_b.stop)
+            rows_i.append(np.full(int(mask.sum()), store_idx, dtype=np.intp))
+            rows_j.append(nearby[mask])
+            rows_d.append(dists[mask])
+        if not rows_i:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        return np.concatenate(rows_i), np.concatenate(rows_j), np.concatenate(rows_d)
+
+
+def _sort_pairs(i: np.ndarray, j: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """按 (i, j) 排序门店对"""
+    order = np.lexsort((j, i))
+    return i[order], j[order], d[order]
+
+
+def _normalize_pairs(i: np.ndarray, j: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """将门店对统一为 i < j，去除重复并按 (i, j) 排序"""
+    lo = np.minimum(i, j)
+    hi = np.maximum(i, j)
+    order = np.lexsort((hi, lo))
+    lo, hi, d = lo[order], hi[order], d[order]
+    if len(lo):
+        keep = np.ones(len(lo), dtype=bool)
+        keep[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+        lo, hi, d = lo[keep], hi[keep], d[keep]
+    return lo, hi, d
+
+
+def _candidate_blocks(cell: np.ndarray, others: np.ndarray, start: np.ndarray,
+                      block_size: int = PAIR_BLOCK_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    逐块生成候选门店对：cell[k] 与 others[start[k]:] 中的每个门店各组成一对
+
+    按 cell 分块，每块的候选门店对不超过 block_size 个（单个门店的候选数超过 block_size 时单独成块），
+    不生成 |cell| × |others| 的稠密矩阵。
+
+    Args:
+        cell: 网格内的门店下标数组
+        others: 相邻网格中的候选门店下标数组
+        start: 每个 cell 门店在 others 中的第一个候选位置
+
+    Yields:
+        (i数组, j数组)
+    """
+    counts = len(others) - start
+    ends = np.cumsum(counts)
+    begin = 0
+    while begin < len(cell):
+        done = ends[begin - 1] if begin else 0
+        end = max(int(np.searchsorted(ends, done + block_size, side="right")), begin + 1)
+        block_counts = counts[begin:end]
+        total = int(block_counts.sum())
+        if total:
+            # 每个门店的候选位置：从 start[k] 开始的连续一段
+            first = np.repeat(start[begin:end] - (np.cumsum(block_counts) - block_counts), block_counts)
+            yield np.repeat(cell[begin:end], block_counts), others[first + np.arange(total)]
+        begin = end
+
+
+class SpatialGrid(NeighborIndex):
+    """简单的空间网格索引，用于快速查找附近的门店"""
+
+    def __init__(self, stores: Union[StoreTable, List[Dict]], threshold: float):
+        """
+        初始化空间网格
+
+        Args:
+            stores: 门店表或门店列表
+            threshold: 距离阈值
+        """
+        super().__init__(stores, threshold)
+        self.grid_size = threshold * 2  # 网格大小设为阈值的2倍
+        # 经度方向的网格宽度统一按纬度绝对值最大处的 cos 计算：若按每个门店自身纬度计算，
+        # 纬度略有差异的两个近邻门店可能落在不相邻的经度网格中而被漏掉
+        max_abs_lat = float(np.abs(self.lats).max()) if len(self.lats) else 0.0
+        self._lon_scale = 111000 * max(math.cos(math.radians(max_abs_lat)), 1e-6)
+        self.grid = defaultdict(list)
+
+        # 将门店放入网格
+        for idx, (lat, lon) in enumerate(zip(self.lats.tolist(), self.lons.tolist())):
+            grid_key = self._get_grid_key(lat, lon)
+            self.grid[grid_key].append(idx)
+
+        # 网格内的索引转为数组，便于批量计算距离
+        self.grid = {key: np.array(indices, dtype=np.intp) for key, indices in self.grid.items()}
+
+    def _get_grid_key(self, lat: float, lon: float) -> Tuple[int, int]:
+        """获取门店所在的网格坐标"""
+        grid_lat = int(lat / (self.grid_size / 111000))  # 大约111km每度
+        grid_lon = int(lon / (self.grid_size / self._lon_scale))
+        return (grid_lat, grid_lon)
+
+    def query_radius(self, store_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取指定门店附近的门店索引及对应距离
+
+        Args:
+            store_idx: 门店索引
+
+        Returns:
+            (附近门店索引数组（升序）, 对应距离数组)
+        """
+        lat = self.lats[store_idx]
+        lon = self.lons[store_idx]
+        grid_key = self._get_grid_key(lat, lon)
+
+        # 收集当前网格和相邻8个网格中的门店
+        cells = []
+        for dlat in [-1, 0, 1]:
+            for dlon in [-1, 0, 1]:
+                check_key = (grid_key[0] + dlat, grid_key[1] + dlon)
+                if check_key in self.grid:
+                    cells.append(self.grid[check_key])
+
+        if not cells:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        others = np.sort(np.concatenate(cells))
+        others = others[others != store_idx]
+
+        # 精确距离检查（一次计算所有候选门店）
+        dists = one_to_many_distances(lat, lon, self.lats[others], self.lons[others])
+        mask = dists <= self.threshold
+        return others[mask], dists[mask]
+
+    def query_pairs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        按网格批量查询所有门店对：每个网格与相邻网格中的门店先按投影距离筛选，再计算Haversine距离
+
+        Returns:
+            (i数组, j数组, 距离数组)，满足 i < j，按 (i, j) 升序排列
+        """
+        rows_i = []
+        rows_j = []
+        rows_d = []
+        for (grid_lat, grid_lon), cell in self.grid.items():
+            cells = []
+            for dlat in [-1, 0, 1]:
+                for dlon in [-1, 0, 1]:
+                    check_key = (grid_lat + dlat, grid_lon + dlon)
+                    if check_key in self.grid:
+                        cells.append(self.grid[check_key])
+            others = np.sort(np.concatenate(cells))
+
+            # 相邻关系是对称的，只保留 i < j 的一半即可让每对门店恰好出现一次
+            start = np.searchsorted(others, cell, side="right")
+            for i, j in _candidate_blocks(cell, others, start, PAIR_BLOCK_SIZE):
+                i, j, d = self.projection.filter_pairs(i, j, self.threshold)
+                rows_i.append(i)
+                rows_j.append(j)
+                rows_d.append(d)
+        if not rows_i:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        return _normalize_pairs(np.concatenate(rows_i), np.concatenate(rows_j), np.concatenate(rows_d))
+
+    def query_pairs_between(self, rows_a: range, rows_b: range) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        按网格批量查询两组门店之间的门店对：只取每个网格中属于 rows_a 的门店和相邻网格中属于 rows_b 的门店
+
+        Returns:
+            (i数组, j数组, 距离数组)，i 属于 rows_a、j 属于 rows_b，按 (i, j) 升序排列
+        """
+        rows_i = []
+        rows_j = []
+        rows_d = []
+        for (grid_lat, grid_lon), cell in self.grid.items():
+            cell = cell[(cell >= rows_a.start) & (cell < rows_a.stop)]
+            if not len(cell):
+                continue
+            cells = []
+            for dlat in [-1, 0, 1]:
+                for dlon in [-1, 0, 1]:
+                    check_key = (grid_lat + dlat, grid_lon + dlon)
+                    if check_key in self.grid:
+                        cells.append(self.grid[check_key])
+            others = np.concatenate(cells)
+            others = others[(others >= rows_b.start) & (others < rows_b.stop)]
+
+            start = np.zeros(len(cell), dtype=np.intp)
+            for i, j in _candidate_blocks(cell, others, start, PAIR_BLOCK_SIZE):
+                i, j, d = self.projection.filter_pairs(i, j, self.threshold)
+                rows_i.append(i)
+                rows_j.append(j)
+                rows_d.append(d)
+        if not rows_i:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        return _sort_pairs(np.concatenate(rows_i), np.concatenate(rows_j), np.concatenate(rows_d))
+
+    def get_nearby_stores(self, store_idx: int) -> Set[int]:
+        """
+        获取指定门店附近的所有门店索引
+
+        Args:
+            store_idx: 门店索引
+
+        Returns:
+            附近门店索引集合
+        """
+        nearby, _ = self.query_radius(store_idx)
+        return set(nearby.tolist())
+
+
+class KDTreeIndex(NeighborIndex):
+    """
+    KD树近邻索引
+
+    在门店的局部平面投影（distance.LocalProjection）坐标上构建KD树。
+    投影距离可能大于真实距离，因此查询半径按投影误差上界放大（LocalProjection.search_radius），
+    保证不漏掉任何真实近邻，再用Haversine精确过滤。
+    """
+
+    def __init__(self, stores: Union[StoreTable, List[Dict]], threshold: float):
+        """
+        Args:
+            stores: 门店表或门店列表
+            threshold: 距离阈值（米）
+        """
+        if not KDTREE_AVAILABLE:
+            raise ImportError("KDTreeIndex 需要安装 scipy")
+        super().__init__(stores, threshold)
+
+        self.search_radius = self.projection.search_radius(threshold)
+        self.tree = cKDTree(np.column_stack((self.projection.x, self.projection.y)))
+
+    def query_radius(self, store_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取指定门店附近的门店索引及对应距离
+
+        Args:
+            store_idx: 门店索引
+
+        Returns:
+            (附近门店索引数组（升序）, 对应距离数组)
+        """
+        others = np.array(sorted(self.tree.query_ball_point(self.tree.data[store_idx], self.search_radius)),
+                          dtype=np.intp)
+        others = others[others != store_idx]
+        dists = one_to_many_distances(self.lats[store_idx], self.lons[store_idx],
+                                      self.lats[others], self.lons[others])
+        mask = dists <= self.threshold
+        return others[mask], dists[mask]
+
+    def query_pairs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        一次查询所有门店对（KD树双树遍历），再用Haversine精确过滤
+
+        Returns:
+            (i数组, j数组, 距离数组)，满足 i < j，按 (i, j) 升序排列
+        """
+        pairs = self.tree.query_pairs(self.search_radius, output_type="ndarray")
+        if not len(pairs):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        i = pairs[:, 0].astype(np.intp)
+        j = pairs[:, 1].astype(np.intp)
+        return _normalize_pairs(*self.projection.filter_pairs(i, j, self.threshold))
+
+    def query_pairs_between(self, rows_a: range, rows_b: range) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        在两组门店各自的KD树之间双树遍历查询门店对，再用Haversine精确过滤
+
+        Returns:
+            (i数组, j数组, 距离数组)，i 属于 rows_a、j 属于 rows_b，按 (i, j) 升序排列
+        """
+        if not len(rows_a) or not len(rows_b):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        tree_a = cKDTree(self.tree.data[rows_a.start:rows_a.stop])
+        tree_b = cKDTree(self.tree.data[rows_b.start:rows_b.stop])
+        pairs = tree_a.sparse_distance_matrix(tree_b, self.search_radius, output_type="ndarray")
+        i = pairs["i"].astype(np.intp) + rows_a.start
+        j = pairs["j"].astype(np.intp) + rows_b.start
+        return _sort_pairs(*self.projection.filter_pairs(i, j, self.threshold))
+
+
+def create_neighbor_index(stores: Union[StoreTable, List[Dict]], threshold: float,
+                          backend: str = "auto") -> NeighborIndex:
+    """
+    创建近邻索引
+
+    Args:
+        stores: 门店表或门店列表
+        threshold: 距离阈值（米）
+        backend: 索引后端，auto（有 scipy 时使用KD树，否则使用网格）/ grid / kdtree
+
+    Returns:
+        近邻索引
+    """
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"未知的近邻索引类型: {backend}（可选: {', '.join(INDEX_BACKENDS)}）")
+    if backend == "kdtree" or (backend == "auto" and KDTREE_AVAILABLE):
+        return KDTreeIndex(stores, threshold)
+    return SpatialGrid(stores, threshold)
@@ -1,57 +1,329 @@
 """
 结果输出模块
 """
+import gzip
+import io
 import json
-from typing import List, Dict
+import re
+from typing import List, Dict, Iterable, Iterator, Optional, Sized, TextIO
 from datetime import datetime
 from config import AMAP_API_KEY, AMAP_JS_KEY, AMAP_SECURITY_CODE
+from store_table import store_key
 
+# 紧凑结果中每个门店的字段顺序（brand 为 brands 列表中的下标）
+COMPACT_STORE_FIELDS = ["brand", "name", "address", "lat", "lon"]
 
-def output_json(clusters: List[Dict], filename: str = None) -> str:
+# 紧凑格式 JSON 文件中每个门店的字段顺序（brand 为品牌名）
+JSON_COMPACT_STORE_FIELDS = ["brand", "name", "address", "lat", "lon", "poi_id", "type"]
+
+# 流式读取时每次读入的字符数
+_READ_SIZE = 1 << 16
+
+# 数组元素之间的空白和逗号
+_SEPARATOR_PATTERN = re.compile(r"[\s,]*")
+
+
+def _is_gzip_file(filename: str) -> bool:
+    """根据文件头判断是否为 gzip 文件"""
+    with open(filename, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+def _open_text(filename: str, mode: str, compress: bool = False) -> TextIO:
+    """打开文本文件（compress 为 True 时读写 gzip 文件）"""
+    if compress:
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+
+def write_json(clusters: Iterable[Dict], fp: TextIO, compact: bool = False) -> int:
+    """
+    逐个商圈流式写入JSON结果，不在内存中拼接整个JSON字符串
+
+    默认格式与之前的 output_json 相同（缩进2格，每个商圈包含 brands 和 stores）。
+    紧凑格式不缩进，每个商圈一行：[最大距离, [门店下标...], [本商圈第一次引用的门店...]]，
+    同一门店只写一次（字段见 JSON_COMPACT_STORE_FIELDS）。
+    商圈数在写完所有商圈后才知道，因此 cluster_count 写在 clusters 之后。
+
+    Args:
+        clusters: 商圈（可以是边生成边迭代的迭代器）
+        fp: 文本文件对象
+        compact: 是否使用紧凑格式
+
+    Returns:
+        写入的商圈数
+    """
+    timestamp = json.dumps(datetime.now().isoformat())
+    count = 0
+    if compact:
+        store_index = {}
+        fp.write('{"format":"compact","timestamp":%s,"store_fields":%s,"clusters":['
+                 % (timestamp, json.dumps(JSON_COMPACT_STORE_FIELDS)))
+        for cluster in clusters:
+            rows = []
+            new_stores = []
+            for brand, store in cluster["brands"].items():
+                key = (brand, store_key(store.get("poi_id"), store["lat"], store["lon"]))
+                idx = store_index.get(key)
+                if idx is None:
+                    idx = store_index[key] = len(store_index)
+                    new_stores.append([brand, store["name"], store["address"], store["lat"], store["lon"],
+                                       store.get("poi_id", ""), store.get("type", "")])
+                rows.append(idx)
+            fp.write(",\n" if count else "\n")
+            fp.write(json.dumps([cluster["max_distance"], rows, new_stores],
+                                ensure_ascii=False, separators=(",", ":")))
+            count += 1
+        fp.write('\n],"cluster_count":%d}\n' % count)
+        return count
+
+    fp.write('{\n  "timestamp": %s,\n  "clusters": [' % timestamp)
+    for cluster in clusters:
+        fp.write(",\n    " if count else "\n    ")
+        fp.write(json.dumps(cluster, ensure_ascii=False, indent=2).replace("\n", "\n    "))
+        count += 1
+    fp.write('\n  ],\n' if count else '],\n')
+    fp.write('  "cluster_count": %d\n}' % count)
+    return count
+
+
+def output_json(clusters: Iterable[Dict], filename: str = None, compact: bool = False,
+                compress: Optional[bool] = None) -> str:
     """
     生成JSON格式结果
     
     Args:
-        clusters: 商圈列表
+        clusters: 商圈列表（写入文件时可以是边生成边迭代的迭代器）
         filename: 输出文件名（可选，如果为None则返回JSON字符串）
+        compact: 是否使用紧凑格式（不缩进、门店只写一次，见 write_json）
+        compress: 是否写为 gzip 文件，默认根据文件名是否以 .gz 结尾判断
     
     Returns:
-        JSON字符串
+        未指定文件名时返回JSON字符串，否则返回文件名（流式写入，不在内存中生成整个字符串）
+    """
+    if not filename:
+        buffer = io.StringIO()
+        write_json(clusters, buffer, compact)
+        return buffer.getvalue()
+
+    if compress is None:
+        compress = filename.endswith(".gz")
+    with _open_text(filename, "w", compress) as f:
+        count = write_json(clusters, f, compact)
+    print(f"JSON结果已保存到: {filename}（{count} 个商圈）")
+    return filename
+
+
+def _iter_array_items(fp: TextIO, key: str):
+    """
+    增量解析JSON文件中指定键的数组，逐个返回元素
+
+    Returns:
+        (数组之前的其他字段, 元素迭代器)
+    """
+    pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buf = ""
+    while True:
+        chunk = fp.read(_READ_SIZE)
+        buf += chunk
+        match = pattern.search(buf)
+        if match:
+            break
+        if not chunk:
+            raise ValueError(f"JSON文件中没有 {key} 数组")
+    header = json.loads(buf[:match.start()].rstrip().rstrip(",") + "}")
+
+    def items():
+        decoder = json.JSONDecoder()
+        data = buf
+        pos = match.end()
+        while True:
+            pos = _SEPARATOR_PATTERN.match(data, pos).end()
+            if data.startswith("]", pos):
+                return
+            try:
+                item, pos = decoder.raw_decode(data, pos)
+            except json.JSONDecodeError:
+                # 元素不完整：读入更多内容后从该元素开头重新解析
+                chunk = fp.read(_READ_SIZE)
+                if not chunk:
+                    raise
+                data = data[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+
+    return header, items()
+
+
+def _expand_compact_cluster(item: list, stores: List) -> Dict:
+    """把紧凑格式的一个商圈还原为商圈字典（本商圈第一次引用的门店追加到 stores）"""
+    max_distance, rows, new_stores = item
+    for values in new_stores:
+        record = dict(zip(JSON_COMPACT_STORE_FIELDS, values))
+        stores.append((record.pop("brand"), record))
+    brands_dict = {}
+    cluster_stores = []
+    for idx in rows:
+        brand, store = stores[idx]
+        brands_dict[brand] = store
+        cluster_stores.append(store)
+    return {
+        "brands": brands_dict,
+        "stores": cluster_stores,
+        "max_distance": max_distance,
+        "brand_count": len(rows)
+    }
+
+
+def _read_clusters(fp: TextIO):
+    """解析JSON结果文件，返回 (其他字段, 商圈字典迭代器)"""
+    header, items = _iter_array_items(fp, "clusters")
+    if header.get("format") != "compact":
+        return header, items
+    stores = []
+    return header, (_expand_compact_cluster(item, stores) for item in items)
+
+
+def iter_json_clusters(filename: str) -> Iterator[Dict]:
+    """
+    流式读取 output_json 写入的JSON文件（默认格式或紧凑格式，可以是 gzip 文件），逐个返回商圈字典
+
+    紧凑格式还原后的商圈与默认格式相同（同一门店在多个商圈中共用一个字典）。
+
+    Args:
+        filename: JSON文件名
+
+    Yields:
+        商圈字典，包含 brands / stores / max_distance / brand_count
+    """
+    with _open_text(filename, "r", _is_gzip_file(filename)) as f:
+        _, clusters = _read_clusters(f)
+        yield from clusters
+
+
+def load_json(filename: str) -> Dict:
+    """
+    读取 output_json 写入的JSON文件
+
+    Returns:
+        {"timestamp": ..., "cluster_count": ..., "clusters": [...]}（紧凑格式已还原）
     """
-    result = {
-        "timestamp": datetime.now().isoformat(),
+    with _open_text(filename, "r", _is_gzip_file(filename)) as f:
+        header, clusters = _read_clusters(f)
+        clusters = list(clusters)
+    return {
+        "timestamp": header.get("timestamp"),
         "cluster_count": len(clusters),
         "clusters": clusters
     }
-    
-    json_str = json.dumps(result, ensure_ascii=False, indent=2)
-    
-    if filename:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(json_str)
-        print(f"JSON结果已保存到: {filename}")
-    
-    return json_str
 
 
-def output_log(clusters: List[Dict]):
+def new_compact_result(brands: List[str]) -> Dict:
+    """空的紧凑格式结果（商圈由 iter_compact_clusters 逐个追加）"""
+    return {
+        "brands": list(brands),
+        "store_fields": COMPACT_STORE_FIELDS,
+        "stores": [],
+        "clusters": []
+    }
+
+
+def compact_clusters(clusters: Iterable[Dict], brands: List[str]) -> Dict:
+    """
+    生成紧凑格式的结果（用于web服务）
+
+    每个门店只在 stores 表中出现一次，商圈以 [最大距离, [门店下标...]] 表示。
+    门店按第一次出现的商圈顺序编号，因此按商圈顺序切分后，每段新引用的门店在表中也是连续的一段。
+
+    Args:
+        clusters: 商圈列表
+        brands: 品牌列表（门店的 brand 字段为其中的下标）
+
+    Returns:
+        {"brands": [...], "store_fields": [...], "stores": [[...], ...], "clusters": [[max_distance, [idx, ...]], ...]}
+    """
+    compact = new_compact_result(brands)
+    for _ in iter_compact_clusters(clusters, compact, 0):
+        pass
+    return compact
+
+
+def iter_compact_clusters(clusters: Iterable[Dict], compact: Dict, chunk_size: int) -> Iterator[Dict]:
+    """
+    边迭代商圈边追加到紧凑结果（compact_clusters 的增量版本），每追加 chunk_size 个商圈返回一段
+
+    Args:
+        clusters: 商圈（可以是边查找边返回的迭代器）
+        compact: new_compact_result() 创建的结果，商圈和门店追加到其中
+        chunk_size: 每段的商圈数，0 表示不分段（只在结束时返回一段）
+
+    Yields:
+        {"offset": 本段第一个商圈的下标, "clusters": [...], "store_offset": 本段第一个新门店的下标, "stores": [...]}
+    """
+    brands = compact["brands"]
+    stores = compact["stores"]
+    compact_list = compact["clusters"]
+    brand_index = {brand: i for i, brand in enumerate(brands)}
+    store_index = {}
+    offset = len(compact_list)
+    store_offset = len(stores)
+    for cluster in clusters:
+        rows = []
+        for brand, store in cluster["brands"].items():
+            if brand not in brand_index:
+                brand_index[brand] = len(brands)
+                brands.append(brand)
+            key = (brand, store_key(store.get("poi_id"), store["lat"], store["lon"]))
+            idx = store_index.get(key)
+            if idx is None:
+                idx = store_index[key] = len(stores)
+                stores.append([brand_index[brand], store["name"], store["address"], store["lat"], store["lon"]])
+            rows.append(idx)
+        compact_list.append([round(cluster["max_distance"], 2), rows])
+
+        if chunk_size and len(compact_list) - offset >= chunk_size:
+            yield _compact_chunk(compact, offset, store_offset)
+            offset, store_offset = len(compact_list), len(stores)
+
+    if len(compact_list) > offset:
+        yield _compact_chunk(compact, offset, store_offset)
+
+
+def _compact_chunk(compact: Dict, offset: int, store_offset: int) -> Dict:
+    """紧凑结果中从第 offset 个商圈、第 store_offset 个门店开始的一段"""
+    return {
+        "offset": offset,
+        "clusters": compact["clusters"][offset:],
+        "store_offset": store_offset,
+        "stores": compact["stores"][store_offset:]
+    }
+
+
+def output_log(clusters: Iterable[Dict]):
     """
     命令行日志输出
     
     Args:
-        clusters: 商圈列表
+        clusters: 商圈列表（也可以是边查找边返回的迭代器，此时商圈数在最后输出）
     """
     print("\n" + "=" * 60)
     print("商圈查找结果")
     print("=" * 60)
     
-    if not clusters:
+    sized = isinstance(clusters, Sized)
+    if sized and not clusters:
         print("未找到符合条件的商圈")
         return
     
-    print(f"\n找到 {len(clusters)} 个符合条件的商圈：\n")
+    if sized:
+        print(f"\n找到 {len(clusters)} 个符合条件的商圈：\n")
+    else:
+        print()
     
+    count = 0
     for idx, cluster in enumerate(clusters, 1):
+        count = idx
         print(f"商圈 #{idx}")
         print("-" * 40)
         print(f"包含品牌数: {cluster.get('brand_count', len(cluster['brands']))}")
@@ -66,6 +338,8 @@ def output_log(clusters: List[Dict]):
         
         print()
     
+    if not sized:
+        print("未找到符合条件的商圈" if not count else f"共找到 {count} 个符合条件的商圈")
     print("=" * 60)
 
 
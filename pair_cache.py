@@ -0,0 +1,93 @@
+"""
+品牌对近邻门店对缓存 - 进程内LRU缓存
+
+以 (品牌a坐标指纹, 品牌b坐标指纹, 距离阈值) 为键缓存两个品牌之间距离不超过阈值的门店对
+（品牌内下标 + 距离）。指纹只取决于该品牌门店的坐标（见 StoreTable.brand_fingerprint），
+同一城市的品牌在不同品牌组合的查询之间可以复用，换掉组合中的一个品牌时只需计算新品牌相关的门店对；
+门店数据变化后指纹随之变化，旧条目不再命中。容量按缓存的门店对总数计算，超出时淘汰最久未访问的条目。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 一个品牌对的近邻门店对：(品牌a内下标数组, 品牌b内下标数组, 距离数组)
+BrandPairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class PairCache:
+    """品牌对近邻门店对缓存（线程安全）"""
+
+    def __init__(self, max_pairs: int):
+        """
+        Args:
+            max_pairs: 最多缓存的门店对总数，超出时淘汰最久未访问的品牌对
+        """
+        self.max_pairs = max_pairs
+        self._entries: 'OrderedDict[tuple, BrandPairs]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # 本进程内的统计（以品牌对为单位）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fingerprint_a: str, fingerprint_b: str, threshold: float) -> Optional[BrandPairs]:
+        """
+        读取品牌 a、b 之间的近邻门店对
+
+        Returns:
+            (品牌a内下标数组, 品牌b内下标数组, 距离数组)；未命中时返回 None
+        """
+        swapped = fingerprint_a > fingerprint_b
+        key = (fingerprint_b, fingerprint_a, threshold) if swapped else (fingerprint_a, fingerprint_b, threshold)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        i, j, d = entry
+        return (j, i, d) if swapped else entry
+
+    def put(self, fingerprint_a: str, fingerprint_b: str, threshold: float, pairs: BrandPairs):
+        """写入品牌 a、b 之间的近邻门店对（单个品牌对超过容量时不缓存）"""
+        i, j, d = pairs
+        if len(d) > self.max_pairs:
+            return
+        if fingerprint_a > fingerprint_b:
+            fingerprint_a, fingerprint_b, i, j = fingerprint_b, fingerprint_a, j, i
+        key = (fingerprint_a, fingerprint_b, threshold)
+        entry = (i.astype(np.int32), j.astype(np.int32), d.copy())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[2])
+            self._entries[key] = entry
+            self._size += len(d)
+            while self._size > self.max_pairs:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[2])
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict:
+        """缓存统计（本进程）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'pairs': self._size,
+                'max_pairs': self.max_pairs,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,186 @@
+"""
+多进程商圈搜索 - 按第一层（锚点）门店分片，在进程池中并行回溯
+
+每个子进程在启动时接收一次紧凑数据（品牌划分、坐标数组、近邻门店对数组），
+在本进程内重建候选集和团枚举引擎；之后每个任务只传递品牌集合和一组锚点门店（部分品牌回退时
+还有需要排除的门店）。
+各分片的商圈合并后按行索引元组排序，结果与单进程搜索完全一致。
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Callable, Iterable, FrozenSet
+
+import numpy as np
+
+from clique_search import CliqueSearch
+from store_table import StoreTable, TEXT_FIELDS, ClusterRows
+
+# 估算的组合数（旧算法的笛卡尔积规模）低于该值时直接在本进程搜索：子进程启动（spawn）需要1~2秒，
+# 规模较小的搜索在单进程内更快
+PARALLEL_MIN_PRODUCT = 10000000
+
+# 每个进程分到的分片数（分片越多负载越均衡，但任务调度开销越大）
+CHUNKS_PER_WORKER = 4
+
+# 子进程内的团枚举引擎（由 _init_worker 创建）
+_worker_engine: Optional[CliqueSearch] = None
+
+
+def _init_worker(brands: List[str], brand_offsets: List[int], lat: np.ndarray, lon: np.ndarray,
+                 pairs: Tuple[np.ndarray, np.ndarray, np.ndarray]):
+    """子进程初始化：根据紧凑数据重建门店表（不含文本列）、候选集和引擎"""
+    global _worker_engine
+    from cluster_finder_optimized import build_brand_candidates
+
+    empty = [""] * len(lat)
+    table = StoreTable(brands, brand_offsets, lat, lon, {field: empty for field in TEXT_FIELDS})
+    brand_candidates, pair_distances = build_brand_candidates(table, pairs)
+    _worker_engine = CliqueSearch(table, brand_candidates, pair_distances)
+
+
+def _pack_results(engine: CliqueSearch, clusters: List[ClusterRows], size: int, nodes: int, leaves: int
+                  ) -> Tuple[np.ndarray, np.ndarray, int, int]:
+    """
+    把子进程的商圈打包为数组（行索引矩阵 + 最大距离数组），比逐个序列化 ClusterRows 小得多
+
+    Returns:
+        (行索引矩阵 (商圈数, 品牌数), 最大距离数组, 回溯节点数, 完整组合数)
+    """
+    rows = np.array([c.rows for c in clusters], dtype=np.int32).reshape(len(clusters), size)
+    max_distances = np.array([c.max_distance for c in clusters], dtype=np.float64)
+    return rows, max_distances, engine.nodes - nodes, engine.leaves - leaves
+
+
+def _search_chunk(brands: List[int], anchors: List[int], distance_range: Optional[Tuple[float, float]] = None
+                  ) -> Tuple[np.ndarray, np.ndarray, int, int]:
+    """子进程任务：在一组锚点门店上枚举全部品牌的商圈（可限定最大距离区间）"""
+    engine = _worker_engine
+    nodes, leaves = engine.nodes, engine.leaves
+    clusters = engine.search(brands, anchors=anchors, distance_range=distance_range)
+    return _pack_results(engine, clusters, len(brands), nodes, leaves)
+
+
+def _search_level_chunk(brands: List[int], size: int, required: List[int], excluded: FrozenSet[int],
+                        anchors: List[int]) -> Tuple[np.ndarray, np.ndarray, int, int]:
+    """子进程任务：枚举第一个选中门店属于 anchors 的、覆盖 size 个品牌的商圈"""
+    engine = _worker_engine
+    nodes, leaves = engine.nodes, engine.leaves
+    clusters = engine.search_level(brands, size, required, excluded, anchors=frozenset(anchors))
+    return _pack_results(engine, clusters, size, nodes, leaves)
+
+
+class ParallelCliqueSearch:
+    """
+    CliqueSearch 的多进程包装，提供相同的 search / search_level 接口
+
+    进程池在第一次需要并行时才创建，用完后需调用 close()（或使用 with 语句）。
+    """
+
+    def __init__(self, engine: CliqueSearch, pairs: Tuple[np.ndarray, np.ndarray, np.ndarray], workers: int):
+        """
+        Args:
+            engine: 本进程的团枚举引擎（小规模搜索直接使用）
+            pairs: 构建候选集所用的近邻门店对 (i数组, j数组, 距离数组)
+            workers: 进程数
+        """
+        self.engine = engine
+        self.pairs = pairs
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._parallel_nodes = 0
+        self._parallel_leaves = 0
+
+    @property
+    def nodes(self) -> int:
+        """回溯过程中尝试的部分组合数（含子进程）"""
+        return self.engine.nodes + self._parallel_nodes
+
+    @property
+    def leaves(self) -> int:
+        """得到的完整组合数（含子进程）"""
+        return self.engine.leaves + self._parallel_leaves
+
+    def __enter__(self) -> "ParallelCliqueSearch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """创建进程池，并把紧凑数据一次性传给每个子进程"""
+        if self._pool is None:
+            table = self.engine.table
+            # 使用 spawn 启动子进程：Web 服务中搜索运行在后台线程里，fork 多线程进程不安全
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(table.brands, table.brand_offsets, table.lat, table.lon, self.pairs)
+            )
+        return self._pool
+
+    def search(self, brands: List[int],
+               iterate: Optional[Callable[[List], Iterable]] = None,
+               distance_range: Optional[Tuple[float, float]] = None) -> List[ClusterRows]:
+        """
+        枚举指定品牌集合上的所有商圈
+
+        Args:
+            brands: 品牌下标列表（至少2个）
+            iterate: 包装分片迭代的函数（例如 tqdm 进度条）
+            distance_range: 只枚举最大距离在 (lower, upper] 内的商圈（见 CliqueSearch.search）
+
+        Returns:
+            商圈列表，按门店行索引元组升序排列
+        """
+        if self.engine.count_product(brands) < PARALLEL_MIN_PRODUCT:
+            return self.engine.search(brands, iterate=iterate, distance_range=distance_range)
+        return self._search_parallel(brands, iterate, distance_range)
+
+    def search_level(self, brands: List[int], size: int, required: Iterable[int] = (),
+                     excluded: FrozenSet[int] = frozenset()) -> List[ClusterRows]:
+        """并行枚举恰好覆盖 size 个品牌的所有商圈：按商圈中第一个选中的门店分片"""
+        if self.engine.count_subset_products(brands) < PARALLEL_MIN_PRODUCT:
+            return self.engine.search_level(brands, size, required, excluded)
+
+        pool = self._get_pool()
+        num_chunks = self.workers * CHUNKS_PER_WORKER
+        anchors = [idx for b in brands for idx in self.engine.table.brand_rows(b) if idx not in excluded]
+        required = list(required)
+        futures = [pool.submit(_search_level_chunk, brands, size, required, excluded, anchors[k::num_chunks])
+                   for k in range(min(num_chunks, len(anchors)))]
+
+        results = []
+        for future in futures:
+            results.extend(self._collect(future, size))
+        return results
+
+    def _search_parallel(self, brands: List[int],
+                         iterate: Optional[Callable[[List], Iterable]] = None,
+                         distance_range: Optional[Tuple[float, float]] = None) -> List[ClusterRows]:
+        """把锚点门店交错分片后提交到进程池，合并结果"""
+        pool = self._get_pool()
+        num_chunks = self.workers * CHUNKS_PER_WORKER
+        anchors = self.engine.anchor_stores(brands, distance_range)
+        # 交错分片：相邻锚点的候选规模相近，交错分配更均衡
+        futures = [pool.submit(_search_chunk, brands, anchors[k::num_chunks], distance_range)
+                   for k in range(min(num_chunks, len(anchors)))]
+
+        results = []
+        for future in (iterate(futures) if iterate else futures):
+            results.extend(self._collect(future, len(brands)))
+        results.sort(key=lambda c: c.rows)
+        return results
+
+    def _collect(self, future, brand_count: int) -> List[ClusterRows]:
+        """取回子进程任务的结果，累加统计并还原为 ClusterRows"""
+        rows, max_distances, nodes, leaves = future.result()
+        self._parallel_nodes += nodes
+        self._parallel_leaves += leaves
+        return [ClusterRows(tuple(r), d, brand_count) for r, d in zip(rows.tolist(), max_distances.tolist())]
@@ -0,0 +1,246 @@
+"""
+POI搜索结果缓存 - 基于SQLite的磁盘缓存
+
+以 (城市, 关键词, 最大页数) 为键缓存 search_poi 的原始分页结果（去重之前），
+支持过期时间（TTL）、按最近访问时间的LRU淘汰，以及命中/未命中统计。
+数据库使用WAL模式，多个 gunicorn worker 进程可以共享同一个缓存文件。
+
+读取只执行 SELECT：命中时的访问时间和命中/未命中计数先记在进程内，写入缓存时、读取统计时
+或距上次写回超过 flush_interval 秒时才用一个事务批量写回，命中不会让各 worker 争抢 SQLite 写锁。
+因此LRU淘汰依据的访问时间最多滞后 flush_interval 秒。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+
+
+class PoiCache:
+    """POI搜索结果的磁盘缓存"""
+
+    def __init__(self, path: str, ttl: float, max_entries: int, flush_interval: float = 30):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            ttl: 缓存有效期（秒）
+            max_entries: 最多缓存的条目数，超出时淘汰最久未访问的条目
+            flush_interval: 访问时间和统计计数写回数据库的最长间隔（秒）
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        # 本进程内的统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # 尚未写回数据库的访问时间 {(城市, 关键词, 最大页数): 时间} 和统计计数 {名称: 增量}
+        self._pending_access: Dict[Tuple[str, str, int], float] = {}
+        self._pending_counts: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（fork 之后的子进程会重新连接）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS poi_cache (
+                city TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                max_pages INTEGER NOT NULL,
+                stores TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (city, keyword, max_pages)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_poi_cache_accessed ON poi_cache (accessed_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS poi_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        """累加共享统计（所有进程汇总）"""
+        conn.execute(
+            "INSERT INTO poi_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def _record(self, name: str, key: Optional[Tuple[str, str, int]] = None, accessed_at: float = 0.0):
+        """在进程内记下一次命中（及访问时间）或未命中，到期时批量写回"""
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self._pending_counts[name] = self._pending_counts.get(name, 0) + 1
+            if key is not None:
+                self._pending_access[key] = accessed_at
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _take_pending(self) -> Tuple[Dict[Tuple[str, str, int], float], Dict[str, int]]:
+        """取出尚未写回的访问时间和统计计数"""
+        with self._stats_lock:
+            access, counts = self._pending_access, self._pending_counts
+            self._pending_access, self._pending_counts = {}, {}
+            self._last_flush = time.monotonic()
+        return access, counts
+
+    def _write_pending(self, conn: sqlite3.Connection, access: Dict[Tuple[str, str, int], float],
+                       counts: Dict[str, int]):
+        """在当前事务中写回访问时间和统计计数"""
+        if access:
+            conn.executemany(
+                "UPDATE poi_cache SET accessed_at = MAX(accessed_at, ?) WHERE city = ? AND keyword = ? AND max_pages = ?",
+                [(accessed_at, *key) for key, accessed_at in access.items()]
+            )
+        for name, amount in counts.items():
+            self._count(conn, name, amount)
+
+    def flush(self):
+        """把进程内累积的访问时间和统计计数写回数据库（一个事务）"""
+        access, counts = self._take_pending()
+        if not access and not counts:
+            return
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_pending(conn, access, counts)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"警告: 写回POI缓存统计失败 - {e}")
+
+    def get(self, city: str, keyword: str, max_pages: int) -> Optional[List[Dict]]:
+        """
+        读取缓存
+
+        Args:
+            city: 城市名称
+            keyword: 搜索关键词
+            max_pages: 最大搜索页数
+
+        Returns:
+            缓存的门店列表；未命中或已过期时返回 None（过期条目在下次写入时清理）
+        """
+        now = time.time()
+        try:
+            row = self._connect().execute(
+                "SELECT stores, created_at FROM poi_cache WHERE city = ? AND keyword = ? AND max_pages = ?",
+                (city, keyword, max_pages)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"警告: 读取POI缓存失败 - {e}")
+            return None
+
+        if row is None or now - row[1] > self.ttl:
+            self._record("misses")
+            return None
+
+        self._record("hits", (city, keyword, max_pages), now)
+        return json.loads(row[0])
+
+    def put(self, city: str, keyword: str, max_pages: int, stores: List[Dict]):
+        """
+        写入缓存，并按LRU淘汰超出容量的条目
+
+        Args:
+            city: 城市名称
+            keyword: 搜索关键词
+            max_pages: 最大搜索页数
+            stores: 门店列表
+        """
+        now = time.time()
+        access, counts = self._take_pending()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 顺带写回累积的访问时间和统计，淘汰时使用最新的访问时间
+                self._write_pending(conn, access, counts)
+                conn.execute(
+                    "INSERT OR REPLACE INTO poi_cache (city, keyword, max_pages, stores, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (city, keyword, max_pages, json.dumps(stores, ensure_ascii=False), now, now)
+                )
+                # 先清理过期条目，再按最近访问时间淘汰超出容量的条目
+                evicted = conn.execute("DELETE FROM poi_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+                evicted += conn.execute(
+                    "DELETE FROM poi_cache WHERE rowid IN ("
+                    "SELECT rowid FROM poi_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+                if evicted:
+                    self._count(conn, "evictions", evicted)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if evicted:
+                with self._stats_lock:
+                    self.evictions += evicted
+        except sqlite3.Error as e:
+            print(f"警告: 写入POI缓存失败 - {e}")
+
+    def clear(self):
+        """清空缓存条目和共享统计"""
+        self._take_pending()
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM poi_cache")
+            conn.execute("DELETE FROM poi_cache_stats")
+        except sqlite3.Error as e:
+            print(f"警告: 清空POI缓存失败 - {e}")
+
+    def stats(self) -> Dict:
+        """
+        获取缓存统计
+
+        Returns:
+            字典，包含条目数、所有进程汇总的命中/未命中/淘汰次数（其他进程尚未写回的计数不在其中），以及本进程的统计；
+            读取数据库失败时汇总的各项为 None
+        """
+        self.flush()
+        try:
+            conn = self._connect()
+            entries = conn.execute("SELECT COUNT(*) FROM poi_cache").fetchone()[0]
+            shared = dict(conn.execute("SELECT name, value FROM poi_cache_stats").fetchall())
+        except sqlite3.Error as e:
+            print(f"警告: 读取POI缓存统计失败 - {e}")
+            entries = hits = misses = evictions = hit_rate = None
+        else:
+            hits = shared.get("hits", 0)
+            misses = shared.get("misses", 0)
+            evictions = shared.get("evictions", 0)
+            hit_rate = hits / (hits + misses) if hits + misses else 0.0
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": hit_rate,
+            "process": {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+        }
@@ -0,0 +1,121 @@
+"""
+分块笛卡尔积枚举 - 原始算法（use_optimized=False）的向量化实现
+
+原始算法检查"每个品牌各选一个门店"的全部组合。这里按品牌顺序逐层扩展组合：每层把一批部分组合与
+下一个品牌的全部门店做数组广播，用Haversine公式（pairwise_distances）计算这一块的距离，
+用布尔掩码一次筛掉任一门店对超出阈值的组合，之后只扩展剩下的部分组合。
+距离按块现算，不缓存品牌之间的距离矩阵，内存占用只取决于 BLOCK_SIZE。
+判定条件与 check_all_distances 相同（两两距离都不超过阈值），结果和顺序与逐个组合检查一致，
+因此可以作为优化算法的正确性参照。
+"""
+import math
+from typing import List, Optional, Callable
+
+import numpy as np
+
+from distance import pairwise_distances
+from store_table import StoreTable, ClusterRows
+
+# 每次广播最多计算的组合数（决定单个距离块的内存占用：8字节 * BLOCK_SIZE）
+BLOCK_SIZE = 1 << 18
+
+
+class ProductSearch:
+    """在门店表上分块枚举品牌门店的笛卡尔积"""
+
+    def __init__(self, table: StoreTable, block_size: int = BLOCK_SIZE):
+        """
+        Args:
+            table: 门店表
+            block_size: 每次广播最多计算的组合数
+        """
+        self.table = table
+        self.block_size = max(1, block_size)
+        # 统计：计算过距离的部分组合数
+        self.checked = 0
+
+    def block_distances(self, a: int, stores_a: np.ndarray, b: int) -> np.ndarray:
+        """
+        品牌 a 的一组门店与品牌 b 全部门店之间的Haversine距离（形状为 (len(stores_a), b的门店数)）
+
+        一块部分组合中同一个门店往往出现多次，只对其中不同的门店计算一次距离再按下标展开。
+
+        Args:
+            a: 品牌下标
+            stores_a: 品牌 a 的门店（品牌内下标）数组
+            b: 品牌下标
+
+        Returns:
+            距离矩阵（米），第 k 行为 stores_a[k] 到品牌 b 各门店的距离
+        """
+        table = self.table
+        offset_a = table.brand_offsets[a]
+        rows_b = slice(table.brand_offsets[b], table.brand_offsets[b + 1])
+        unique, inverse = np.unique(stores_a, return_inverse=True)
+        rows_a = unique + offset_a
+        distances = pairwise_distances(table.lat[rows_a], table.lon[rows_a], table.lat[rows_b], table.lon[rows_b])
+        return distances[inverse.reshape(-1)]
+
+    def count_product(self, brands: List[int]) -> int:
+        """品牌门店笛卡尔积的组合数"""
+        return math.prod(self.table.brand_size(b) for b in brands)
+
+    def search(self, brands: List[int], threshold: float,
+               advance: Optional[Callable[[int], None]] = None) -> List[ClusterRows]:
+        """
+        枚举指定品牌集合上门店两两距离都不超过阈值的所有组合
+
+        Args:
+            brands: 品牌下标列表（按表中顺序，至少2个）
+            threshold: 距离阈值（米）
+            advance: 进度回调，参数为新处理完的完整组合数（按第一个品牌的门店分块调用）
+
+        Returns:
+            商圈列表，按 itertools.product 的枚举顺序排列
+        """
+        results = []
+        first = self.table.brand_size(brands[0])
+        combos = np.arange(first, dtype=np.intp)[:, None]
+        self._extend(brands, 1, combos, np.zeros(first), threshold, results, advance)
+        return results
+
+    def _extend(self, brands: List[int], depth: int, combos: np.ndarray, max_distances: np.ndarray,
+                threshold: float, results: List[ClusterRows], advance: Optional[Callable[[int], None]]):
+        """
+        为一批部分组合（前 depth 个品牌的门店下标）选择 brands[depth] 的门店，筛掉超出阈值的组合
+
+        部分组合按块处理，每块与下一个品牌全部门店广播后的距离数组不超过 block_size 个元素。
+        """
+        brand = brands[depth]
+        size = self.table.brand_size(brand)
+        last = depth + 1 == len(brands)
+        rest = math.prod(self.table.brand_size(b) for b in brands[depth + 1:])
+        step = max(1, self.block_size // size)
+
+        for start in range(0, len(combos), step):
+            block = combos[start:start + step]
+            # 每个部分组合加上下一个品牌每个门店后的最大距离
+            dist = np.repeat(max_distances[start:start + step, None], size, axis=1)
+            for j, b in enumerate(brands[:depth]):
+                np.maximum(dist, self.block_distances(b, block[:, j], brand), out=dist)
+            self.checked += dist.size
+
+            combo_idx, store_idx = np.nonzero(dist <= threshold)
+            if len(combo_idx):
+                extended = np.column_stack((block[combo_idx], store_idx))
+                extended_max = dist[combo_idx, store_idx]
+                if last:
+                    self._collect(brands, extended, extended_max, results)
+                else:
+                    self._extend(brands, depth + 1, extended, extended_max, threshold, results, None)
+
+            if advance is not None:
+                advance(len(block) * size * rest)
+
+    def _collect(self, brands: List[int], combos: np.ndarray, max_distances: np.ndarray,
+                 results: List[ClusterRows]):
+        """把完整组合的品牌内下标转换为行索引，追加到结果"""
+        offsets = np.asarray([self.table.brand_offsets[b] for b in brands], dtype=np.intp)
+        rows = (combos + offsets).tolist()
+        brand_count = len(brands)
+        results.extend(ClusterRows(tuple(r), d, brand_count) for r, d in zip(rows, max_distances.tolist()))
@@ -0,0 +1,138 @@
+"""
+进度事件 - 门店搜索和商圈查找各阶段的结构化进度
+
+核心代码不直接 print 或创建 tqdm 进度条，而是向进度接收器（sink，任意可调用对象）发送
+ProgressEvent：阶段名、消息、已完成数/总数和阶段耗时。命令行默认使用 ConsoleProgress
+渲染为 print 输出和 tqdm 进度条；Web 端直接把事件转换为 SSE 消息，不再解析 stdout。
+
+阶段名：
+    fetch       单个品牌的POI请求（缓存命中、重试、去重、结果数；key 为品牌名）
+    index       构建近邻索引
+    candidates  构建候选集、估算组合数
+    enumerate   全品牌商圈枚举（done/total 为已处理的锚点门店或组合数）
+    fallback    部分品牌回退
+    dedupe      商圈去重
+    cache       商圈结果缓存命中
+"""
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional, TypeVar
+
+from tqdm import tqdm
+
+T = TypeVar('T')
+
+
+class ProgressEvent(NamedTuple):
+    """
+    一条进度事件
+
+    done 为 None 的是日志型事件（只有消息）；否则是计数型事件，消息为进度条标题。
+    """
+    stage: str
+    message: str = ''
+    done: Optional[int] = None
+    total: Optional[int] = None
+    elapsed: float = 0.0  # 自阶段开始以来的秒数
+    level: str = 'info'  # info / warning / error
+    key: Optional[str] = None  # 事件所属对象（例如品牌名）
+    unit: str = ''  # 计数单位（门店、组合等）
+
+
+ProgressSink = Callable[[ProgressEvent], None]
+
+
+class ConsoleProgress:
+    """把进度事件渲染为 print 输出和 tqdm 进度条（命令行默认的接收器）"""
+
+    def __init__(self):
+        self._bars: Dict[tuple, tqdm] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: ProgressEvent):
+        if event.done is None:
+            print(event.message)
+            return
+
+        bar_key = (event.stage, event.key)
+        with self._lock:
+            bar = self._bars.get(bar_key)
+            if bar is None:
+                bar = tqdm(total=event.total, desc=event.message, unit=event.unit or 'it', leave=event.key is None)
+                self._bars[bar_key] = bar
+            bar.update(event.done - bar.n)
+            if event.total is not None and event.done >= event.total:
+                bar.close()
+                del self._bars[bar_key]
+
+
+class Progress:
+    """
+    向接收器发送事件的辅助对象：记录各阶段的开始时间，把计数型进度节流后发送
+
+    开始时间按 (阶段, key) 记录，多个线程可以共用一个对象（例如并发搜索多个品牌）。
+    未指定接收器时使用 ConsoleProgress。
+    """
+
+    # 计数型进度最多发送的事件数（每个迭代）
+    TICKS = 100
+
+    def __init__(self, sink: Optional[ProgressSink] = None):
+        self.sink = sink if sink is not None else ConsoleProgress()
+        self._starts: Dict[tuple, float] = {}
+
+    @classmethod
+    def of(cls, progress) -> 'Progress':
+        """把接收器（或 None、已有的 Progress 对象）统一为 Progress 对象"""
+        return progress if isinstance(progress, Progress) else cls(progress)
+
+    def start(self, stage: str, message: str = '', key: Optional[str] = None):
+        """开始一个阶段（重新计时），有消息时同时发送"""
+        self._starts[(stage, key)] = time.perf_counter()
+        if message:
+            self.log(stage, message, key=key)
+
+    def elapsed(self, stage: str, key: Optional[str] = None) -> float:
+        """阶段开始以来的秒数（未调用 start 时为0）"""
+        start = self._starts.get((stage, key))
+        return time.perf_counter() - start if start is not None else 0.0
+
+    def emit(self, stage: str, message: str = '', done: Optional[int] = None, total: Optional[int] = None,
+             level: str = 'info', key: Optional[str] = None, unit: str = ''):
+        """发送一条事件"""
+        self.sink(ProgressEvent(stage, message, done, total, self.elapsed(stage, key), level, key, unit))
+
+    def log(self, stage: str, message: str, level: str = 'info', key: Optional[str] = None):
+        """发送一条日志型事件"""
+        self.emit(stage, message, level=level, key=key)
+
+    def iterate(self, stage: str, items: Iterable[T], message: str = '', total: Optional[int] = None,
+                unit: str = '', key: Optional[str] = None) -> Iterator[T]:
+        """
+        迭代 items，同时发送计数型进度（开始、约每 1/TICKS 和结束时各一次）
+
+        Args:
+            stage: 阶段名
+            items: 要迭代的对象
+            message: 进度条标题
+            total: 总数，默认为 len(items)
+            unit: 计数单位
+            key: 事件所属对象
+        """
+        if total is None:
+            total = len(items)
+        step = max(1, total // self.TICKS)
+        next_tick = step
+        done = 0
+        self.emit(stage, message, 0, total, key=key, unit=unit)
+        if not total:
+            yield from items
+            return
+        for item in items:
+            yield item
+            done += 1
+            if done >= next_tick:
+                next_tick = done + step
+                if done < total:
+                    self.emit(stage, message, done, total, key=key, unit=unit)
+        self.emit(stage, message, total, total, key=key, unit=unit)
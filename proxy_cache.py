@@ -0,0 +1,163 @@
+"""
+/_AMapService 代理的响应缓存 - 短期内存缓存 + 并发请求合并
+
+以 (路径, 规范化后的参数) 为键缓存高德 JS API 服务的响应，参数中的 jscode（安全密钥）不参与键。
+JSONP 请求的回调函数名每次都不同，缓存时去掉回调包装，返回时再用本次请求的回调名包装。
+同一个键的并发请求只向上游发一次，其余请求等待并共用结果。缓存在每个进程内独立。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+# 不参与缓存键的参数：jscode 由服务端附加，callback 单独处理
+_IGNORED_PARAMS = ('jscode', 'callback')
+
+
+class ProxyResponse(NamedTuple):
+    """上游响应"""
+    content: bytes
+    status: int
+    content_type: str
+
+
+class _Flight:
+    """一次进行中的上游请求，同键的并发请求等待它完成"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[ProxyResponse] = None
+        self.error: Optional[BaseException] = None
+        # 去掉 JSONP 包装后的响应，等待的请求用各自的回调名重新包装
+        self.body: Optional[ProxyResponse] = None
+        self.jsonp = False
+
+
+class ProxyCache:
+    """代理响应缓存（线程安全）"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        Args:
+            ttl: 缓存有效期（秒），0 表示不缓存（仍合并并发请求）
+            max_entries: 最多缓存的响应数，超出时淘汰最久未访问的响应
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, Tuple[float, ProxyResponse, bool]]' = OrderedDict()
+        self._flights: Dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+        # 本进程内的统计
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(path: str, params: Iterable[Tuple[str, str]]) -> tuple:
+        """缓存键：路径 + 排序后的参数（忽略 jscode 和 callback 的值，但区分是否为 JSONP 请求）"""
+        params = list(params)
+        normalized = tuple(sorted((k, v) for k, v in params if k not in _IGNORED_PARAMS))
+        jsonp = any(k == 'callback' for k, _ in params)
+        return path, normalized, jsonp
+
+    def fetch(self, key: tuple, callback: Optional[str], load: Callable[[], ProxyResponse]) -> ProxyResponse:
+        """
+        读取缓存，未命中时调用 load 请求上游（同键的并发请求只请求一次）
+
+        Args:
+            key: make_key() 生成的缓存键
+            callback: 本次请求的 JSONP 回调函数名（不是 JSONP 请求时为 None）
+            load: 请求上游的函数
+
+        Returns:
+            响应（JSONP 响应已用本次请求的回调名包装）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._wrap(entry[1], entry[2], callback)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.response = load()
+            except BaseException as e:
+                flight.error = e
+            self._finish(key, flight, callback)
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        if flight.body is None:
+            return flight.response
+        return self._wrap(flight.body, flight.jsonp, callback)
+
+    def _finish(self, key: tuple, flight: _Flight, callback: Optional[str]):
+        """上游请求结束：成功的响应写入缓存，唤醒等待的请求"""
+        if flight.response is not None:
+            unwrapped = self._unwrap(flight.response, callback)
+            if unwrapped is not None:
+                flight.body, flight.jsonp = unwrapped
+        cacheable = (flight.body is not None and self.ttl > 0 and flight.body.status == 200
+                     and b'"status":"0"' not in flight.body.content)
+        with self._lock:
+            if cacheable:
+                self._entries[key] = (time.monotonic() + self.ttl, flight.body, flight.jsonp)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            del self._flights[key]
+        flight.done.set()
+
+    @staticmethod
+    def _unwrap(response: ProxyResponse, callback: Optional[str]) -> Optional[Tuple[ProxyResponse, bool]]:
+        """
+        去掉 JSONP 响应的回调包装
+
+        Returns:
+            (响应, 是否为 JSONP)，JSONP 响应格式不符时返回 None
+        """
+        if callback is None:
+            return response, False
+        content = response.content.strip()
+        prefix = callback.encode('utf-8') + b'('
+        if content.endswith(b';'):
+            content = content[:-1]
+        if not content.startswith(prefix) or not content.endswith(b')'):
+            return None
+        return response._replace(content=content[len(prefix):-1]), True
+
+    @staticmethod
+    def _wrap(response: ProxyResponse, jsonp: bool, callback: Optional[str]) -> ProxyResponse:
+        """JSONP 响应用本次请求的回调名重新包装"""
+        if not jsonp or callback is None:
+            return response
+        return response._replace(content=callback.encode('utf-8') + b'(' + response.content + b')')
+
+    def stats(self) -> Dict:
+        """缓存统计（本进程）"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,64 @@
+"""
+令牌桶限流器 - 多线程共享的请求速率控制
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+
+    以 rate 个/秒的速度补充令牌，最多积累 capacity 个。每次请求前调用 acquire()
+    取走一个令牌，没有令牌时阻塞等待，从而把所有线程的总请求速率限制在 rate 以内。
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数（即允许的QPS）
+            capacity: 桶容量（允许的突发请求数），默认等于 rate（至少为1）
+        """
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """按经过的时间补充令牌（调用方需持有锁）"""
+        if now > self._last:
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        取走令牌，不足时阻塞等待
+
+        Args:
+            tokens: 需要的令牌数
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = max(self._last - now, 0.0) + (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """
+        遇到服务端限流时清空令牌并暂停补充，让所有线程一起退避
+
+        Args:
+            seconds: 暂停时长（秒）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._last = max(self._last, now + seconds)
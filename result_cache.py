@@ -0,0 +1,237 @@
+"""
+商圈结果缓存 - 进程内LRU内存层 + 可选的SQLite磁盘层
+
+以 (门店表内容指纹, 距离阈值, 必选品牌) 为键缓存去重后的商圈（行索引形式）。指定了商圈数上限的查询
+只得到前 limit 个商圈，缓存时记下上限，之后上限不超过它的查询（或结果本来就不足上限时的任意查询）都可以命中。
+指纹是门店表全部内容（品牌、坐标、文本字段）的哈希，POI数据有任何变化都会得到新的键，
+旧结果不会再被命中，随LRU淘汰或过期清理，因此不需要手动失效。
+内存层每个进程一份；磁盘层（配置了路径时）使用WAL模式，多个 gunicorn worker 进程共享同一个文件。
+读取磁盘层只执行 SELECT：命中时的访问时间先记在进程内，下次写入时在同一个事务中写回（与过期清理、LRU淘汰一起），
+读取不会让各 worker 争抢 SQLite 写锁。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from store_table import StoreTable, ClusterRows
+
+
+class ResultCache:
+    """商圈结果缓存（线程安全）"""
+
+    def __init__(self, max_entries: int, path: Optional[str] = None, ttl: float = 0,
+                 disk_max_entries: int = 0):
+        """
+        Args:
+            max_entries: 内存层最多缓存的结果数，超出时淘汰最久未访问的结果
+            path: 磁盘层SQLite数据库文件路径，为空时只使用内存层
+            ttl: 磁盘层的有效期（秒）
+            disk_max_entries: 磁盘层最多缓存的结果数，超出时淘汰最久未访问的结果（0 表示不限制）
+        """
+        self.max_entries = max_entries
+        self.path = path or None
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        # 键 -> (商圈数上限，None 表示完整结果；商圈)
+        self._entries: 'OrderedDict[str, Tuple[Optional[int], Tuple[ClusterRows, ...]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 尚未写回磁盘层的访问时间 {键: 时间}
+        self._pending_access: Dict[str, float] = {}
+        # 本进程内的统计
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def make_key(table: StoreTable, threshold: float, required_brands: Optional[Sequence[str]] = None) -> str:
+        """缓存键：门店表指纹 + 阈值 + 排序后的必选品牌"""
+        required = ",".join(sorted(required_brands)) if required_brands else ""
+        return f"{table.fingerprint}|{float(threshold)!r}|{required}"
+
+    @staticmethod
+    def _covers(cached_limit: Optional[int], limit: Optional[int]) -> bool:
+        """按 cached_limit 缓存的结果能否回答上限为 limit 的查询"""
+        return cached_limit is None or (limit is not None and limit <= cached_limit)
+
+    def get(self, key: str, limit: Optional[int] = None) -> Optional[List[ClusterRows]]:
+        """
+        读取缓存：先查内存层，未命中再查磁盘层（命中后放回内存层）
+
+        Args:
+            key: make_key() 生成的缓存键
+            limit: 查询的商圈数上限，None 表示需要完整结果
+
+        Returns:
+            去重后的前 limit 个商圈；未命中（或缓存的结果不够）时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._covers(entry[0], limit):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1][:limit])
+
+        entry = self._disk_get(key) if self.path else None
+        with self._lock:
+            if entry is None or not self._covers(entry[0], limit):
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry[0], tuple(entry[1]))
+        return entry[1][:limit]
+
+    def put(self, key: str, clusters: List[ClusterRows], limit: Optional[int] = None):
+        """
+        写入内存层和磁盘层（已缓存的结果更完整时保留原结果）
+
+        Args:
+            key: make_key() 生成的缓存键
+            clusters: 去重后的商圈
+            limit: 得到 clusters 时的商圈数上限，None 表示完整结果
+        """
+        if limit is not None and len(clusters) < limit:
+            limit = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._covers(entry[0], limit) and entry[0] != limit:
+                return
+            self._remember(key, limit, tuple(clusters))
+        if self.path:
+            self._disk_put(key, limit, clusters)
+
+    def _remember(self, key: str, limit: Optional[int], clusters: Tuple[ClusterRows, ...]):
+        """写入内存层并按LRU淘汰超出容量的结果（调用方持有锁）"""
+        self._entries[key] = (limit, clusters)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（fork 之后的子进程会重新连接）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                cluster_limit INTEGER,
+                clusters TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_accessed ON result_cache (accessed_at)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _disk_get(self, key: str) -> Optional[Tuple[Optional[int], List[ClusterRows]]]:
+        """读取磁盘层，返回 (商圈数上限, 商圈)；过期的条目视为未命中（在下次写入时清理）"""
+        now = time.time()
+        try:
+            row = self._connect().execute("SELECT cluster_limit, clusters, created_at FROM result_cache WHERE key = ?",
+                                          (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"警告: 读取结果缓存失败 - {e}")
+            return None
+        if row is None or (self.ttl > 0 and now - row[2] > self.ttl):
+            return None
+        with self._lock:
+            self._pending_access[key] = now
+        return row[0], [ClusterRows(tuple(rows), max_distance, brand_count)
+                        for rows, max_distance, brand_count in json.loads(row[1])]
+
+    def _take_pending(self) -> Dict[str, float]:
+        """取出尚未写回磁盘层的访问时间"""
+        with self._lock:
+            access, self._pending_access = self._pending_access, {}
+        return access
+
+    def _disk_put(self, key: str, limit: Optional[int], clusters: List[ClusterRows]):
+        """写入磁盘层，顺带写回累积的访问时间，并清理过期条目、按LRU淘汰超出容量的条目"""
+        now = time.time()
+        access = self._take_pending()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if access:
+                    conn.executemany("UPDATE result_cache SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                                     [(accessed_at, k) for k, accessed_at in access.items()])
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, cluster_limit, clusters, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, limit, json.dumps([[list(c.rows), c.max_distance, c.brand_count] for c in clusters]),
+                     now, now)
+                )
+                evicted = 0
+                if self.ttl > 0:
+                    evicted += conn.execute("DELETE FROM result_cache WHERE created_at < ?",
+                                            (now - self.ttl,)).rowcount
+                if self.disk_max_entries > 0:
+                    evicted += conn.execute(
+                        "DELETE FROM result_cache WHERE rowid IN ("
+                        "SELECT rowid FROM result_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_max_entries,)
+                    ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if evicted:
+                with self._lock:
+                    self.disk_evictions += evicted
+        except sqlite3.Error as e:
+            print(f"警告: 写入结果缓存失败 - {e}")
+
+    def clear(self):
+        """清空内存层和磁盘层"""
+        with self._lock:
+            self._entries.clear()
+            self._pending_access.clear()
+        if self.path:
+            try:
+                self._connect().execute("DELETE FROM result_cache")
+            except sqlite3.Error as e:
+                print(f"警告: 清空结果缓存失败 - {e}")
+
+    def stats(self) -> Dict:
+        """缓存统计（命中、淘汰次数为本进程的统计）"""
+        disk_entries = None
+        if self.path:
+            try:
+                disk_entries = self._connect().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'disk': None if not self.path else {
+                    'entries': disk_entries,
+                    'max_entries': self.disk_max_entries,
+                    'ttl': self.ttl,
+                    'evictions': self.disk_evictions,
+                },
+            }
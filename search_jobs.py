@@ -0,0 +1,304 @@
+"""
+后台搜索任务 - 任务ID、进度事件缓冲与结果持久化
+
+创建任务后立即返回任务ID，任务在线程池中执行，与 HTTP 连接的生命周期无关。
+任务产生的事件按顺序编号并缓冲在内存中，客户端断线后可以凭最后收到的事件ID
+（SSE 的 Last-Event-ID）重新连接，补收之后的事件。任务结束时把最终事件写入结果目录，
+任务从内存中清理后（或在其他 worker 进程中）仍可查询结果。
+
+任务的完整结果（job.result）与事件分开保存：完成事件只携带摘要，结果数据分段作为 clusters 事件
+发出（每段是完整结果中连续的一段商圈和门店）。任务结束并写入结果文件后，内存中只保留各段的位置，
+完整结果和分段内容在需要时（断线重连补发、查询任务结果）从结果文件读取，已结束的任务不再占用结果大小的内存。
+从结果文件还原的任务没有这些分段事件，客户端需要通过任务查询接口读取完整结果。
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Hashable
+
+# 任务ID格式（uuid4 的十六进制形式），同时用作结果文件名
+_JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+# 清理过期结果文件时扫描结果目录的最短间隔（秒）
+RESULT_SCAN_INTERVAL = 60
+
+
+class SearchJob:
+    """一个后台任务：状态 + 按顺序编号的事件缓冲区"""
+
+    def __init__(self, job_id: str, owner: str, key: Optional[Hashable] = None):
+        """
+        Args:
+            job_id: 任务ID
+            owner: 创建任务的用户，只有该用户可以查询任务
+            key: 任务参数的标识，相同用户、相同参数的任务在执行期间会被复用
+        """
+        self.id = job_id
+        self.owner = owner
+        self.key = key
+        self.status = 'pending'  # pending / running / done / error
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # 任务的完整结果（成功时在发出 complete 事件之前设置），随最终事件一起持久化
+        self._result: Optional[Dict] = None
+        # 结果写入文件后从文件读取完整结果（见 release_result）
+        self._result_loader: Optional[Callable[[], Optional[Dict]]] = None
+        # (事件ID, 事件, 分段位置)：分段位置在 release_result 之后才有，为 (商圈数, 门店数)，
+        # 此时事件中不再包含 clusters / stores 内容
+        self._events: List[Tuple[int, Dict, Optional[Tuple[int, int]]]] = []
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    @property
+    def result(self) -> Optional[Dict]:
+        """任务的完整结果；已从内存释放时从结果文件读取"""
+        if self._result is None and self._result_loader is not None:
+            return self._result_loader()
+        return self._result
+
+    @result.setter
+    def result(self, value: Optional[Dict]):
+        self._result = value
+
+    @property
+    def finished(self) -> bool:
+        """任务是否已结束（成功或失败）"""
+        return self.status in ('done', 'error')
+
+    @property
+    def last_event_id(self) -> int:
+        """最后一个事件的ID（还没有事件时为0）"""
+        return self._last_id
+
+    def emit(self, event: Dict) -> int:
+        """
+        追加一个事件并唤醒等待中的连接；complete / error 事件同时结束任务
+
+        Args:
+            event: 事件内容（至少包含 type 字段）
+
+        Returns:
+            事件ID
+        """
+        with self._cond:
+            if self.finished:
+                raise RuntimeError(f"任务 {self.id} 已结束")
+            self._last_id += 1
+            self._events.append((self._last_id, event, None))
+            if event.get('type') == 'complete':
+                self.status = 'done'
+            elif event.get('type') == 'error':
+                self.status = 'error'
+            if self.finished:
+                self.finished_at = time.time()
+            self._cond.notify_all()
+            return self._last_id
+
+    def events_after(self, last_id: int, timeout: Optional[float] = None) -> List[Tuple[int, Dict]]:
+        """
+        返回ID大于 last_id 的事件
+
+        Args:
+            last_id: 客户端最后收到的事件ID
+            timeout: 暂无新事件且任务未结束时最多等待的秒数，None 表示不等待
+
+        Returns:
+            (事件ID, 事件) 列表，按ID升序
+        """
+        with self._cond:
+            if timeout and not self.finished and self._last_id <= last_id:
+                self._cond.wait(timeout)
+            pending = [entry for entry in self._events if entry[0] > last_id]
+        if not any(span for _, _, span in pending):
+            return [(event_id, event) for event_id, event, _ in pending]
+
+        # 分段内容已释放：从完整结果中按位置还原（结果文件已删除时跳过这些分段）
+        result = self.result
+        events = []
+        for event_id, event, span in pending:
+            if span is not None:
+                if result is None:
+                    continue
+                offset, store_offset = event['offset'], event['store_offset']
+                event = dict(event, clusters=result['clusters'][offset:offset + span[0]],
+                             stores=result['stores'][store_offset:store_offset + span[1]])
+            events.append((event_id, event))
+        return events
+
+    def release_result(self, loader: Callable[[], Optional[Dict]]):
+        """
+        结果写入文件后释放内存中的完整结果和分段事件内容，之后需要时通过 loader 从文件读取
+
+        Args:
+            loader: 从结果文件读取完整结果的函数
+        """
+        with self._cond:
+            self._result_loader = loader
+            self._result = None
+            self._events = [
+                (event_id, {k: v for k, v in event.items() if k not in ('clusters', 'stores')},
+                 (len(event['clusters']), len(event['stores'])))
+                if span is None and event.get('type') == 'clusters' else (event_id, event, span)
+                for event_id, event, span in self._events
+            ]
+
+    def final_event(self) -> Optional[Dict]:
+        """任务结束时的最终事件（complete / error），未结束时返回 None"""
+        with self._cond:
+            return self._events[-1][1] if self.finished else None
+
+    def to_record(self) -> Dict:
+        """已结束任务的持久化记录（只保存最终事件和完整结果）"""
+        with self._cond:
+            return {
+                'id': self.id, 'owner': self.owner, 'status': self.status,
+                'created_at': self.created_at, 'finished_at': self.finished_at,
+                'event_id': self._last_id, 'event': self._events[-1][1], 'result': self._result,
+            }
+
+    @classmethod
+    def from_record(cls, record: Dict) -> 'SearchJob':
+        """从持久化记录还原已结束的任务，重连时只能补收最终事件"""
+        job = cls(record['id'], record['owner'])
+        job.status = record['status']
+        job.created_at = record['created_at']
+        job.finished_at = record['finished_at']
+        job._last_id = record['event_id']
+        job._events = [(record['event_id'], record['event'], None)]
+        job.result = record.get('result')
+        return job
+
+
+class JobManager:
+    """后台任务的创建、执行、查询与清理"""
+
+    def __init__(self, results_dir: str, workers: int, job_ttl: float, result_ttl: float):
+        """
+        Args:
+            results_dir: 结果目录，每个已结束任务保存为 <任务ID>.json
+            workers: 同时执行的任务数，超出的任务排队等待
+            job_ttl: 已结束任务在内存中保留的秒数（之后只能从结果文件读取）
+            result_ttl: 结果文件保留的秒数，0 表示永久保留
+        """
+        self.results_dir = results_dir
+        self.job_ttl = job_ttl
+        self.result_ttl = result_ttl
+        # 线程在第一次提交任务时才创建，preload_app 时 fork 之前不会有线程
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='search-job')
+        self._jobs: Dict[str, SearchJob] = {}
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+
+    def submit(self, run: Callable[[SearchJob], None], owner: str, key: Optional[Hashable] = None) -> SearchJob:
+        """
+        创建任务并提交到线程池；同一用户相同参数的任务仍在执行时直接返回该任务
+
+        Args:
+            run: 任务函数，通过 job.emit() 报告进度，最后发出 complete 或 error 事件
+            owner: 创建任务的用户
+            key: 任务参数的标识
+
+        Returns:
+            任务对象
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.owner == owner and job.key == key and not job.finished:
+                        return job
+            job = SearchJob(uuid.uuid4().hex, owner, key)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def get(self, job_id: str, owner: str) -> Optional[SearchJob]:
+        """
+        查询任务：先查内存，再查结果文件
+
+        Args:
+            job_id: 任务ID
+            owner: 当前用户，不是任务创建者时视为不存在
+
+        Returns:
+            任务对象，不存在时返回 None
+        """
+        if not job_id or not _JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def _run(self, job: SearchJob, run: Callable[[SearchJob], None]):
+        """在线程池中执行任务，保证任务最终结束并写入结果文件"""
+        job.status = 'running'
+        try:
+            run(job)
+        except Exception as e:
+            if not job.finished:
+                job.emit({'type': 'error', 'message': f'服务器错误: {e}'})
+        if not job.finished:
+            job.emit({'type': 'error', 'message': '任务未返回结果'})
+        try:
+            self._save(job)
+        except OSError as e:
+            print(f"  保存任务结果失败: {e}")
+            return
+        job.release_result(lambda: self._load_result(job.id))
+
+    def _path(self, job_id: str) -> str:
+        """任务结果文件路径"""
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def _save(self, job: SearchJob):
+        """写入结果文件（先写临时文件再替换，其他进程不会读到半个文件）"""
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = self._path(job.id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_record(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _load(self, job_id: str) -> Optional[SearchJob]:
+        """从结果文件还原任务，文件不存在或损坏时返回 None"""
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                return SearchJob.from_record(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _load_result(self, job_id: str) -> Optional[Dict]:
+        """从结果文件读取任务的完整结果"""
+        job = self._load(job_id)
+        return job.result if job is not None else None
+
+    def _prune(self):
+        """清理内存中过期的已结束任务和过期的结果文件（调用方需持有锁；结果目录每 RESULT_SCAN_INTERVAL 秒最多扫描一次）"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.job_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        if self.result_ttl <= 0 or now - self._last_scan < RESULT_SCAN_INTERVAL:
+            return
+        self._last_scan = now
+        if not os.path.isdir(self.results_dir):
+            return
+        with os.scandir(self.results_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime > self.result_ttl:
+                        os.remove(entry.path)
+                except OSError:
+                    continue
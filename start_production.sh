@@ -21,6 +21,7 @@ fi
 # 设置默认值
 PORT=${PORT:-5002}
 WORKERS=${WORKERS:-4}
+THREADS=${THREADS:-32}
 BIND_ADDR="0.0.0.0:${PORT}"
 
 # 检查配置文件是否存在
@@ -30,12 +31,13 @@ if [ -f gunicorn.conf.py ]; then
 else
     echo "使用命令行参数启动..."
     echo "监听地址: ${BIND_ADDR}"
-    echo "工作进程数: ${WORKERS}"
+    echo "工作进程数: ${WORKERS}（每个进程 ${THREADS} 个线程）"
     echo ""
     gunicorn \
         --bind "${BIND_ADDR}" \
         --workers "${WORKERS}" \
-        --worker-class sync \
+        --worker-class gthread \
+        --threads "${THREADS}" \
         --timeout 120 \
         --access-logfile - \
         --error-logfile - \
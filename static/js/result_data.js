@@ -0,0 +1,30 @@
+/*
+ * 紧凑格式的搜索结果（见 output.compact_clusters）
+ *
+ *   stores:   [[品牌下标, 名称, 地址, 纬度, 经度], ...]，每个门店只出现一次
+ *   clusters: [[最大距离, [门店下标, ...]], ...]
+ *
+ * SSE 的 clusters 事件分段推送商圈和新引用的门店，用 applyClustersChunk 拼装；
+ * 展示前用 expandClusters 还原为 {max_distance, brand_count, brands: {品牌: 门店}}。
+ */
+
+function createResultBuffer() {
+    return { stores: [], clusters: [] };
+}
+
+/* 按下标写入一段数据（断线重连后重复收到的分段会覆盖为相同内容） */
+function applyClustersChunk(buffer, chunk) {
+    chunk.stores.forEach((s, i) => { buffer.stores[chunk.store_offset + i] = s; });
+    chunk.clusters.forEach((c, i) => { buffer.clusters[chunk.offset + i] = c; });
+}
+
+function expandClusters(result) {
+    const stores = (result.stores || []).map(s => ({
+        brand: result.brands[s[0]], name: s[1], address: s[2], lat: s[3], lon: s[4]
+    }));
+    return (result.clusters || []).map(([maxDistance, rows]) => {
+        const brands = {};
+        rows.forEach(idx => { brands[stores[idx].brand] = stores[idx]; });
+        return { max_distance: maxDistance, brand_count: rows.length, brands: brands };
+    });
+}
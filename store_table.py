@@ -0,0 +1,209 @@
+"""
+列式门店表 - 一次搜索内所有门店的紧凑表示
+
+聚类、去重等内部流程只传递行索引，仅在 JSON / HTML 输出边界才把行还原为字典。
+"""
+import hashlib
+import sys
+from typing import List, Dict, Tuple, NamedTuple, Optional, Sequence, Iterable, Iterator
+
+import numpy as np
+
+from distance import LocalProjection
+
+
+# 门店字典中的文本字段（与 amap_api.search_poi 返回的字段一致）
+TEXT_FIELDS = ("name", "address", "poi_id", "type")
+
+
+class ClusterRows(NamedTuple):
+    """以行索引表示的商圈（rows 按品牌在表中的顺序排列）"""
+    rows: Tuple[int, ...]
+    max_distance: float
+    brand_count: int
+
+
+def _intern(value) -> str:
+    """将文本字段统一为驻留字符串，重复的地址、类型等只保存一份"""
+    return sys.intern(value if isinstance(value, str) else str(value or ""))
+
+
+def store_key(poi_id: str, lat: float, lon: float) -> str:
+    """生成门店唯一标识（优先使用 poi_id，否则使用坐标）"""
+    if poi_id:
+        return poi_id
+    return f"{lat:.6f},{lon:.6f}"
+
+
+class StoreTable:
+    """
+    列式门店表
+
+    - lat / lon: 连续的 float64 坐标数组
+    - brand_id: 每行所属品牌在 brands 中的下标（同一品牌的行连续存放）
+    - name / address / poi_id / type: 驻留字符串列
+    - key_id: 门店唯一标识（poi_id 或坐标）对应的整数编号，用于商圈去重
+    """
+
+    def __init__(self, brands: List[str], brand_offsets: List[int],
+                 lat: np.ndarray, lon: np.ndarray, columns: Dict[str, List[str]]):
+        """
+        初始化门店表（一般通过 from_brand_stores / from_stores 构建）
+
+        Args:
+            brands: 品牌名称列表
+            brand_offsets: 各品牌起始行号，长度为 len(brands) + 1
+            lat: 纬度数组
+            lon: 经度数组
+            columns: 文本列，键为 TEXT_FIELDS 中的字段名
+        """
+        self.brands = list(brands)
+        self.brand_index = {brand: i for i, brand in enumerate(self.brands)}
+        self.brand_offsets = list(brand_offsets)
+        self.lat = lat
+        self.lon = lon
+        self.name = columns["name"]
+        self.address = columns["address"]
+        self.poi_id = columns["poi_id"]
+        self.type = columns["type"]
+
+        counts = np.diff(np.asarray(self.brand_offsets, dtype=np.intp))
+        self.brand_id = np.repeat(np.arange(len(self.brands), dtype=np.int32), counts)
+
+        key_ids = {}
+        self.key_id = np.fromiter(
+            (key_ids.setdefault(store_key(pid, la, lo), len(key_ids))
+             for pid, la, lo in zip(self.poi_id, self.lat.tolist(), self.lon.tolist())),
+            dtype=np.int64, count=len(self.poi_id)
+        )
+        self._projection: Optional[LocalProjection] = None
+        self._fingerprint: Optional[str] = None
+        self._brand_fingerprints: Dict[int, str] = {}
+
+    @classmethod
+    def from_brand_stores(cls, brand_stores_dict: Dict[str, List[Dict]],
+                          brands: Optional[Sequence[str]] = None) -> "StoreTable":
+        """
+        从 {品牌: 门店列表} 构建门店表
+
+        Args:
+            brand_stores_dict: 字典，键为品牌名，值为该品牌的门店列表
+            brands: 品牌顺序（默认按字典顺序，跳过没有门店的品牌）
+
+        Returns:
+            门店表
+        """
+        if brands is None:
+            brands = [brand for brand, stores in brand_stores_dict.items() if stores]
+
+        brand_offsets = [0]
+        lats = []
+        lons = []
+        columns = {field: [] for field in TEXT_FIELDS}
+        for brand in brands:
+            for store in brand_stores_dict[brand]:
+                lats.append(store["lat"])
+                lons.append(store["lon"])
+                for field in TEXT_FIELDS:
+                    columns[field].append(_intern(store.get(field, "")))
+            brand_offsets.append(len(lats))
+
+        return cls(brands, brand_offsets,
+                   np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64),
+                   columns)
+
+    @classmethod
+    def from_stores(cls, stores: List[Dict], brand: str = "") -> "StoreTable":
+        """从单个品牌的门店列表构建门店表"""
+        return cls.from_brand_stores({brand: stores}, [brand])
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @property
+    def projection(self) -> LocalProjection:
+        """全部门店的局部平面投影（第一次访问时计算，同一次搜索的索引、候选集构建共用）"""
+        if self._projection is None:
+            self._projection = LocalProjection(self.lat, self.lon)
+        return self._projection
+
+    @property
+    def fingerprint(self) -> str:
+        """门店表内容（品牌顺序、各品牌门店的坐标和文本字段）的哈希，内容相同的表指纹相同（第一次访问时计算）"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update("\x1f".join(self.brands).encode("utf-8"))
+            for b in range(len(self.brands)):
+                digest.update(self.brand_fingerprint(b).encode("ascii"))
+            for field in TEXT_FIELDS:
+                digest.update("\x1e".join(getattr(self, field)).encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def brand_fingerprint(self, brand_idx: int) -> str:
+        """指定品牌（下标）门店坐标（按行顺序）的哈希，与品牌名和其他品牌无关，可以跨查询比较"""
+        fingerprint = self._brand_fingerprints.get(brand_idx)
+        if fingerprint is None:
+            rows = slice(self.brand_offsets[brand_idx], self.brand_offsets[brand_idx + 1])
+            digest = hashlib.sha256()
+            digest.update(np.ascontiguousarray(self.lat[rows], dtype=np.float64).tobytes())
+            digest.update(np.ascontiguousarray(self.lon[rows], dtype=np.float64).tobytes())
+            fingerprint = self._brand_fingerprints[brand_idx] = digest.hexdigest()
+        return fingerprint
+
+    def brand_rows(self, brand_idx: int) -> range:
+        """获取指定品牌（下标）的行号范围"""
+        return range(self.brand_offsets[brand_idx], self.brand_offsets[brand_idx + 1])
+
+    def brand_size(self, brand_idx: int) -> int:
+        """获取指定品牌（下标）的门店数"""
+        return self.brand_offsets[brand_idx + 1] - self.brand_offsets[brand_idx]
+
+    def row(self, idx: int) -> Dict:
+        """将一行还原为门店字典"""
+        return {
+            "name": self.name[idx],
+            "address": self.address[idx],
+            "lat": float(self.lat[idx]),
+            "lon": float(self.lon[idx]),
+            "poi_id": self.poi_id[idx],
+            "type": self.type[idx]
+        }
+
+    def cluster_to_dict(self, cluster: ClusterRows, row_cache: Optional[Dict[int, Dict]] = None) -> Dict:
+        """
+        将以行索引表示的商圈还原为输出用的字典
+
+        Args:
+            cluster: 商圈
+            row_cache: 行字典缓存（同一门店在多个商圈中复用同一个字典）
+
+        Returns:
+            商圈字典，包含 brands / stores / max_distance / brand_count
+        """
+        if row_cache is None:
+            row_cache = {}
+        stores = []
+        brands_dict = {}
+        for idx in cluster.rows:
+            store = row_cache.get(idx)
+            if store is None:
+                store = row_cache[idx] = self.row(idx)
+            stores.append(store)
+            brands_dict[self.brands[self.brand_id[idx]]] = store
+        return {
+            "brands": brands_dict,
+            "stores": stores,
+            "max_distance": cluster.max_distance,
+            "brand_count": cluster.brand_count
+        }
+
+    def clusters_to_dicts(self, clusters: List[ClusterRows]) -> List[Dict]:
+        """批量还原商圈字典"""
+        return list(self.iter_cluster_dicts(clusters))
+
+    def iter_cluster_dicts(self, clusters: Iterable[ClusterRows]) -> Iterator[Dict]:
+        """逐个还原商圈字典（clusters 可以是边查找边返回的迭代器）"""
+        row_cache = {}
+        for cluster in clusters:
+            yield self.cluster_to_dict(cluster, row_cache)
@@ -0,0 +1,20 @@
+"""
+测试公共配置：把项目根目录加入导入路径（模块都在根目录下，不是安装包），
+benchmarks 目录用于导入合成数据生成器（synthetic.generate_city）；
+各测试模块共用的辅助函数通过 `from conftest import ...` 导入
+"""
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+def make_store(poi_id, lat, lon):
+    """构造 mock 门店（名称与 poi_id 相同）"""
+    return {"name": poi_id, "address": "addr", "lat": lat, "lon": lon, "poi_id": poi_id, "type": ""}
+
+
+def quiet(event):
+    """丢弃所有进度事件的 progress 接收器"""
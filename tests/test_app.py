@@ -0,0 +1,62 @@
+"""
+app.py API 测试：Flask 测试客户端，不调用高德 API（见 SDD-docs/10-Testing-Strategy.md 5）
+"""
+import pytest
+
+import app as web
+from conftest import make_store
+
+
+@pytest.fixture
+def client():
+    web.app.config['TESTING'] = True
+    with web.app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = web.DEFAULT_USERNAME
+        yield client
+
+
+def test_map_view_escapes_job_id(client):
+    job_id = "x';alert(1)//</script><script>alert(2)"
+    page = client.get('/map', query_string={'job_id': job_id}).get_data(as_text=True)
+    assert "</script><script>alert(2)" not in page
+    assert "alert(1)//" in page
+    assert "const JOB_ID = \"x\\u0027;alert(1)//\\u003c/script\\u003e" in page
+
+
+# A1-B1 相距十几米；A2 与 B2 相距数公里
+NEAR_STORES = {"品牌A": [make_store("a1", 22.5400, 114.0600)], "品牌B": [make_store("b1", 22.5401, 114.0601)]}
+FAR_STORES = {"品牌A": [make_store("a2", 22.5400, 114.0600)], "品牌B": [make_store("b2", 22.6000, 114.1000)]}
+
+
+@pytest.fixture
+def mock_search(monkeypatch):
+    def use(brand_stores):
+        monkeypatch.setattr(web, 'AMAP_API_KEY', 'test-key')
+        monkeypatch.setattr(web, 'search_brands', lambda city, brands: brand_stores)
+    return use
+
+
+def _search(client, **params):
+    return client.post('/api/search', json=dict({'city': '深圳', 'brands': '品牌A,品牌B'}, **params))
+
+
+def test_thresholds_return_one_result_per_threshold(client, mock_search):
+    mock_search(NEAR_STORES)
+    response = _search(client, thresholds=[100, 50])
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['threshold'] for r in results] == [100, 50]
+    assert [r['cluster_count'] for r in results] == [1, 1]
+    with client.session_transaction() as session:
+        assert session['last_result']['cluster_count'] == 1
+
+
+def test_thresholds_without_clusters_return_404_like_single_threshold(client, mock_search):
+    mock_search(FAR_STORES)
+    single = _search(client, threshold=100)
+    sweep = _search(client, thresholds='100,200')
+    assert single.status_code == sweep.status_code == 404
+    assert sweep.get_json() == single.get_json()
+    with client.session_transaction() as session:
+        assert 'last_result' not in session
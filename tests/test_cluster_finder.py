@@ -0,0 +1,57 @@
+"""
+cluster_finder 集成测试：固定的 mock 门店数据，不调用高德 API（见 SDD-docs/10-Testing-Strategy.md 4.1）
+"""
+import pytest
+
+from cluster_finder import find_clusters
+from synthetic import generate_city
+from conftest import make_store, quiet
+
+
+# A1-B1-C1 距离极近，可以聚合；A2-B2 相距较远
+MOCK_BRAND_STORES = {
+    "品牌A": [make_store("a1", 22.5400, 114.0600), make_store("a2", 22.5500, 114.0700)],
+    "品牌B": [make_store("b1", 22.5401, 114.0601), make_store("b2", 22.5600, 114.0800)],
+    "品牌C": [make_store("c1", 22.5402, 114.0602)],
+}
+
+# 品牌C 远离 A、B：没有全部品牌的商圈，回退到 A+B
+FALLBACK_BRAND_STORES = {
+    "品牌A": [make_store("a1", 22.5400, 114.0600)],
+    "品牌B": [make_store("b1", 22.5401, 114.0601)],
+    "品牌C": [make_store("c1", 22.6000, 114.1000)],
+}
+
+
+def _ids(clusters):
+    return [sorted(store["poi_id"] for store in c["brands"].values()) for c in clusters]
+
+
+def test_full_brand_cluster():
+    clusters = find_clusters(MOCK_BRAND_STORES, 200, use_cache=False)
+    assert _ids(clusters) == [["a1", "b1", "c1"]]
+    assert clusters[0]["brand_count"] == 3
+
+
+def test_partial_brand_fallback():
+    clusters = find_clusters(FALLBACK_BRAND_STORES, 200, use_cache=False)
+    assert _ids(clusters) == [["a1", "b1"]]
+
+
+@pytest.mark.parametrize("use_optimized", [True, False])
+def test_required_brand_without_stores_returns_no_clusters(use_optimized):
+    data = dict(FALLBACK_BRAND_STORES, 品牌D=[])
+    assert find_clusters(data, 200, required_brands=["品牌D"], use_optimized=use_optimized, use_cache=False) == []
+    assert find_clusters(data, 200, required_brands=["品牌A", "品牌D"], use_optimized=use_optimized,
+                         limit=5, use_cache=False) == []
+
+
+@pytest.mark.parametrize("use_optimized", [True, False])
+def test_threshold_sweep_matches_single_thresholds(use_optimized):
+    data = generate_city("hotspots", brands=4, stores_per_brand=60, seed=8, radius=3000)
+    thresholds = [300, 100, 200, 100]
+    sweep = find_clusters(data, thresholds, use_optimized=use_optimized, use_cache=False, progress=quiet)
+    assert list(sweep) == [300, 100, 200]
+    for t, clusters in sweep.items():
+        assert clusters == find_clusters(data, t, use_optimized=use_optimized, use_cache=False, progress=quiet)
+    assert sweep[300]
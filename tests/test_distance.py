@@ -0,0 +1,66 @@
+"""
+distance.py 单元测试（见 SDD-docs/10-Testing-Strategy.md 3.1）
+"""
+import numpy as np
+import pytest
+
+from distance import (haversine_distance, haversine_vector, check_all_distances, calculate_max_distance,
+                      pairwise_distances, LocalProjection)
+
+
+def _store(lat, lon):
+    return {"lat": lat, "lon": lon}
+
+
+def test_same_point_distance_is_zero():
+    assert haversine_distance(22.5, 114.0, 22.5, 114.0) == 0.0
+
+
+def test_beijing_to_shanghai():
+    assert haversine_distance(39.9042, 116.4074, 31.2304, 121.4737) == pytest.approx(1067000, rel=0.01)
+
+
+def test_scalar_matches_vector_kernel():
+    lats = np.array([22.5432, 22.5433, 22.5500])
+    lons = np.array([114.0578, 114.0579, 114.0700])
+    expected = haversine_vector(lats[0], lons[0], lats, lons)
+    assert [haversine_distance(lats[0], lons[0], lat, lon) for lat, lon in zip(lats, lons)] == expected.tolist()
+
+
+def test_check_all_distances_pass():
+    stores = [_store(22.5432, 114.0578), _store(22.5433, 114.0579), _store(22.5434, 114.0580)]
+    ok, max_distance = check_all_distances(stores, 100)
+    assert ok
+    assert max_distance == pytest.approx(haversine_distance(22.5432, 114.0578, 22.5434, 114.0580))
+
+
+def test_check_all_distances_fail():
+    stores = [_store(22.5432, 114.0578), _store(22.5433, 114.0579), _store(22.5500, 114.0700)]
+    ok, max_distance = check_all_distances(stores, 200)
+    assert not ok
+    assert max_distance > 200
+
+
+def test_check_all_distances_single_store():
+    assert check_all_distances([_store(22.5, 114.0)], 100) == (True, 0.0)
+
+
+def test_calculate_max_distance():
+    stores = [_store(22.5432, 114.0578), _store(22.5440, 114.0590), _store(22.5500, 114.0700)]
+    expected = max(haversine_distance(a["lat"], a["lon"], b["lat"], b["lon"]) for a in stores for b in stores)
+    assert calculate_max_distance(stores) == pytest.approx(expected)
+
+
+def test_projection_never_drops_pairs_within_threshold():
+    rng = np.random.default_rng(0)
+    lats = 45.0 + rng.uniform(-0.05, 0.05, 400)
+    lons = 120.0 + rng.uniform(-0.05, 0.05, 400)
+    projection = LocalProjection(lats, lons)
+    exact = pairwise_distances(lats, lons)
+    i, j = np.triu_indices(len(lats), k=1)
+    for threshold in (100, 500, 2000):
+        fi, fj, fd = projection.filter_pairs(i, j, threshold)
+        mask = exact[i, j] <= threshold
+        assert fi.tolist() == i[mask].tolist()
+        assert fj.tolist() == j[mask].tolist()
+        assert np.allclose(fd, exact[i, j][mask])
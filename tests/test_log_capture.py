@@ -0,0 +1,40 @@
+"""
+log_capture.py 单元测试：捕获只作用于当前上下文，并随 amap_api 的线程池进入工作线程
+"""
+import threading
+
+import amap_api
+from log_capture import LogCapture
+from conftest import quiet
+
+
+def _page(keyword, page, count=50):
+    pois = [{"id": f"{keyword}-{page}-{i}", "name": f"{keyword}{page}{i}", "address": "addr",
+             "location": f"{114.0 + page * 0.1 + i * 0.01:.6f},22.5"} for i in range(amap_api.PAGE_SIZE)]
+    return {"status": "1", "count": str(count), "pois": pois}
+
+
+def test_capture_is_per_thread():
+    lines = []
+    other = threading.Thread(target=lambda: print("other thread"))
+    with LogCapture(lines.append):
+        print("captured")
+        other.start()
+        other.join()
+    assert lines == ["captured"]
+
+
+def test_worker_thread_output_reaches_capture(monkeypatch):
+    def fake_fetch_page(city, keyword, page, progress):
+        print(f"警告: {keyword} 第 {page} 页")
+        return _page(keyword, page)
+
+    monkeypatch.setattr(amap_api, "_fetch_page", fake_fetch_page)
+    monkeypatch.setattr(amap_api, "POI_CACHE", None)
+    lines = []
+    with LogCapture(lines.append):
+        result = amap_api.search_brands_with_progress("深圳", ["甲", "乙"], progress=quiet)
+
+    assert set(result) == {"甲", "乙"}
+    # 品牌线程（第 1 页）和分页线程（第 2、3 页）的输出都进入了捕获
+    assert sorted(lines) == sorted(f"警告: {brand} 第 {page} 页" for brand in "甲乙" for page in (1, 2, 3))
@@ -0,0 +1,67 @@
+"""
+neighbor_index.py 单元测试：两种索引的门店对与逐对计算的结果一致（见 SDD-docs/10-Testing-Strategy.md 3.4）
+"""
+import numpy as np
+import pytest
+
+import neighbor_index
+from distance import pairwise_distances
+from neighbor_index import SpatialGrid, KDTreeIndex, KDTREE_AVAILABLE
+
+BACKENDS = [SpatialGrid] + ([KDTreeIndex] if KDTREE_AVAILABLE else [])
+
+
+def _stores(count, seed=0):
+    rng = np.random.default_rng(seed)
+    # 一半门店挤在市中心约 100 米范围内，其余散布在约 5 公里范围内
+    lats = np.concatenate((31.23 + rng.normal(0, 0.0005, count // 2), 31.23 + rng.uniform(-0.02, 0.02, count - count // 2)))
+    lons = np.concatenate((121.47 + rng.normal(0, 0.0005, count // 2), 121.47 + rng.uniform(-0.02, 0.02, count - count // 2)))
+    return [{"lat": lat, "lon": lon} for lat, lon in zip(lats.tolist(), lons.tolist())]
+
+
+def _expected_pairs(stores, threshold):
+    lats = np.array([s["lat"] for s in stores])
+    lons = np.array([s["lon"] for s in stores])
+    dist = pairwise_distances(lats, lons)
+    i, j = np.nonzero(np.triu(dist <= threshold, k=1))
+    return i, j, dist[i, j]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("threshold", [50, 300])
+def test_query_pairs_matches_pairwise(backend, threshold):
+    stores = _stores(600)
+    i, j, d = backend(stores, threshold).query_pairs()
+    ei, ej, ed = _expected_pairs(stores, threshold)
+    assert i.tolist() == ei.tolist()
+    assert j.tolist() == ej.tolist()
+    assert np.allclose(d, ed)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_query_pairs_between_matches_pairwise(backend):
+    stores = _stores(600, seed=1)
+    rows_a, rows_b = range(0, 250), range(250, 600)
+    i, j, d = backend(stores, 300).query_pairs_between(rows_a, rows_b)
+    ei, ej, ed = _expected_pairs(stores, 300)
+    mask = (ei < 250) & (ej >= 250)
+    assert i.tolist() == ei[mask].tolist()
+    assert j.tolist() == ej[mask].tolist()
+    assert np.allclose(d, ed[mask])
+
+
+def test_grid_pairs_in_small_blocks(monkeypatch):
+    stores = _stores(400, seed=2)
+    rows_a, rows_b = range(0, 200), range(200, 400)
+    expected = SpatialGrid(stores, 300).query_pairs()
+    expected_between = SpatialGrid(stores, 300).query_pairs_between(rows_a, rows_b)
+    monkeypatch.setattr(neighbor_index, "PAIR_BLOCK_SIZE", 7)
+    grid = SpatialGrid(stores, 300)
+    for actual, wanted in zip(grid.query_pairs() + grid.query_pairs_between(rows_a, rows_b),
+                              expected + expected_between):
+        assert np.array_equal(actual, wanted)
+
+
+def test_get_nearby_stores_excludes_self_and_far_stores():
+    stores = [{"lat": 22.5432, "lon": 114.0578}, {"lat": 22.5433, "lon": 114.0579}, {"lat": 22.5500, "lon": 114.0700}]
+    assert SpatialGrid(stores, 200).get_nearby_stores(0) == {1}
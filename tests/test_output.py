@@ -0,0 +1,71 @@
+"""
+output 测试：流式写入的JSON文件（默认 / 紧凑格式，可选 gzip）能按原样读回
+"""
+import gzip
+import json
+
+import pytest
+
+import output
+from cluster_finder import find_clusters
+from output import output_json, iter_json_clusters, load_json
+from synthetic import generate_city
+from conftest import quiet
+
+
+@pytest.fixture(scope="module")
+def clusters():
+    data = generate_city("hotspots", brands=3, stores_per_brand=80, seed=9, radius=3000)
+    result = find_clusters(data, 300, use_cache=False, progress=quiet)
+    assert len(result) > 10
+    return result
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("suffix", [".json", ".json.gz"])
+def test_round_trip(tmp_path, clusters, compact, suffix):
+    filename = str(tmp_path / ("result" + suffix))
+    output_json(iter(clusters), filename, compact=compact)
+
+    assert list(iter_json_clusters(filename)) == clusters
+    loaded = load_json(filename)
+    assert loaded["cluster_count"] == len(clusters)
+    assert loaded["clusters"] == clusters
+    if suffix.endswith(".gz"):
+        with gzip.open(filename, "rt", encoding="utf-8") as f:
+            assert json.load(f)["cluster_count"] == len(clusters)
+
+
+def test_json_gzip_output_is_gzip_compressed(tmp_path, clusters):
+    # --json-gzip 配合不以 .gz 结尾的 --json-file 时按 compress 参数压缩
+    filename = str(tmp_path / "result.json")
+    output_json(clusters, filename, compact=True, compress=True)
+    with gzip.open(filename, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["format"] == "compact"
+    assert data["cluster_count"] == len(clusters)
+    with open(filename, "rb") as f:
+        assert f.read(2) == b"\x1f\x8b"
+
+
+def test_default_format_is_plain_json(clusters):
+    data = json.loads(output_json(clusters))
+    assert data["cluster_count"] == len(clusters)
+    assert data["clusters"] == clusters
+
+
+def test_compact_format_writes_each_store_once(tmp_path, clusters):
+    filename = str(tmp_path / "result.json")
+    output_json(clusters, filename, compact=True)
+    with open(filename, encoding="utf-8") as f:
+        data = json.load(f)
+    written = [tuple(store) for item in data["clusters"] for store in item[2]]
+    distinct = {(brand, store["poi_id"]) for c in clusters for brand, store in c["brands"].items()}
+    assert len(written) == len(set(written)) == len(distinct)
+
+
+def test_reads_across_small_chunks(tmp_path, clusters, monkeypatch):
+    filename = str(tmp_path / "result.json.gz")
+    output_json(clusters, filename, compact=True)
+    monkeypatch.setattr(output, "_READ_SIZE", 7)
+    assert list(iter_json_clusters(filename)) == clusters
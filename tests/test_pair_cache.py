@@ -0,0 +1,100 @@
+"""
+pair_cache 测试：品牌对按指纹顺序存储、按门店对总数淘汰，以及换品牌后命中缓存的查询与直接查询一致
+"""
+import numpy as np
+import pytest
+
+import cluster_finder_optimized
+from cluster_finder import find_clusters
+from cluster_finder_optimized import _query_pairs
+from pair_cache import PairCache
+from progress import Progress
+from store_table import StoreTable
+from synthetic import generate_city
+from conftest import quiet
+
+
+def _pairs(n):
+    return np.arange(n), np.arange(n) + 1, np.linspace(0, 100, n)
+
+
+@pytest.fixture(scope="module")
+def city():
+    return generate_city("hotspots", brands=5, stores_per_brand=60, seed=11, radius=3000)
+
+
+def _subset(city, brands):
+    return {brand: city[brand] for brand in brands}
+
+
+def _direct_pairs(table, threshold):
+    """不使用缓存的门店对，去掉同品牌的门店对（使用缓存时不返回）"""
+    i, j, d = _query_pairs(table, threshold, "auto", Progress.of(quiet))
+    keep = table.brand_id[i] != table.brand_id[j]
+    return i[keep], j[keep], d[keep]
+
+
+def test_swapped_lookup():
+    cache = PairCache(100)
+    i, j, d = _pairs(5)
+    cache.put("b", "a", 200, (i, j, d))
+
+    got_i, got_j, got_d = cache.get("a", "b", 200)
+    assert np.array_equal(got_i, j) and np.array_equal(got_j, i) and np.array_equal(got_d, d)
+    got_i, got_j, _ = cache.get("b", "a", 200)
+    assert np.array_equal(got_i, i) and np.array_equal(got_j, j)
+    assert cache.get("a", "b", 300) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_evicts_by_pair_count():
+    cache = PairCache(10)
+    cache.put("a", "b", 200, _pairs(4))
+    cache.put("a", "c", 200, _pairs(4))
+    cache.get("a", "b", 200)
+    cache.put("b", "c", 200, _pairs(4))
+    assert cache.get("a", "c", 200) is None
+    assert cache.get("a", "b", 200) is not None
+    assert cache.stats()["pairs"] == 8 and cache.evictions == 1
+    # 单个品牌对超过容量时不缓存
+    cache.put("c", "d", 200, _pairs(11))
+    assert cache.get("c", "d", 200) is None
+
+
+@pytest.mark.parametrize("second", [
+    ["品牌1", "品牌2", "品牌4"],
+    ["品牌4", "品牌2", "品牌3"],
+    ["品牌5", "品牌3", "品牌1", "品牌2"],
+])
+def test_brand_swap_matches_direct_query(city, monkeypatch, second):
+    monkeypatch.setattr(cluster_finder_optimized, "PAIR_CACHE", None)
+    table = StoreTable.from_brand_stores(_subset(city, second), second)
+    expected = _direct_pairs(table, 300)
+    expected_clusters = find_clusters(_subset(city, second), 300, use_cache=False, progress=quiet)
+    assert len(expected[0]) and expected_clusters
+
+    cache = PairCache(1_000_000)
+    monkeypatch.setattr(cluster_finder_optimized, "PAIR_CACHE", cache)
+    find_clusters(_subset(city, ["品牌1", "品牌2", "品牌3"]), 300, use_cache=False, progress=quiet)
+    assert cache.hits == 0
+
+    table = StoreTable.from_brand_stores(_subset(city, second), second)
+    got = _query_pairs(table, 300, "auto", Progress.of(quiet))
+    assert cache.hits > 0
+    for a, b in zip(got, expected):
+        assert np.array_equal(a, b)
+    assert find_clusters(_subset(city, second), 300, use_cache=False, progress=quiet) == expected_clusters
+
+
+def test_changed_coordinates_miss(city, monkeypatch):
+    cache = PairCache(1_000_000)
+    monkeypatch.setattr(cluster_finder_optimized, "PAIR_CACHE", cache)
+    brands = ["品牌1", "品牌2"]
+    find_clusters(_subset(city, brands), 300, use_cache=False, progress=quiet)
+
+    moved = _subset(city, brands)
+    moved["品牌2"] = [dict(store, lat=store["lat"] + 0.0005) for store in moved["品牌2"]]
+    result = find_clusters(moved, 300, use_cache=False, progress=quiet)
+    assert cache.hits == 0
+    monkeypatch.setattr(cluster_finder_optimized, "PAIR_CACHE", None)
+    assert result == find_clusters(moved, 300, use_cache=False, progress=quiet)
@@ -0,0 +1,77 @@
+"""
+poi_cache.py 单元测试：命中 / 未命中 / 过期 / LRU 淘汰，读取不写数据库
+"""
+import time
+
+from poi_cache import PoiCache
+
+STORES = [{"name": "A1", "lat": 22.54, "lon": 114.06, "poi_id": "a1"}]
+
+
+def _cache(tmp_path, **kwargs):
+    options = dict(ttl=3600, max_entries=2, flush_interval=3600)
+    options.update(kwargs)
+    return PoiCache(str(tmp_path / "poi_cache.sqlite3"), **options)
+
+
+def test_hit_and_miss(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.get("深圳", "优衣库", 5) is None
+    cache.put("深圳", "优衣库", 5, STORES)
+    assert cache.get("深圳", "优衣库", 5) == STORES
+    assert cache.get("深圳", "优衣库", 3) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+
+def test_get_does_not_write(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("深圳", "优衣库", 5, STORES)
+    conn = cache._connect()
+    before = conn.total_changes
+    for _ in range(5):
+        assert cache.get("深圳", "优衣库", 5) == STORES
+        assert cache.get("深圳", "星巴克", 5) is None
+    assert conn.total_changes == before
+    assert cache.stats()["hits"] == 5
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = _cache(tmp_path, ttl=0.01)
+    cache.put("深圳", "优衣库", 5, STORES)
+    time.sleep(0.02)
+    assert cache.get("深圳", "优衣库", 5) is None
+
+
+def test_eviction_uses_buffered_access_times(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("深圳", "优衣库", 5, STORES)
+    time.sleep(0.01)
+    cache.put("深圳", "星巴克", 5, STORES)
+    time.sleep(0.01)
+    # 最近访问过优衣库：写入第三个条目时淘汰最久未访问的星巴克
+    assert cache.get("深圳", "优衣库", 5) == STORES
+    cache.put("深圳", "海底捞", 5, STORES)
+    assert cache.get("深圳", "优衣库", 5) == STORES
+    assert cache.get("深圳", "星巴克", 5) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_flush_interval_writes_back(tmp_path):
+    cache = _cache(tmp_path, flush_interval=0)
+    cache.put("深圳", "优衣库", 5, STORES)
+    assert cache.get("深圳", "优衣库", 5) == STORES
+    # 另一个实例（相当于另一个 worker 进程）能看到已写回的统计
+    assert _cache(tmp_path).stats()["hits"] == 1
+
+
+def test_unreadable_database_does_not_raise(tmp_path, capsys):
+    path = tmp_path / "poi_cache.sqlite3"
+    path.write_bytes(b"not a sqlite database" * 100)
+    cache = _cache(tmp_path)
+
+    assert cache.get("深圳", "优衣库", 5) is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["hit_rate"]) == (None, None, None)
+    cache.clear()
+    assert "清空POI缓存失败" in capsys.readouterr().out
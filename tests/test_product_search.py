@@ -0,0 +1,56 @@
+"""
+原始算法（ProductSearch 分块枚举）测试：与逐个组合检查、优化算法的结果一致
+"""
+from itertools import product
+
+import pytest
+
+from cluster_finder import find_clusters
+from distance import check_all_distances
+from product_search import ProductSearch
+from store_table import StoreTable
+from synthetic import generate_city
+from conftest import quiet
+
+
+def _key(clusters):
+    return [(sorted(store["poi_id"] for store in c["brands"].values()), round(c["max_distance"], 6))
+            for c in clusters]
+
+
+def test_matches_per_tuple_check():
+    table = StoreTable.from_brand_stores(generate_city("downtown", brands=3, stores_per_brand=25, seed=5,
+                                                       radius=1500, duplicate_rate=0.0))
+    brands = list(range(len(table.brands)))
+    expected = []
+    for rows in product(*(table.brand_rows(b) for b in brands)):
+        ok, max_distance = check_all_distances([table.row(idx) for idx in rows], 400)
+        if ok:
+            expected.append((rows, max_distance))
+
+    clusters = ProductSearch(table).search(brands, 400)
+    assert [c.rows for c in clusters] == [rows for rows, _ in expected]
+    assert [c.max_distance for c in clusters] == pytest.approx([d for _, d in expected])
+
+
+def test_small_blocks_give_same_result():
+    table = StoreTable.from_brand_stores(generate_city("hotspots", brands=4, stores_per_brand=60, seed=6,
+                                                       radius=3000, duplicate_rate=0.0))
+    brands = list(range(len(table.brands)))
+    assert ProductSearch(table, block_size=7).search(brands, 500) == ProductSearch(table).search(brands, 500)
+
+
+@pytest.mark.parametrize("layout, brands, per_brand, threshold, required", [
+    ("downtown", 4, 80, 400, None),
+    ("hotspots", 5, 60, 500, None),
+    ("uniform", 6, 40, 300, None),
+    ("uniform", 5, 60, 400, ["品牌2"]),
+    ("uniform", 5, 60, 400, ["品牌1", "品牌4"]),
+])
+def test_optimized_matches_brute_force(layout, brands, per_brand, threshold, required):
+    data = generate_city(layout, brands=brands, stores_per_brand=per_brand, seed=7, radius=4000)
+    brute = find_clusters(data, threshold, required_brands=required, use_optimized=False, use_cache=False,
+                          progress=quiet)
+    optimized = find_clusters(data, threshold, required_brands=required, use_cache=False, progress=quiet)
+    assert brute
+    assert _key(optimized) == _key(brute)
@@ -0,0 +1,72 @@
+"""
+逐级搜索（iter_cluster_rows）测试：各轮只枚举新增距离范围内的商圈，结果与一次性搜索后去重完全一致
+"""
+import pytest
+
+import parallel_search
+from cluster_finder import _deduplicate_cluster_rows
+from cluster_finder_optimized import find_cluster_rows, iter_cluster_rows
+from store_table import StoreTable
+from synthetic import generate_city
+from conftest import quiet
+
+
+def _table(layout, seed=0, brands=3):
+    return StoreTable.from_brand_stores(generate_city(layout, brands=brands, stores_per_brand=120, seed=seed,
+                                                      radius=2500, duplicate_rate=0.0))
+
+
+@pytest.mark.parametrize("layout", ["uniform", "downtown", "hotspots"])
+def test_rings_match_full_search(layout):
+    table = _table(layout)
+    expected = _deduplicate_cluster_rows(table, find_cluster_rows(table, 300, progress=quiet))
+    assert expected
+    rows = list(iter_cluster_rows(table, 300, progress=quiet, steps=(0.2, 0.45, 0.7, 1.0)))
+    assert rows == expected
+
+
+def test_rings_with_tied_distances():
+    # 同一坐标上的多个门店：门店对距离相同，需要按行索引区分最远的一对门店
+    stores = generate_city("hotspots", brands=3, stores_per_brand=40, seed=3, radius=1500, duplicate_rate=0.0)
+    for brand, brand_stores in stores.items():
+        for store in list(brand_stores[:10]):
+            brand_stores.append(dict(store, poi_id=store["poi_id"] + "-dup"))
+    for brand in ("品牌2", "品牌3"):
+        stores[brand][:5] = [dict(s, lat=a["lat"], lon=a["lon"]) for s, a in zip(stores[brand][:5], stores["品牌1"])]
+    table = StoreTable.from_brand_stores(stores)
+    full = find_cluster_rows(table, 250, progress=quiet)
+    assert any(c.max_distance == 0.0 for c in full)
+    assert list(iter_cluster_rows(table, 250, progress=quiet)) == _deduplicate_cluster_rows(table, full)
+
+
+def test_limit_returns_prefix_of_full_result():
+    table = _table("downtown", seed=1)
+    expected = _deduplicate_cluster_rows(table, find_cluster_rows(table, 300, progress=quiet))
+    assert len(expected) > 5
+    assert find_cluster_rows(table, 300, progress=quiet, limit=5) == expected[:5]
+
+
+def test_rings_fall_back_to_partial_brands():
+    table = _table("uniform", seed=2, brands=4)
+    full = find_cluster_rows(table, 60, progress=quiet)
+    assert full and all(c.brand_count < 4 for c in full)
+    assert list(iter_cluster_rows(table, 60, progress=quiet)) == _deduplicate_cluster_rows(table, full)
+
+
+def test_parallel_rings_share_one_pool(monkeypatch):
+    table = _table("hotspots", seed=4)
+    expected = _deduplicate_cluster_rows(table, find_cluster_rows(table, 300, progress=quiet))
+
+    pools = []
+    get_pool = parallel_search.ParallelCliqueSearch._get_pool
+
+    def counting_get_pool(self):
+        if self._pool is None:
+            pools.append(self)
+        return get_pool(self)
+
+    monkeypatch.setattr(parallel_search, "PARALLEL_MIN_PRODUCT", 0)
+    monkeypatch.setattr(parallel_search.ParallelCliqueSearch, "_get_pool", counting_get_pool)
+    rows = list(iter_cluster_rows(table, 300, workers=2, progress=quiet))
+    assert rows == expected
+    assert len(pools) == 1
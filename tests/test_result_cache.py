@@ -0,0 +1,193 @@
+"""
+result_cache 测试：商圈数上限的覆盖规则、磁盘层读回，以及 find_clusters 命中缓存时的结果与重新计算一致
+"""
+import copy
+
+import pytest
+
+import cluster_finder
+from cluster_finder import find_clusters
+from result_cache import ResultCache
+from store_table import ClusterRows
+from synthetic import generate_city
+from conftest import quiet
+
+
+def _rows(n):
+    return [ClusterRows((i, i + 1), float(i), 2) for i in range(n)]
+
+
+@pytest.fixture
+def data():
+    return generate_city("hotspots", brands=3, stores_per_brand=60, seed=5, radius=3000)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache(16)
+    monkeypatch.setattr(cluster_finder, "RESULT_CACHE", cache)
+    return cache
+
+
+def test_limited_result_covers_smaller_limits():
+    cache = ResultCache(4)
+    cache.put("k", _rows(10), limit=10)
+    assert cache.get("k", limit=5) == _rows(5)
+    assert cache.get("k", limit=10) == _rows(10)
+    assert cache.get("k", limit=11) is None
+    assert cache.get("k") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_short_result_counts_as_full():
+    cache = ResultCache(4)
+    cache.put("k", _rows(3), limit=10)
+    assert cache.get("k") == _rows(3)
+    assert cache.get("k", limit=100) == _rows(3)
+
+
+def test_full_result_is_not_replaced_by_limited():
+    cache = ResultCache(4)
+    cache.put("k", _rows(10))
+    cache.put("k", _rows(5), limit=5)
+    assert cache.get("k") == _rows(10)
+
+
+def test_lru_eviction():
+    cache = ResultCache(2)
+    cache.put("a", _rows(1))
+    cache.put("b", _rows(1))
+    cache.get("a")
+    cache.put("c", _rows(1))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.evictions == 1
+
+
+def test_disk_layer_is_shared(tmp_path):
+    path = str(tmp_path / "result_cache.sqlite3")
+    ResultCache(4, path).put("k", _rows(8), limit=8)
+
+    other = ResultCache(4, path)
+    assert other.get("k", limit=6) == _rows(6)
+    assert other.disk_hits == 1
+    assert other.get("k", limit=8) == _rows(8)
+    assert other.hits == 1
+    assert other.get("k") is None
+
+
+def test_key_depends_on_data(data):
+    changed = copy.deepcopy(data)
+    brand = next(iter(changed))
+    changed[brand][0]["lat"] += 0.001
+    table = cluster_finder._as_table(data)
+    assert ResultCache.make_key(table, 300) == ResultCache.make_key(cluster_finder._as_table(data), 300.0)
+    assert ResultCache.make_key(table, 300) != ResultCache.make_key(cluster_finder._as_table(changed), 300)
+    assert ResultCache.make_key(table, 300) != ResultCache.make_key(table, 300, [brand])
+
+
+@pytest.mark.parametrize("use_optimized", [True, False])
+def test_cached_result_matches_uncached(data, cache, use_optimized):
+    expected = find_clusters(data, 300, use_optimized=use_optimized, use_cache=False, progress=quiet)
+    assert len(expected) > 5
+
+    assert find_clusters(data, 300, use_optimized=use_optimized, progress=quiet) == expected
+    assert cache.misses == 1
+    assert find_clusters(data, 300, use_optimized=use_optimized, progress=quiet) == expected
+    assert cache.hits == 1
+    # 完整结果也能回答带上限的查询
+    assert find_clusters(data, 300, use_optimized=use_optimized, progress=quiet, limit=3) == expected[:3]
+    assert cache.hits == 2
+
+
+def test_changed_data_misses(data, cache):
+    find_clusters(data, 300, progress=quiet)
+    changed = copy.deepcopy(data)
+    next(iter(changed.values()))[0]["lat"] += 0.01
+
+    result = find_clusters(changed, 300, progress=quiet)
+    assert cache.misses == 2 and cache.hits == 0
+    assert result == find_clusters(changed, 300, use_cache=False, progress=quiet)
+
+
+def test_limited_result_answers_smaller_limit(data, cache):
+    expected = find_clusters(data, 300, use_cache=False, progress=quiet)
+    assert len(expected) > 8
+
+    assert find_clusters(data, 300, progress=quiet, limit=8) == expected[:8]
+    assert find_clusters(data, 300, progress=quiet, limit=4) == expected[:4]
+    assert cache.hits == 1
+    # 缓存的前 8 个不够回答完整查询，重新计算
+    assert find_clusters(data, 300, progress=quiet) == expected
+    assert cache.hits == 1 and cache.misses == 2
+
+
+def test_iter_clusters_records_only_complete_iteration(data, cache):
+    expected = find_clusters(data, 300, use_cache=False, progress=quiet)
+
+    rows = cluster_finder.iter_clusters(data, 300, progress=quiet)
+    next(rows)
+    rows.close()
+    assert list(cluster_finder.iter_clusters(data, 300, progress=quiet)) == expected
+    assert cache.hits == 0
+    assert list(cluster_finder.iter_clusters(data, 300, progress=quiet)) == expected
+    assert cache.hits == 1
+
+
+def test_disk_layer_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(4, str(tmp_path / "result_cache.sqlite3"), disk_max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, _rows(1))
+    assert cache.stats()["disk"]["entries"] == 2
+    assert ResultCache(4, cache.path).get("a") is None
+
+
+def test_disk_reads_do_not_write(tmp_path):
+    path = str(tmp_path / "result_cache.sqlite3")
+    writer = ResultCache(4, path, ttl=60, disk_max_entries=2)
+    writer.put("a", _rows(1))
+    writer.put("b", _rows(1))
+    expired = ResultCache(4, path, ttl=60, disk_max_entries=2)
+    expired._connect().execute("UPDATE result_cache SET created_at = created_at - 120 WHERE key = 'b'")
+
+    reader = ResultCache(4, path, ttl=60, disk_max_entries=2)
+    conn = reader._connect()
+    before = conn.total_changes
+    assert reader.get("a") == _rows(1)
+    assert reader.get("b") is None
+    assert conn.total_changes == before
+    assert conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0] == 2
+
+    # 写入时清理过期条目，并按读取时记下的访问时间淘汰
+    reader.put("c", _rows(1))
+    reader.put("d", _rows(1))
+    keys = {row[0] for row in conn.execute("SELECT key FROM result_cache")}
+    assert keys == {"c", "d"}
+
+
+def test_disk_read_refreshes_lru_on_next_write(tmp_path):
+    path = str(tmp_path / "result_cache.sqlite3")
+    writer = ResultCache(4, path, disk_max_entries=2)
+    writer.put("a", _rows(1))
+    writer.put("b", _rows(1))
+
+    reader = ResultCache(4, path, disk_max_entries=2)
+    assert reader.get("a") == _rows(1)
+    reader.put("c", _rows(1))
+    keys = {row[0] for row in reader._connect().execute("SELECT key FROM result_cache")}
+    assert keys == {"a", "c"}
+
+
+def test_clear_survives_locked_database(tmp_path, capsys):
+    path = str(tmp_path / "result_cache.sqlite3")
+    cache = ResultCache(4, path)
+    cache.put("a", _rows(1))
+    cache._connect().execute("PRAGMA busy_timeout = 0")
+    locker = ResultCache(4, path)._connect()
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        cache.clear()
+    finally:
+        locker.execute("ROLLBACK")
+    assert "清空结果缓存失败" in capsys.readouterr().out
+    assert cache.get("a") == _rows(1)
@@ -0,0 +1,78 @@
+"""
+search_jobs.py 单元测试：事件编号与断线重连补发、结果持久化后的分段重放、结果目录清理
+"""
+import os
+import time
+
+import search_jobs
+from output import new_compact_result, iter_compact_clusters
+from search_jobs import JobManager
+
+
+def _cluster(i):
+    store = {"name": f"s{i}", "address": "addr", "lat": 22.5 + i * 0.01, "lon": 114.0, "poi_id": f"p{i}"}
+    other = dict(store, name=f"t{i}", poi_id=f"q{i}", lon=114.0001)
+    return {"brands": {"A": store, "B": other}, "max_distance": 10.0 + i, "brand_count": 2}
+
+
+def _run(job):
+    """与 app._run_search_job 相同的事件序列：进度、分段结果、摘要完成事件"""
+    job.emit({'type': 'progress', 'message': '开始'})
+    compact = new_compact_result(["A", "B"])
+    for chunk in iter_compact_clusters((_cluster(i) for i in range(7)), compact, 3):
+        job.emit(dict(chunk, type='clusters'))
+    job.result = dict(compact, cluster_count=len(compact['clusters']))
+    job.emit({'type': 'complete', 'result': {'cluster_count': len(compact['clusters'])}})
+
+
+def _finished_job(tmp_path, run=_run):
+    manager = JobManager(str(tmp_path), workers=1, job_ttl=3600, result_ttl=0)
+    job = manager.submit(run, owner="user")
+    manager._executor.shutdown(wait=True)
+    return manager, job
+
+
+def test_events_replay_after_result_is_released(tmp_path):
+    live = []
+
+    def recording_run(job):
+        _run(job)
+        live.extend(job.events_after(0))
+
+    manager, job = _finished_job(tmp_path, recording_run)
+    assert job.status == 'done'
+    assert os.path.exists(tmp_path / f"{job.id}.json")
+    # 结果已写入文件：内存中不再保留完整结果和分段内容
+    assert job._result is None
+    assert all('clusters' not in event for _, event, span in job._events if span)
+
+    assert job.events_after(0) == live
+    assert job.events_after(2) == live[2:]
+    assert job.result['cluster_count'] == 7
+    assert len(job.result['stores']) == 14
+
+
+def test_get_restores_finished_job_from_file(tmp_path):
+    manager, job = _finished_job(tmp_path)
+    manager._jobs.clear()
+    restored = manager.get(job.id, "user")
+    assert restored.status == 'done'
+    assert restored.result['cluster_count'] == 7
+    assert restored.events_after(0) == [(job.last_event_id, job.final_event())]
+    assert manager.get(job.id, "other") is None
+
+
+def test_result_directory_scan_is_rate_limited(tmp_path, monkeypatch):
+    manager = JobManager(str(tmp_path), workers=1, job_ttl=3600, result_ttl=60)
+    old = tmp_path / ("0" * 32 + ".json")
+    old.write_text("{}")
+    os.utime(old, (time.time() - 120, time.time() - 120))
+
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(search_jobs.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+    for _ in range(3):
+        manager.submit(lambda job: job.emit({'type': 'complete', 'result': {}}), owner="user")
+    manager._executor.shutdown(wait=True)
+    assert len(scans) == 1
+    assert not old.exists()